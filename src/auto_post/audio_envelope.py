@@ -0,0 +1,114 @@
+"""
+audio_envelope.py
+-----------------
+波形アニメーション用に、動画の 1 フレームごとの音量（RMS）を求めるモジュール。
+
+音源全体を一度に配列へ読み込むと、72 分のステレオ音源で数 GB のメモリを使う。
+ここでは一定の長さのブロックごとに 1 回だけ読み進めながら、フレームごとの
+二乗和を積み上げる。結果はフレーム数ぶんの float32 配列（72 分・24fps で約 400KB）
+で、音源の横に .npy としてキャッシュできる。
+"""
+
+import logging
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# 音量計算に使うサンプリングレート（RMS を求めるには十分）
+ENVELOPE_SAMPLE_RATE = 22050
+
+# 1 回に読み込む音声の長さ（秒）
+# MoviePy の AudioFileClip は内部バッファ（約 4.5 秒）を超える範囲を一度に
+# 読むと正しい値を返さないため、それより短くする
+ENVELOPE_BLOCK_SEC = 1.0
+
+
+def frame_count(duration: float, fps: int) -> int:
+    """duration 秒の動画のフレーム数"""
+    return max(1, int(math.ceil(duration * fps)))
+
+
+def compute_envelope(
+    audio_clip, fps: int = 24, sample_rate: int = ENVELOPE_SAMPLE_RATE
+) -> np.ndarray:
+    """
+    フレームごとの RMS を求める
+
+    Args:
+        audio_clip: MoviePy のオーディオクリップ
+        fps: 動画のフレームレート
+        sample_rate: 音声を読み込むサンプリングレート
+
+    Returns:
+        np.ndarray: フレームごとの RMS（最大振幅が 1 になるよう正規化した float32）
+    """
+    n_frames = frame_count(audio_clip.duration, fps)
+    sum_sq = np.zeros(n_frames, dtype=np.float64)
+    counts = np.zeros(n_frames, dtype=np.int64)
+    peak = 0.0
+    offset = 0
+
+    for block in audio_clip.iter_chunks(
+        chunk_duration=ENVELOPE_BLOCK_SEC, fps=sample_rate, quantize=False
+    ):
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        if not len(block):
+            continue
+        # 各サンプルが属するフレーム番号
+        index = (offset + np.arange(len(block), dtype=np.int64)) * fps // sample_rate
+        np.minimum(index, n_frames - 1, out=index)
+        first, last = int(index[0]), int(index[-1]) + 1
+        sum_sq[first:last] += np.bincount(
+            index - first, weights=block * block, minlength=last - first
+        )
+        counts[first:last] += np.bincount(index - first, minlength=last - first)
+        peak = max(peak, float(np.max(np.abs(block))))
+        offset += len(block)
+
+    rms = np.sqrt(sum_sq / np.maximum(counts, 1))
+    if peak > 0:
+        rms /= peak
+    return rms.astype(np.float32)
+
+
+def envelope_cache_path(audio_path: Path, fps: int) -> Path:
+    """音源の横に置くキャッシュファイルのパス"""
+    audio_path = Path(audio_path)
+    return audio_path.with_name(f"{audio_path.stem}.envelope_{fps}fps.npy")
+
+
+def load_or_compute_envelope(audio_path: Path, audio_clip, fps: int = 24) -> np.ndarray:
+    """
+    キャッシュがあれば読み込み、なければ計算して保存する
+
+    キャッシュは音源より新しく、フレーム数が一致する場合のみ使う。
+    """
+    cache_path = envelope_cache_path(audio_path, fps)
+    n_frames = frame_count(audio_clip.duration, fps)
+    try:
+        if cache_path.stat().st_mtime >= Path(audio_path).stat().st_mtime:
+            envelope = np.load(cache_path)
+            if envelope.shape == (n_frames,):
+                logger.info(
+                    f"==> 音量エンベロープのキャッシュを使用します: {cache_path}"
+                )
+                return envelope.astype(np.float32, copy=False)
+    except (OSError, ValueError):
+        pass
+
+    envelope = compute_envelope(audio_clip, fps)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            np.save(f, envelope)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"==> 音量エンベロープを保存できません: {e}")
+    return envelope
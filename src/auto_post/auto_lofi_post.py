@@ -10,27 +10,49 @@ Lo-Fi音楽の自動生成とYouTube投稿を行うメインモジュール.
 """
 
 import argparse
+import copy
 import json
 import logging
 import os
 import random
 import shutil
+import sqlite3
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import requests
 from dotenv import load_dotenv
 from pydub import AudioSegment
 
-from .combine_audio import combine_audio
+from . import http_client
+from .combine_audio import AUDIO_FORMATS, combine_audio
 from .config import Config
 from .create_metadata import create_metadata
 from .create_video import create_video
+from .mp3_probe import Mp3ProbeError, get_mp3_duration
 from .piapi_music_generation import piapi_music_generation
+from .pipeline import (
+    MANIFEST_FILENAME,
+    ResourceBudget,
+    Stage,
+    StageManifest,
+    code_version,
+    file_digest,
+    run_stages,
+)
+from .run_journal import (
+    JOURNAL_FILENAME,
+    OWNER_CLI,
+    RunJournal,
+    find_unfinished_runs,
+)
+from .stock_catalog import StockCatalog
 from .thumbnail_generation import thumbnail_generation
+from .track_selection import DEFAULT_TOLERANCE_SEC, mixed_duration, select_tracks
 from .upload_to_youtube import upload_video_to_youtube
 
 # .envファイルを読み込み
@@ -39,20 +61,61 @@ load_dotenv()
 # ロガー設定（モジュールロガー）
 logger = logging.getLogger(__name__)
 
+# 読み込んだプロンプトの一覧（パス → ((サイズ, 更新時刻), 一覧)）
+_prompt_samples: Dict[str, Tuple[Tuple[int, int], List[Dict[str, Any]]]] = {}
+_prompt_samples_lock = threading.Lock()
+
+# バッチ実行で複数の動画のステージが共有する資源（ResourceBudget の枠の名前）
+CPU_RESOURCE = "cpu"  # 音声の結合・動画のエンコード
+GPU_RESOURCE = "gpu"  # サムネイルの画像生成
+
+
+def load_prompt_samples(jsonl_path, cache: bool = False) -> List[Dict[str, Any]]:
+    """
+    プロンプトの jsonl を読み込む
+
+    cache=True なら、ファイルが変わっていない限り前回読み込んだ一覧を使う。
+    選んだプロンプトは呼び出し側で書き換えるため、一覧はコピーして返す。
+    """
+    signature = None
+    if cache:
+        try:
+            stat = os.stat(jsonl_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+    with _prompt_samples_lock:
+        cached = _prompt_samples.get(str(jsonl_path))
+    if signature is not None and cached is not None and cached[0] == signature:
+        return copy.deepcopy(cached[1])
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    samples = [json.loads(line) for line in lines if line.strip()]
+    if signature is not None:
+        with _prompt_samples_lock:
+            _prompt_samples[str(jsonl_path)] = (signature, samples)
+        samples = copy.deepcopy(samples)
+    return samples
+
 
 class LofiPostGenerator:
     """Lo-Fi投稿生成を管理するクラス."""
 
-    def __init__(self, args: argparse.Namespace):
+    def __init__(
+        self, args: argparse.Namespace, budget: Optional[ResourceBudget] = None
+    ):
         """AutoLoFiPostクラスの初期化.
 
         Args:
             args: コマンドライン引数
+            budget: 他の動画の生成と共有する資源の枠（バッチ実行用）
         """
         # 設定の妥当性を検証
         Config.validate_config()
 
         self.args = args
+        self.budget = budget
         self.output_dir = Path(args.output_dir)
         self.success_music_gen = True
         self.selected_prompt: Dict[str, Any] = {}
@@ -60,6 +123,8 @@ class LofiPostGenerator:
         self.newly_generated_files: List[Path] = (
             []
         )  # 新規生成したファイルのリストを保持
+        # 中断した場合に再開できるよう、実行の状態を出力ディレクトリに記録する
+        self.journal = RunJournal(self.output_dir / JOURNAL_FILENAME)
 
     def setup(self) -> None:
         """初期設定を行う"""
@@ -91,7 +156,9 @@ class LofiPostGenerator:
             if is_error:
                 payload["text"] = f"❌ {message}"
 
-            response = requests.post(Config.SLACK_WEBHOOK_URL, json=payload, timeout=10)
+            response = http_client.post(
+                Config.SLACK_WEBHOOK_URL, json=payload, timeout=10
+            )
             response.raise_for_status()
 
         except Exception as e:
@@ -128,41 +195,34 @@ class LofiPostGenerator:
                 lofi_type = self._extract_type_from_thumbnail()
 
                 # 抽出したタイプに対応するプロンプトを探す（sadが含まれているかで判断）
-                jsonl_path = self.args.jsonl_path or Config.JSONL_PATH
-                with open(jsonl_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                    samples = [json.loads(line) for line in lines if line.strip()]
-                    selected = next(
-                        (
-                            sample
-                            for sample in samples
-                            if "sad" in sample["type"].lower()
-                        ),
-                        None,
+                samples = self._load_samples()
+                selected = next(
+                    (sample for sample in samples if "sad" in sample["type"].lower()),
+                    None,
+                )
+
+                if not selected:
+                    error_msg = f"抽出したタイプ '{lofi_type}' に対応するプロンプトが見つかりません"
+                    self.send_slack_notification(error_msg, is_error=True)
+                    logger.error(f"==> {error_msg}")
+                    sys.exit(1)
+
+                self.selected_prompt = selected
+
+                # thumbnail_titleが配列の場合はランダム選択
+                if isinstance(self.selected_prompt["thumbnail_title"], list):
+                    self.selected_prompt["thumbnail_title"] = random.choice(
+                        self.selected_prompt["thumbnail_title"]
                     )
 
-                    if not selected:
-                        error_msg = f"抽出したタイプ '{lofi_type}' に対応するプロンプトが見つかりません"
-                        self.send_slack_notification(error_msg, is_error=True)
-                        logger.error(f"==> {error_msg}")
-                        sys.exit(1)
-
-                    self.selected_prompt = selected
-
-                    # thumbnail_titleが配列の場合はランダム選択
-                    if isinstance(self.selected_prompt["thumbnail_title"], list):
-                        self.selected_prompt["thumbnail_title"] = random.choice(
-                            self.selected_prompt["thumbnail_title"]
-                        )
-
-                    # image_promptsから1つをランダム選択
-                    if "image_prompts" in selected and selected["image_prompts"]:
-                        self.selected_image_prompt = random.choice(
-                            selected["image_prompts"]
-                        )
-                    else:
-                        # 後方互換性のため、image_promptも確認
-                        self.selected_image_prompt = selected.get("image_prompt", "")
+                # image_promptsから1つをランダム選択
+                if "image_prompts" in selected and selected["image_prompts"]:
+                    self.selected_image_prompt = random.choice(
+                        selected["image_prompts"]
+                    )
+                else:
+                    # 後方互換性のため、image_promptも確認
+                    self.selected_image_prompt = selected.get("image_prompt", "")
             elif self.args.lofi_type:
                 self._select_specific_prompt()
             else:
@@ -183,68 +243,67 @@ class LofiPostGenerator:
             logger.error(f"==> {error_msg}")
             sys.exit(1)
 
+    def _load_samples(self) -> List[Dict[str, Any]]:
+        """プロンプトの一覧を読み込む（keep_warm ならプロセス内で使い回す）"""
+        return load_prompt_samples(
+            self.args.jsonl_path or Config.JSONL_PATH,
+            cache=getattr(self.args, "keep_warm", False),
+        )
+
     def _select_specific_prompt(self) -> None:
         """指定されたタイプのプロンプトを選択"""
-        jsonl_path = self.args.jsonl_path or Config.JSONL_PATH
-        with open(jsonl_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            samples = [json.loads(line) for line in lines if line.strip()]
-            selected = next(
-                (
-                    sample
-                    for sample in samples
-                    if sample["type"].lower() == self.args.lofi_type.lower()
-                ),
-                None,
-            )
+        samples = self._load_samples()
+        selected = next(
+            (
+                sample
+                for sample in samples
+                if sample["type"].lower() == self.args.lofi_type.lower()
+            ),
+            None,
+        )
 
-            if not selected:
-                raise ValueError(
-                    f"指定されたタイプ '{self.args.lofi_type}' が見つかりません"
-                )
+        if not selected:
+            raise ValueError(
+                f"指定されたタイプ '{self.args.lofi_type}' が見つかりません"
+            )
 
-            self.selected_prompt = selected
+        self.selected_prompt = selected
 
-            # thumbnail_titleが配列の場合はランダム選択
-            if isinstance(self.selected_prompt["thumbnail_title"], list):
-                self.selected_prompt["thumbnail_title"] = random.choice(
-                    self.selected_prompt["thumbnail_title"]
-                )
+        # thumbnail_titleが配列の場合はランダム選択
+        if isinstance(self.selected_prompt["thumbnail_title"], list):
+            self.selected_prompt["thumbnail_title"] = random.choice(
+                self.selected_prompt["thumbnail_title"]
+            )
 
-            # image_promptsから1つをランダム選択
-            if "image_prompts" in selected and selected["image_prompts"]:
-                self.selected_image_prompt = random.choice(selected["image_prompts"])
-            else:
-                # 後方互換性のため、image_promptも確認
-                self.selected_image_prompt = selected.get("image_prompt", "")
+        # image_promptsから1つをランダム選択
+        if "image_prompts" in selected and selected["image_prompts"]:
+            self.selected_image_prompt = random.choice(selected["image_prompts"])
+        else:
+            # 後方互換性のため、image_promptも確認
+            self.selected_image_prompt = selected.get("image_prompt", "")
 
     def _select_random_prompt(self) -> None:
         """ランダムにプロンプトを選択"""
-        jsonl_path = self.args.jsonl_path or Config.JSONL_PATH
-        with open(jsonl_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            samples = [json.loads(line) for line in lines if line.strip()]
-            self.selected_prompt = random.choice(samples)
-
-            # thumbnail_titleが配列の場合はランダム選択
-            if isinstance(self.selected_prompt["thumbnail_title"], list):
-                self.selected_prompt["thumbnail_title"] = random.choice(
-                    self.selected_prompt["thumbnail_title"]
-                )
+        samples = self._load_samples()
+        self.selected_prompt = random.choice(samples)
 
-            # image_promptsから1つをランダム選択
-            if (
-                "image_prompts" in self.selected_prompt
-                and self.selected_prompt["image_prompts"]
-            ):
-                self.selected_image_prompt = random.choice(
-                    self.selected_prompt["image_prompts"]
-                )
-            else:
-                # 後方互換性のため、image_promptも確認
-                self.selected_image_prompt = self.selected_prompt.get(
-                    "image_prompt", ""
-                )
+        # thumbnail_titleが配列の場合はランダム選択
+        if isinstance(self.selected_prompt["thumbnail_title"], list):
+            self.selected_prompt["thumbnail_title"] = random.choice(
+                self.selected_prompt["thumbnail_title"]
+            )
+
+        # image_promptsから1つをランダム選択
+        if (
+            "image_prompts" in self.selected_prompt
+            and self.selected_prompt["image_prompts"]
+        ):
+            self.selected_image_prompt = random.choice(
+                self.selected_prompt["image_prompts"]
+            )
+        else:
+            # 後方互換性のため、image_promptも確認
+            self.selected_image_prompt = self.selected_prompt.get("image_prompt", "")
 
     def _print_selected_prompt(self) -> None:
         """選択されたプロンプトを表示"""
@@ -282,6 +341,14 @@ class LofiPostGenerator:
                 today_folder=self.args.output_dir,
                 prompt=self.selected_prompt["music_prompt"],
                 target_duration_sec=target_duration_new,
+                concurrency=getattr(
+                    self.args, "music_concurrency", Config.PIAPI_CONCURRENCY
+                ),
+                all_variants=Config.PIAPI_ALL_VARIANTS
+                and not getattr(self.args, "single_variant", False),
+                pipelined=Config.PIAPI_PIPELINE
+                and not getattr(self.args, "no_music_pipeline", False),
+                journal=self.journal,
             )
             # 新規生成したファイルを記録
             self.newly_generated_files = list(self.output_dir.glob("*.mp3"))
@@ -313,11 +380,14 @@ class LofiPostGenerator:
 
     def _copy_existing_music_to_stock(self, stock_audio_dir: Path) -> None:
         """既存の音楽ファイルをストックにコピー"""
-        existing_music_files = list(self.output_dir.glob("*.mp3"))
+        existing_music_files = [
+            file for file in self.output_dir.glob("*.mp3") if file.stat().st_size > 0
+        ]
         if existing_music_files:
             logger.info("==> 既存の音楽ファイルをストックにコピーします")
             for file in existing_music_files:
                 self._copy_file_to_stock(file, stock_audio_dir)
+            self.journal.note(stocked=True)
 
     def _copy_file_to_stock(self, file: Path, stock_dir: Path) -> None:
         """ファイルをストックにコピー"""
@@ -339,59 +409,85 @@ class LofiPostGenerator:
         """ストックから音楽を読み込む"""
         logger.info("==> 音楽ストックから音楽を読み込みます")
 
-        stock_files = list(stock_audio_dir.glob("*.mp3"))
+        catalog = self._open_stock_catalog()
+        durations: Dict[Path, float] = {}
+        uses: Dict[Path, int] = {}
+        if catalog:
+            try:
+                catalog.refresh(lofi_type=stock_audio_dir.name)
+                for track in catalog.tracks(stock_audio_dir.name):
+                    durations[track.path] = track.duration
+                    uses[track.path] = track.times_used
+            except sqlite3.Error as e:
+                logger.warning(f"==> ストックカタログを参照できません: {e}")
+                catalog.close()
+                catalog = None
+
+        stock_files = list(durations) or list(stock_audio_dir.glob("*.mp3"))
         if not stock_files:
             error_msg = f"ストックに音楽ファイルが見つかりません: {stock_audio_dir}"
             self.send_slack_notification(error_msg, is_error=True)
             logger.error(f"==> {error_msg}")
             sys.exit(1)
 
-        selected_files = self._select_music_files(stock_files, target_duration)
-        self._copy_selected_files_to_output(selected_files)
+        joined = any(self.output_dir.glob("*.mp3"))
+        selected_files = self._select_music_files(
+            stock_files, target_duration, durations, joined, uses
+        )
+        self._copy_selected_files_to_output(selected_files, durations)
+
+        if catalog:
+            try:
+                catalog.mark_used(selected_files)
+            finally:
+                catalog.close()
+
+    def _open_stock_catalog(self) -> Optional[StockCatalog]:
+        """ストックカタログを開く。開けない場合はNone（ファイルを直接参照する）"""
+        try:
+            return StockCatalog()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"==> ストックカタログを開けません: {e}")
+            return None
 
     def _select_music_files(
-        self, stock_files: List[Path], target_duration: int
+        self,
+        stock_files: List[Path],
+        target_duration: int,
+        durations: Optional[Dict[Path, float]] = None,
+        joined: bool = False,
+        uses: Optional[Dict[Path, int]] = None,
     ) -> List[Path]:
-        """音楽ファイルを選択（改善版：より正確に目標時間に近づける）"""
+        """
+        目標時間（クロスフェード後）に最も近くなるよう音楽ファイルを選択
+
+        joined は出力ディレクトリに既に曲があり、その後ろに繋ぐ場合に True。
+        uses（カタログの使用回数）を渡すと、使われていない曲を優先する。
+        """
+        durations = durations or {}
         music_files_with_duration = [
-            (file, len(AudioSegment.from_mp3(file)) / 1000) for file in stock_files
+            (file, durations.get(file) or self._get_music_duration(file))
+            for file in stock_files
         ]
 
-        selected_files = []
-        total_duration = 0
-        max_attempts = len(music_files_with_duration) * 3  # 無限ループ防止
-        attempts = 0
-
-        # 目標時間の95%以上を目指す（より厳密に）
-        min_target = target_duration * 0.95
-
-        while (
-            total_duration < min_target
-            and music_files_with_duration
-            and attempts < max_attempts
-        ):
-            attempts += 1
-
-            # 残り時間を計算
-            remaining_time = target_duration - total_duration
-
-            # 残り時間に最も適したファイルを選択（より厳密に）
-            suitable_files = [
-                (file, duration)
-                for file, duration in music_files_with_duration
-                if duration <= remaining_time * 1.2  # 1.2倍まで許容（より厳密に）
-            ]
-
-            if suitable_files:
-                # 適したファイルからランダム選択
-                file, duration = random.choice(suitable_files)
-            else:
-                # 適したファイルがない場合は最短のファイルを選択
-                file, duration = min(music_files_with_duration, key=lambda x: x[1])
-
-            selected_files.append(file)
-            total_duration += duration
-            music_files_with_duration.remove((file, duration))
+        # クロスフェードで短くなる分を考慮し、目標時間に最も近い組み合わせを選ぶ
+        tolerance = getattr(self.args, "selection_tolerance_sec", DEFAULT_TOLERANCE_SEC)
+        indices = select_tracks(
+            [duration for _, duration in music_files_with_duration],
+            target_duration,
+            tolerance_sec=tolerance,
+            seed=getattr(self.args, "selection_seed", None),
+            joined=joined,
+            priorities=(
+                [uses.get(file, 0) for file, _ in music_files_with_duration]
+                if uses
+                else None
+            ),
+        )
+        selected_files = [music_files_with_duration[i][0] for i in indices]
+        total_duration = mixed_duration(
+            [music_files_with_duration[i][1] for i in indices], joined=joined
+        )
 
         if not selected_files:
             raise ValueError("適切な長さの曲を組み合わせることができませんでした")
@@ -403,8 +499,13 @@ class LofiPostGenerator:
         logger.info(f"==> 目標達成率: {(total_duration/target_duration)*100:.1f}%")
         return selected_files
 
-    def _copy_selected_files_to_output(self, selected_files: List[Path]) -> None:
+    def _copy_selected_files_to_output(
+        self,
+        selected_files: List[Path],
+        durations: Optional[Dict[Path, float]] = None,
+    ) -> None:
         """選択したファイルを出力ディレクトリにコピー"""
+        durations = durations or {}
         total_duration = 0
         existing_files = set()
 
@@ -426,8 +527,7 @@ class LofiPostGenerator:
             existing_files.add(new_name)
 
             # 再生時間を計算
-            audio = AudioSegment.from_mp3(file)
-            duration = len(audio) / 1000
+            duration = durations.get(file) or self._get_music_duration(file)
             total_duration += duration
 
             logger.info(
@@ -439,6 +539,15 @@ class LofiPostGenerator:
             f"🎵 ストックから音楽を読み込みました\n合計長さ: {total_duration:.1f}秒"
         )
 
+    def _get_music_duration(self, file: Path) -> float:
+        """音楽ファイルの長さ（秒）をフレームヘッダから取得する"""
+        try:
+            return get_mp3_duration(file)
+        except Mp3ProbeError as e:
+            # ヘッダを解析できないファイルだけデコードして長さを測る
+            logger.warning(f"==> ヘッダから長さを取得できません ({file.name}): {e}")
+            return len(AudioSegment.from_mp3(file)) / 1000
+
     def _find_latest_file(self, pattern: str) -> Optional[Path]:
         """指定されたパターンに一致する最新のファイルを探す"""
         logger.info(f"==> ファイル検索パターン: {pattern}")
@@ -451,6 +560,14 @@ class LofiPostGenerator:
             return None
         return max(files, key=lambda x: x.stat().st_mtime)
 
+    def _combined_audio_format(self) -> str:
+        return getattr(self.args, "audio_format", None) or Config.COMBINED_AUDIO_FORMAT
+
+    def _combined_audio_filename(self) -> str:
+        """出力形式に合わせた結合トラックのファイル名"""
+        suffix = AUDIO_FORMATS[self._combined_audio_format()].suffix
+        return Path(Config.COMBINED_AUDIO_FILENAME).with_suffix(suffix).name
+
     def combine_audio_tracks(self) -> Tuple[str, str]:
         """音声トラックを結合"""
         start_time = time.time()
@@ -458,7 +575,7 @@ class LofiPostGenerator:
         if self.args.skip_audio_combine:
             logger.info("==> 音声結合をスキップします")
             # 既存のファイルを探す
-            output_mp3 = self._find_latest_file(Config.COMBINED_AUDIO_FILENAME)
+            output_mp3 = self._find_latest_file(self._combined_audio_filename())
             tracks_json = self._find_latest_file(Config.TRACKS_INFO_FILENAME)
 
             if not output_mp3 or not tracks_json:
@@ -483,6 +600,8 @@ class LofiPostGenerator:
                 output_dir=self.output_dir,
                 fade_ms=3000,
                 ambient=os.path.join(ambient_dir, self.selected_prompt["ambient"]),
+                streaming=not getattr(self.args, "in_memory_combine", False),
+                audio_format=self._combined_audio_format(),
             )
             self.send_slack_notification("🎧 音楽結合が完了しました")
             elapsed_time = time.time() - start_time
@@ -526,6 +645,7 @@ class LofiPostGenerator:
                 lofi_type=self.selected_prompt["type"],
                 prompt=self.selected_image_prompt,
                 thumb_title=self.selected_prompt["thumbnail_title"],
+                keep_model=getattr(self.args, "keep_warm", False),
             )
             self.send_slack_notification("🖼️ サムネイル生成が完了しました")
             elapsed_time = time.time() - start_time
@@ -607,6 +727,10 @@ class LofiPostGenerator:
                 output_dir=self.output_dir,
                 still_path=image_path,
                 audio_path=output_mp3_path,
+                engine=getattr(self.args, "render_engine", None),
+                segment_workers=getattr(self.args, "segment_workers", None),
+                segment_sec=getattr(self.args, "segment_sec", None),
+                main_fps=getattr(self.args, "main_fps", None),
             )
             self.send_slack_notification("🎥 動画生成が完了しました")
             elapsed_time = time.time() - start_time
@@ -695,42 +819,239 @@ class LofiPostGenerator:
         elapsed_time = time.time() - start_time
         logger.info(f"==> アセット保存完了 (処理時間: {elapsed_time:.2f}秒)")
 
+    def _prompt_stage(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        self.select_prompt()
+        return {
+            "prompt": self.selected_prompt,
+            "image_prompt": self.selected_image_prompt,
+        }
+
+    def _restore_prompt(self, result: Dict[str, Any]) -> None:
+        self.selected_prompt = result["prompt"]
+        self.selected_image_prompt = result["image_prompt"]
+        self._print_selected_prompt()
+
+    def _music_stage(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        # 再開をあきらめた場合に生成済みの曲をストックに移せるよう記録する
+        self.journal.note(lofi_type=self.selected_prompt.get("type"))
+        self.generate_music()
+        tracks = [
+            str(f)
+            for f in sorted(self.output_dir.glob("*.mp3"))
+            if not f.stem.startswith("combined_audio")
+        ]
+        return {
+            "new": [str(f) for f in self.newly_generated_files],
+            "success": self.success_music_gen,
+            "tracks": tracks,
+        }
+
+    def _restore_music(self, result: Dict[str, Any]) -> None:
+        self.newly_generated_files = [Path(f) for f in result["new"]]
+        self.success_music_gen = result["success"]
+
+    def _upload_stage(self, results: Dict[str, Any]) -> None:
+        video_path = results["video"]
+        if video_path:
+            _, thumbnail_path = results["thumbnail"]
+            self.upload_to_youtube(video_path, thumbnail_path, results["metadata"])
+
+    def _store_stage(self, results: Dict[str, Any]) -> None:
+        logger.info("\n=== 処理完了 ===")
+        logger.info(f"出力ディレクトリ: {self.output_dir.absolute()}")
+        self.store_assets()
+
+    def _journaled(self, stage: Stage) -> Stage:
+        """ステージの開始・完了・失敗をジャーナルに記録するようにする"""
+
+        def func(results: Dict[str, Any]) -> Any:
+            self.journal.stage_started(stage.name)
+            try:
+                result = stage.func(results)
+            except BaseException as e:
+                self.journal.stage_failed(stage.name, e)
+                raise
+            self.journal.stage_finished(stage.name)
+            return result
+
+        return stage._replace(func=func)
+
+    def abandon(self) -> None:
+        """
+        再開をあきらめる
+
+        新規生成した曲がストックに入っていなければコピーし、料金を払った
+        生成結果を無駄にしない。出力ディレクトリはそのまま残す。
+        """
+        lofi_type = self.journal.data.get("lofi_type")
+        tracks = [path for path, _ in self.journal.saved_tracks()]
+        if lofi_type and tracks and not self.journal.data.get("stocked"):
+            stock_audio_dir = Config.STOCK_AUDIO_BASE_DIR / lofi_type
+            stock_audio_dir.mkdir(parents=True, exist_ok=True)
+            for file in tracks:
+                self._copy_file_to_stock(file, stock_audio_dir)
+            self.journal.note(stocked=True)
+        self.journal.abandon()
+        self.send_slack_notification(
+            f"{self.journal.attempts}回再開しても完了しなかったため再開をあきらめます\n"
+            f"出力ディレクトリ: {self.output_dir.absolute()}\n"
+            f"ストックに移した新規生成曲: {len(tracks)}曲",
+            is_error=True,
+        )
+
+    def stages(self) -> List[Stage]:
+        """
+        パイプラインのステージと依存関係
+
+        サムネイルは音楽に依存しないため音楽生成・結合と並行に、メタデータは
+        tracks_info.json だけを使うため結合の直後に実行できる。
+
+        setup と store_assets 以外は入力を宣言してメモ化する（run_stages を参照）。
+        有料の音楽生成とアップロードは、コードが変わっただけでは再実行しない。
+        """
+        args = self.args
+
+        def prompt(r):
+            return r["select_prompt"]["prompt"]
+
+        return [
+            Stage("setup", lambda r: self.setup()),
+            Stage(
+                "select_prompt",
+                self._prompt_stage,
+                ("setup",),
+                inputs=lambda r: {
+                    "jsonl": file_digest(args.jsonl_path or Config.JSONL_PATH),
+                    "lofi_type": args.lofi_type,
+                    "skip_type_selection": args.skip_type_selection,
+                },
+                restore=self._restore_prompt,
+            ),
+            Stage(
+                "music",
+                self._music_stage,
+                ("select_prompt",),
+                inputs=lambda r: {
+                    "type": prompt(r).get("type"),
+                    "music_prompt": prompt(r).get("music_prompt"),
+                    "target_duration_sec": args.target_duration_sec,
+                    "single_variant": getattr(args, "single_variant", False),
+                    "skip": args.skip_music_gen,
+                },
+                outputs=lambda result: result["tracks"],
+                restore=self._restore_music,
+            ),
+            Stage(
+                "combine",
+                lambda r: self.combine_audio_tracks(),
+                ("music",),
+                inputs=lambda r: {
+                    "ambient": file_digest(
+                        Path(args.ambient_dir or Config.AMBIENT_DIR)
+                        / prompt(r).get("ambient", "")
+                    ),
+                    "format": self._combined_audio_format(),
+                    "in_memory": getattr(args, "in_memory_combine", False),
+                    "code": code_version(combine_audio),
+                    "skip": args.skip_audio_combine,
+                },
+                outputs=list,
+                resource=CPU_RESOURCE,
+            ),
+            Stage(
+                "thumbnail",
+                lambda r: self.generate_thumbnail(),
+                ("select_prompt",),
+                inputs=lambda r: {
+                    "type": prompt(r).get("type"),
+                    "title": prompt(r).get("thumbnail_title"),
+                    "image_prompt": r["select_prompt"]["image_prompt"],
+                    "code": code_version(thumbnail_generation),
+                    "skip": args.skip_thumbnail_gen,
+                },
+                outputs=list,
+                resource=GPU_RESOURCE,
+            ),
+            Stage(
+                "metadata",
+                lambda r: self.generate_metadata(r["combine"][1]),
+                ("combine",),
+                inputs=lambda r: {
+                    "type": prompt(r).get("type"),
+                    "music_prompt": prompt(r).get("music_prompt"),
+                    "temperature": args.temperature,
+                    "code": code_version(create_metadata),
+                    "skip": args.skip_metadata_gen,
+                },
+                outputs=lambda result: [result],
+            ),
+            Stage(
+                "video",
+                lambda r: self.generate_video(r["thumbnail"][0], r["combine"][0]),
+                ("combine", "thumbnail"),
+                inputs=lambda r: {
+                    "engine": getattr(args, "render_engine", None),
+                    "segment_sec": getattr(args, "segment_sec", None),
+                    "main_fps": getattr(args, "main_fps", None),
+                    "opening": file_digest(Config.OPENING_VIDEO_PATH),
+                    "code": code_version(create_video),
+                    "skip": args.skip_video_gen,
+                },
+                outputs=lambda result: [result] if result else [],
+                resource=CPU_RESOURCE,
+            ),
+            Stage(
+                "upload",
+                self._upload_stage,
+                ("video", "thumbnail", "metadata"),
+                inputs=lambda r: {
+                    "privacy": args.privacy,
+                    "tags": args.tags,
+                    "skip": args.skip_upload,
+                },
+            ),
+            Stage("store_assets", self._store_stage, ("upload",)),
+        ]
+
     def run(self) -> None:
         """メイン処理を実行"""
         total_start_time = time.time()
         logger.info(f"=== 実行開始: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
 
+        self.journal.start(
+            vars(self.args), owner=getattr(self.args, "run_owner", OWNER_CLI)
+        )
         try:
-            self.setup()
-            self.select_prompt()
-            self.generate_music()
-
-            output_mp3_path, tracks_json_path = self.combine_audio_tracks()
-            image_path, thumbnail_path = self.generate_thumbnail()
-            metadata_path = self.generate_metadata(tracks_json_path)
-            video_path = self.generate_video(image_path, output_mp3_path)
-            if video_path:
-                self.upload_to_youtube(video_path, thumbnail_path, metadata_path)
-
-            logger.info("\n=== 処理完了 ===")
-            logger.info(f"出力ディレクトリ: {self.output_dir.absolute()}")
-
-            self.store_assets()
+            workers = getattr(self.args, "pipeline_workers", None)
+            run_stages(
+                [self._journaled(stage) for stage in self.stages()],
+                max_workers=workers or Config.PIPELINE_WORKERS,
+                manifest=StageManifest(self.output_dir / MANIFEST_FILENAME),
+                force=getattr(self.args, "force", None) or (),
+                budget=self.budget,
+            )
+            self.journal.finish()
 
             total_elapsed_time = time.time() - total_start_time
             logger.info(
                 f"\n=== 実行終了: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ==="
             )
             logger.info(f"=== 総処理時間: {total_elapsed_time:.2f}秒 ===")
+            http_client.get_client().log_metrics()
 
+        except SystemExit as e:
+            # ステージが sys.exit した場合も、次回の起動時に再開できるよう記録する
+            self.journal.fail(e)
+            raise
         except Exception as e:
+            self.journal.fail(e)
             error_msg = f"予期せぬエラーが発生しました: {e}"
             self.send_slack_notification(error_msg, is_error=True)
             logger.error(f"==> {error_msg}")
             sys.exit(1)
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     """コマンドライン引数を解析"""
     parser = argparse.ArgumentParser(
         description="自動でyoutubeに音楽を投稿するプログラム"
@@ -772,16 +1093,59 @@ def parse_args() -> argparse.Namespace:
         help="環境音ファイルのディレクトリ（未指定時は環境変数AMBIENT_DIRを使用）",
     )
     music_group.add_argument(
-        "--skip_music_gen", action="store_true", help="音楽生成をスキップする"
+        "--skip_music_gen",
+        action="store_true",
+        help="音楽生成をスキップする（通常は不要: 入力が変わっていなければ自動で前回の結果を使う）",
+    )
+    music_group.add_argument(
+        "--skip_audio_combine",
+        action="store_true",
+        help="音声結合をスキップする（通常は不要: 入力が変わっていなければ自動で前回の結果を使う）",
     )
     music_group.add_argument(
-        "--skip_audio_combine", action="store_true", help="音声結合をスキップする"
+        "--music_concurrency",
+        type=int,
+        default=Config.PIAPI_CONCURRENCY,
+        help="同時に実行する音楽生成タスク数（1なら1曲ずつ生成）",
+    )
+    music_group.add_argument(
+        "--single_variant",
+        action="store_true",
+        help="1タスクにつき最初の1曲だけを保存する（環境変数PIAPI_ALL_VARIANTSより優先）",
+    )
+    music_group.add_argument(
+        "--no_music_pipeline",
+        action="store_true",
+        help="タイトル付けとダウンロードが終わってから次の生成タスクを投入する（環境変数PIAPI_PIPELINEより優先）",
+    )
+    music_group.add_argument(
+        "--selection_seed",
+        type=int,
+        help="ストック曲の選択に使う乱数シード（同じシードなら同じ曲を選ぶ）",
+    )
+    music_group.add_argument(
+        "--selection_tolerance_sec",
+        type=float,
+        default=DEFAULT_TOLERANCE_SEC,
+        help="ストック曲の合計時間と目標時間の許容誤差（秒）",
+    )
+    music_group.add_argument(
+        "--in_memory_combine",
+        action="store_true",
+        help="ストリーミング結合を使わず、従来どおりメモリ上で全曲を結合する",
+    )
+    music_group.add_argument(
+        "--audio_format",
+        choices=sorted(AUDIO_FORMATS),
+        help="結合トラックの形式（未指定時は環境変数COMBINED_AUDIO_FORMATを使用）",
     )
 
     # サムネイル
     thumbnail_group = parser.add_argument_group("サムネイル")
     thumbnail_group.add_argument(
-        "--skip_thumbnail_gen", action="store_true", help="サムネイル生成をスキップする"
+        "--skip_thumbnail_gen",
+        action="store_true",
+        help="サムネイル生成をスキップする（通常は不要: 入力が変わっていなければ自動で前回の結果を使う）",
     )
 
     # メタデータ
@@ -790,13 +1154,87 @@ def parse_args() -> argparse.Namespace:
         "--temperature", type=float, default=0.7, help="生成温度"
     )
     metadata_group.add_argument(
-        "--skip_metadata_gen", action="store_true", help="メタデータ生成をスキップする"
+        "--skip_metadata_gen",
+        action="store_true",
+        help="メタデータ生成をスキップする（通常は不要: 入力が変わっていなければ自動で前回の結果を使う）",
     )
 
     # 動画
     video_group = parser.add_argument_group("動画")
     video_group.add_argument(
-        "--skip_video_gen", action="store_true", help="動画生成をスキップする"
+        "--skip_video_gen",
+        action="store_true",
+        help="動画生成をスキップする（通常は不要: 入力が変わっていなければ自動で前回の結果を使う）",
+    )
+    video_group.add_argument(
+        "--render_engine",
+        choices=("moviepy", "ffmpeg"),
+        default=Config.VIDEO_RENDER_ENGINE,
+        help="動画の描画エンジン（ffmpegはフィルタグラフで一括処理して高速。"
+        "波形はshowwavesの縦線で、moviepyの30本のバーとは見た目が異なる）",
+    )
+    video_group.add_argument(
+        "--segment_workers",
+        type=int,
+        default=Config.VIDEO_SEGMENT_WORKERS,
+        help="動画を区間ごとに並列エンコードするプロセス数（2以上で有効）",
+    )
+    video_group.add_argument(
+        "--segment_sec",
+        type=float,
+        default=Config.VIDEO_SEGMENT_SEC,
+        help="並列エンコードの区間の長さ（秒）",
+    )
+    video_group.add_argument(
+        "--main_fps",
+        type=int,
+        default=Config.VIDEO_MAIN_FPS,
+        help="メイン部のフレームレート（24未満で静止画モード。長尺ミックス向け）",
+    )
+
+    # パイプライン
+    pipeline_group = parser.add_argument_group("パイプライン")
+    pipeline_group.add_argument(
+        "--pipeline_workers",
+        type=int,
+        default=Config.PIPELINE_WORKERS,
+        help="依存し合わないステージを同時に実行する数（1なら従来どおり順に実行）。"
+        "2以上では、失敗しても実行中の他のステージが終わるまで待ってから終了する",
+    )
+    pipeline_group.add_argument(
+        "--force",
+        nargs="+",
+        metavar="STAGE",
+        default=[],
+        help="入力が変わっていなくても再実行するステージ（select_prompt / music / "
+        "combine / thumbnail / metadata / video / upload）。後続も出力が変われば再実行される",
+    )
+    pipeline_group.add_argument(
+        "--resume",
+        action="store_true",
+        default=Config.RUN_RESUME,
+        help="今回の実行の後に、同じ階層の出力ディレクトリに残っている中断した実行を"
+        "再開する（未指定時は環境変数RUN_RESUME）",
+    )
+
+    # バッチ
+    batch_group = parser.add_argument_group("バッチ")
+    batch_group.add_argument(
+        "--count",
+        type=int,
+        help="1回の起動で作る動画の数（出力ディレクトリは <output_dir>_1, _2, ...）",
+    )
+    batch_group.add_argument(
+        "--types",
+        type=str,
+        help="動画ごとのLo-Fiタイプ（カンマ区切り。--count より少なければ繰り返す）",
+    )
+    batch_group.add_argument(
+        "--batch_workers",
+        type=int,
+        default=Config.BATCH_WORKERS,
+        help="同時に作る動画の数（エンコード・画像生成は BATCH_CPU_SLOTS / "
+        "BATCH_GPU_SLOTS の枠を全ての動画で共有する）",
     )
 
     # アップロード
@@ -834,7 +1272,124 @@ def parse_args() -> argparse.Namespace:
         "--skip_upload", action="store_true", help="アップロードをスキップする"
     )
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+
+def restore_args(journal: RunJournal) -> argparse.Namespace:
+    """
+    ジャーナルに記録した引数を復元する
+
+    記録後に追加された引数は既定値を使う。--force は再開時には引き継がない
+    （有料の音楽生成などを再実行しないため）。
+    """
+    args = parse_args([])
+    vars(args).update(journal.args)
+    args.output_dir = str(journal.path.parent)
+    args.force = []
+    return args
+
+
+def batch_jobs(args: argparse.Namespace) -> List[argparse.Namespace]:
+    """
+    --count / --types から動画ごとの引数を作る
+
+    1 本だけなら args をそのまま使う。複数の場合は出力ディレクトリに連番を付け、
+    読み込んだモデルやプロンプトの一覧をプロセス内で使い回す（keep_warm）。
+    """
+    types = [t.strip() for t in (getattr(args, "types", None) or "").split(",")]
+    types = [t for t in types if t]
+    count = getattr(args, "count", None) or len(types) or 1
+    if count == 1 and not types:
+        return [args]
+
+    jobs = []
+    for i in range(count):
+        job = copy.copy(args)
+        if count > 1:
+            job.output_dir = f"{args.output_dir}_{i + 1}"
+        if types:
+            job.lofi_type = types[i % len(types)]
+        job.keep_warm = True
+        jobs.append(job)
+    return jobs
+
+
+def shared_budget() -> ResourceBudget:
+    """複数の動画で共有する資源の枠（BATCH_CPU_SLOTS / BATCH_GPU_SLOTS）"""
+    return ResourceBudget(
+        {CPU_RESOURCE: Config.BATCH_CPU_SLOTS, GPU_RESOURCE: Config.BATCH_GPU_SLOTS}
+    )
+
+
+def _run_job(args: argparse.Namespace, budget: ResourceBudget) -> bool:
+    """1 本の動画を作る。失敗した場合は False（他の動画は続ける）"""
+    try:
+        LofiPostGenerator(args, budget).run()
+        return True
+    except SystemExit:
+        logger.error(f"==> 動画の作成に失敗しました: {args.output_dir}")
+        return False
+
+
+def run_batch(jobs: List[argparse.Namespace], workers: int) -> None:
+    """
+    複数の動画を 1 つのプロセスで作る
+
+    最大 workers 本を同時に進め、音声の結合・動画のエンコード（cpu）と
+    サムネイルの画像生成（gpu）はそれぞれ BATCH_CPU_SLOTS / BATCH_GPU_SLOTS の
+    枠を全ての動画で共有する。ある動画のエンコード中に次の動画のサムネイルを
+    生成し、API の待ち時間（音楽生成・アップロード）は枠を使わずに重ねる。
+    HTTP セッション・PiAPI のポーリング・拡散モデル・プロンプトの一覧は
+    プロセス内で共有する。
+    """
+    budget = shared_budget()
+    start_time = time.time()
+    logger.info(f"==> {len(jobs)}本の動画を作成します (同時に{workers}本)")
+    with ThreadPoolExecutor(
+        max_workers=max(1, workers), thread_name_prefix="job"
+    ) as executor:
+        succeeded = list(executor.map(lambda job: _run_job(job, budget), jobs))
+
+    failed = [job.output_dir for job, ok in zip(jobs, succeeded) if not ok]
+    elapsed_time = time.time() - start_time
+    logger.info(
+        f"==> バッチ完了: 成功 {len(jobs) - len(failed)}本 / 失敗 {len(failed)}本 "
+        f"(処理時間: {elapsed_time:.2f}秒)"
+    )
+    if failed:
+        logger.error(f"==> 失敗した出力ディレクトリ: {failed}")
+        sys.exit(1)
+
+
+def resume_unfinished_runs(output_dir: Path, exclude: Sequence[Path] = ()) -> None:
+    """
+    output_dir と同じ階層にある、終わっていない実行を古い順に再開する
+
+    完了したステージはマニフェストの記録を使って飛ばし、投入済みの PiAPI
+    タスクは結果を取得し直す。RUN_RESUME_MAX_ATTEMPTS 回試しても完了しない
+    実行は再開をあきらめ、新規生成した曲をストックに移す。
+    output_dir と exclude（今回実行した出力ディレクトリ）、ワーカーのジョブの
+    実行は再開しない。
+    """
+    output_dir = Path(output_dir)
+    for journal in find_unfinished_runs(
+        output_dir.absolute().parent, exclude=[output_dir, *exclude]
+    ):
+        run_dir = journal.path.parent
+        generator = LofiPostGenerator(restore_args(journal))
+        if journal.attempts >= Config.RUN_RESUME_MAX_ATTEMPTS:
+            logger.warning(f"==> 再開をあきらめます: {run_dir}")
+            generator.abandon()
+            continue
+
+        logger.info(
+            f"==> 中断した実行を再開します: {run_dir} "
+            f"(前回完了したステージ: {journal.last_stage() or 'なし'})"
+        )
+        try:
+            generator.run()
+        except SystemExit:
+            logger.error(f"==> 再開した実行が失敗しました: {run_dir}")
 
 
 def main():
@@ -844,8 +1399,22 @@ def main():
         format="%(asctime)s %(levelname)s %(name)s: %(message)s",
     )
     args = parse_args()
-    generator = LofiPostGenerator(args)
-    generator.run()
+    jobs = batch_jobs(args)
+    error = None
+    try:
+        if len(jobs) > 1:
+            run_batch(jobs, args.batch_workers)
+        else:
+            LofiPostGenerator(jobs[0]).run()
+    except (Exception, SystemExit) as e:
+        error = e
+    # 中断した実行は今回の実行を待たせないよう後から再開する
+    if args.resume:
+        resume_unfinished_runs(
+            Path(args.output_dir), exclude=[Path(job.output_dir) for job in jobs]
+        )
+    if error is not None:
+        raise error
 
 
 if __name__ == "__main__":
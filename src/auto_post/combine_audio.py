@@ -7,19 +7,24 @@ combine_audio.py
 ・フェード長はオプション (--fade) で指定可能（デフォ 3000 ms）。
 ・曲の開始位置一覧を JSON でも保存し、実行時に見やすいフォーマットで表示。
 ・環境音 (BGM) を重ねる機能もあり (--ambient)。
+・--streaming を指定すると 1 曲ずつデコードし、クロスフェード区間だけを処理して
+  PCM をそのまま ffmpeg エンコーダへ流し込む（ミックス長に関わらずメモリ一定）。
+・--format で出力形式を選べる（mp3 / m4a / flac / wav）。m4a（AAC）は動画の
+  音声トラックとしてそのまま多重化できるため、動画生成時に再エンコードが不要になる。
 
 Usage
 -----
 python combine_audio.py --input-dir ./audio --output-dir ./out \\
-    --fade 4000 --ambient rain.mp3
+    --fade 4000 --ambient rain.mp3 --streaming --format m4a
 """
 
 import argparse
 import json
 import logging
 import random
+import subprocess
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, NamedTuple, Optional, Tuple
 
 from pydub import AudioSegment
 
@@ -27,13 +32,52 @@ from pydub import AudioSegment
 logger = logging.getLogger(__name__)
 
 
+class AudioFormat(NamedTuple):
+    """結合トラックの出力形式"""
+
+    suffix: str  # 拡張子
+    container: str  # ffmpeg の -f に渡すフォーマット名
+    codec_args: Tuple[str, ...]  # エンコーダの引数
+
+
+# 出力形式（m4a は動画へそのまま多重化できる AAC、flac / wav は可逆の中間形式）
+AUDIO_FORMATS = {
+    "mp3": AudioFormat(".mp3", "mp3", ()),
+    "m4a": AudioFormat(".m4a", "ipod", ("-c:a", "aac", "-b:a", "192k")),
+    "flac": AudioFormat(".flac", "flac", ()),
+    "wav": AudioFormat(".wav", "wav", ()),
+}
+
+
 # -------------------------------------------------------------------
 # ヘルパー関数
 # -------------------------------------------------------------------
 def get_audio_files(directory: Path) -> List[Path]:
-    """ディレクトリ内のmp3ファイルリストを返す（自然順）"""
+    """ディレクトリ内のmp3ファイルリストを返す（自然順、空のファイルは除く）"""
     files = sorted(directory.glob("*.mp3"))
-    return [file for file in files if not file.stem.startswith("combined_audio")]
+    return [
+        file
+        for file in files
+        if not file.stem.startswith("combined_audio") and file.stat().st_size > 0
+    ]
+
+
+def combined_audio_path(output_dir: Path, audio_format: str = "mp3") -> Path:
+    """出力形式に応じた結合トラックのパス"""
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"未対応の出力形式です: {audio_format}")
+    return Path(output_dir) / f"combined_audio{AUDIO_FORMATS[audio_format].suffix}"
+
+
+def export_combined(
+    combined: AudioSegment, output_path: Path, audio_format: str = "mp3"
+) -> None:
+    """結合した音声を指定の形式で書き出す"""
+    if audio_format == "mp3":
+        combined.export(output_path, format="mp3")
+        return
+    fmt = AUDIO_FORMATS[audio_format]
+    combined.export(output_path, format=fmt.container, parameters=list(fmt.codec_args))
 
 
 def human_minutes(seconds: float) -> str:
@@ -128,6 +172,253 @@ def combine_tracks(
     return combined, info
 
 
+# -------------------------------------------------------------------
+# ストリーミング結合
+# -------------------------------------------------------------------
+# ffmpeg の raw PCM フォーマット名（sample_width → フォーマット）
+_PCM_FORMATS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+
+# エンコーダへ一度に書き込むPCMの長さ（ミリ秒）
+STREAM_CHUNK_MS = 10_000
+
+
+def _len_ms(frames: int, frame_rate: int) -> int:
+    """フレーム数をpydubと同じ丸め方でミリ秒に変換する"""
+    return round(1000 * (frames / frame_rate))
+
+
+def _open_pcm_encoder(
+    output_path: Path,
+    frame_rate: int,
+    channels: int,
+    sample_width: int,
+    audio_format: str = "mp3",
+) -> subprocess.Popen:
+    """raw PCM を標準入力から受け取って指定の形式で書き出す ffmpeg プロセスを起動する"""
+    fmt = AUDIO_FORMATS[audio_format]
+    command = [
+        AudioSegment.converter,
+        "-y",
+        "-nostats",
+        "-loglevel",
+        "error",
+        "-f",
+        _PCM_FORMATS[sample_width],
+        "-ar",
+        str(frame_rate),
+        "-ac",
+        str(channels),
+        "-i",
+        "pipe:0",
+        *fmt.codec_args,
+        "-f",
+        fmt.container,
+        str(output_path),
+    ]
+    return subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+
+def _load_ambient_source(
+    ambient: str, input_dir: Path
+) -> Optional[Tuple[AudioSegment, bool]]:
+    """
+    環境音を (音声, ループ有無) で返す。combine_audio と同じ解決ロジックを使う
+
+    - そのまま読み込めた場合は原音量・ループなしで重ねる
+    - 読み込めない場合は input_dir 基準で解決し、-10dB・ループありで重ねる
+    """
+    try:
+        return AudioSegment.from_file(str(ambient), format="mp3"), False
+    except Exception:
+        ambient_path = Path(ambient)
+        if not ambient_path.is_absolute():
+            ambient_path = input_dir / ambient
+        if not ambient_path.exists():
+            logger.error(f"==> 環境音ファイルが見つかりません: {ambient_path}")
+            return None
+        return AudioSegment.from_file(str(ambient_path), format="mp3") - 10, True
+
+
+class _PcmStreamWriter:
+    """結合済みPCMを環境音と重ねながら順にエンコーダへ書き込む"""
+
+    def __init__(
+        self,
+        encoder: subprocess.Popen,
+        ambient: Optional[AudioSegment] = None,
+        loop_ambient: bool = False,
+    ):
+        self.encoder = encoder
+        self.ambient = ambient
+        self.loop_ambient = loop_ambient
+        self.frames_written = 0
+
+    def _ambient_piece(self, frame_count: int) -> Optional[AudioSegment]:
+        """書き込み位置に対応する環境音の区間を返す"""
+        total = int(self.ambient.frame_count())
+        if total == 0:
+            return None
+        start = self.frames_written
+        if not self.loop_ambient:
+            if start >= total:
+                return None
+            return self.ambient.get_sample_slice(start, min(total, start + frame_count))
+
+        pieces = []
+        remaining = frame_count
+        pos = start % total
+        while remaining > 0:
+            end = min(total, pos + remaining)
+            pieces.append(self.ambient.get_sample_slice(pos, end))
+            remaining -= end - pos
+            pos = 0
+        piece = pieces[0]
+        for extra in pieces[1:]:
+            piece = piece + extra
+        return piece
+
+    def write(self, segment: AudioSegment) -> None:
+        """セグメントをチャンクに分けて書き込む"""
+        chunk_frames = int(segment.frame_count(ms=STREAM_CHUNK_MS))
+        total = int(segment.frame_count())
+        for start in range(0, total, chunk_frames):
+            chunk = segment.get_sample_slice(start, min(total, start + chunk_frames))
+            if self.ambient is not None:
+                piece = self._ambient_piece(int(chunk.frame_count()))
+                if piece is not None:
+                    chunk = chunk.overlay(piece)
+            self.encoder.stdin.write(chunk.raw_data)
+            self.frames_written += int(chunk.frame_count())
+
+
+def _split_frame(
+    pending: AudioSegment, position_ms: int, writer: _PcmStreamWriter
+) -> int:
+    """結合音声全体での位置(ms)を、未書き出し部分(pending)内のフレーム位置に変換する"""
+    split = int(pending.frame_count(ms=position_ms)) - writer.frames_written
+    return max(0, split)
+
+
+def stream_combine_tracks(
+    tracks: List[Path],
+    output_path: Path,
+    fade_ms: int = 3000,
+    ambient: Optional[AudioSegment] = None,
+    loop_ambient: bool = False,
+    audio_format: str = "mp3",
+) -> list:
+    """
+    トラックを1曲ずつデコードしながらクロスフェード結合し、直接エンコーダへ書き出す
+
+    メモリ上に保持するのは「まだ書き出していない最後のトラック」だけなので、
+    ミックス全体の長さに関わらずメモリ使用量は一定になる。
+    クロスフェード区間の切り出し位置は combine_tracks（pydub の append）と
+    同じ計算をしているため、トラック情報は combine_tracks と同一になる。
+
+    Args:
+        tracks (List[Path]): 結合するmp3ファイルのパスリスト
+        output_path (Path): 書き出し先のパス
+        fade_ms (int): フェード長（ミリ秒）
+        ambient (Optional[AudioSegment]): 重ねる環境音
+        loop_ambient (bool): 環境音をループさせるかどうか
+        audio_format (str): 出力形式（AUDIO_FORMATS のキー）
+
+    Returns:
+        list: トラック情報のリスト（combine_tracks と同じ形式）
+    """
+    if not tracks:
+        raise ValueError("トラックが提供されていません")
+
+    # バラエティのためにシャッフル
+    random.shuffle(tracks)
+
+    pending = AudioSegment.from_mp3(str(tracks[0]))
+    frame_rate = pending.frame_rate
+    channels = pending.channels
+    sample_width = pending.sample_width
+    if ambient is not None:
+        ambient = (
+            ambient.set_channels(channels)
+            .set_frame_rate(frame_rate)
+            .set_sample_width(sample_width)
+        )
+
+    encoder = _open_pcm_encoder(
+        output_path, frame_rate, channels, sample_width, audio_format
+    )
+    writer = _PcmStreamWriter(encoder, ambient, loop_ambient)
+
+    def total_frames() -> int:
+        return writer.frames_written + int(pending.frame_count())
+
+    info = [
+        dict(
+            title=tracks[0].stem,
+            original_title=tracks[0].stem,  # 元のファイル名を保持
+            start_time=0.0,
+            end_time=_len_ms(total_frames(), frame_rate) / 1000,
+        )
+    ]
+
+    try:
+        for path in tracks[1:]:
+            clip = (
+                AudioSegment.from_mp3(str(path))
+                .set_channels(channels)
+                .set_frame_rate(frame_rate)
+                .set_sample_width(sample_width)
+            )
+            current_length = _len_ms(total_frames(), frame_rate)
+
+            if 0 < fade_ms <= current_length and fade_ms <= len(clip):
+                # pydub の combined[-fade_ms:] と同じ位置で切り出す
+                split = _split_frame(pending, current_length - fade_ms, writer)
+                writer.write(pending.get_sample_slice(0, split))
+                tail = pending.get_sample_slice(split, None)
+                xf = tail.fade(to_gain=-120, start=0, end=float("inf"))
+                xf *= clip[:fade_ms].fade(from_gain=-120, start=0, end=float("inf"))
+                # 短いトラックが続いても次のクロスフェード区間を保持できるよう、
+                # クロスフェード部分は次の曲と一緒に保留しておく
+                pending = xf + clip[fade_ms:]
+            else:
+                writer.write(pending)
+                pending = clip
+
+            info.append(
+                dict(
+                    title=path.stem,
+                    original_title=path.stem,  # 元のファイル名を保持
+                    start_time=current_length / 1000,
+                    end_time=_len_ms(total_frames(), frame_rate) / 1000,
+                )
+            )
+
+        # 最後のトラックにフェードアウトを適用
+        total_length = _len_ms(total_frames(), frame_rate)
+        if fade_ms > 0 and total_length > fade_ms:
+            split = _split_frame(pending, total_length - fade_ms, writer)
+            writer.write(pending.get_sample_slice(0, split))
+            pending = pending.get_sample_slice(split, None).fade_out(fade_ms)
+        writer.write(pending)
+        encoder.stdin.close()
+    except Exception:
+        encoder.kill()
+        encoder.wait()
+        raise
+
+    stderr = encoder.stderr.read()
+    if encoder.wait() != 0:
+        raise RuntimeError(
+            f"ffmpeg のエンコードに失敗しました: {stderr.decode(errors='ignore')}"
+        )
+    return info
+
+
 # -------------------------------------------------------------------
 # メインエントリー
 # -------------------------------------------------------------------
@@ -151,13 +442,24 @@ def main() -> None:
         type=str,
         help="環境音 mp3 ファイル。--input-dir と同階層、または絶対パス可",
     )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="1 曲ずつデコードしてエンコーダへ直接書き出す（メモリ使用量一定）",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(AUDIO_FORMATS),
+        default="mp3",
+        help="出力形式。m4a は動画へ再エンコードなしで多重化できる (デフォ: mp3)",
+    )
     args = parser.parse_args()
 
     try:
         input_dir = Path(args.input_dir)
         output_dir = Path(args.output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
-        output_mp3 = output_dir / "combined_audio.mp3"
+        output_mp3 = combined_audio_path(output_dir, args.format)
         output_json = output_dir / "tracks_info.json"
 
         tracks = get_audio_files(input_dir)
@@ -167,22 +469,39 @@ def main() -> None:
 
         logger.info(f"==> {len(tracks)}個のトラックを見つけました。結合を開始します...")
 
-        combined, info = combine_tracks(tracks, fade_ms=args.fade)
-
-        # 環境音を重ねる
+        ambient_path = None
         if args.ambient:
             ambient_path = Path(args.ambient)
             if not ambient_path.is_absolute():
                 ambient_path = input_dir / args.ambient
-            if ambient_path.exists():
+            if not ambient_path.exists():
+                logger.error(f"==> 環境音ファイルが見つかりません: {ambient_path}")
+                ambient_path = None
+
+        if args.streaming:
+            ambient = None
+            if ambient_path:
+                logger.info(f"==> 環境音を重ねています: {ambient_path.name}")
+                ambient = AudioSegment.from_file(str(ambient_path), format="mp3") - 10
+            info = stream_combine_tracks(
+                tracks,
+                output_mp3,
+                fade_ms=args.fade,
+                ambient=ambient,
+                loop_ambient=True,
+                audio_format=args.format,
+            )
+        else:
+            combined, info = combine_tracks(tracks, fade_ms=args.fade)
+
+            # 環境音を重ねる
+            if ambient_path:
                 logger.info(f"==> 環境音を重ねています: {ambient_path.name}")
                 ambient = load_ambient(ambient_path, _safe_len_ms(combined))
                 combined = combined.overlay(ambient)
-            else:
-                logger.error(f"==> 環境音ファイルが見つかりません: {ambient_path}")
 
-        # mp3書き出し
-        combined.export(output_mp3, format="mp3")
+            # 書き出し
+            export_combined(combined, output_mp3, args.format)
         logger.info(f"==> 結合トラックを保存しました: {output_mp3}")
 
         # JSONを保存
@@ -208,13 +527,37 @@ def main() -> None:
         logger.error(f"エラー内容: {e}")
 
 
+def _save_tracks_info(info: list, output_json: Path) -> None:
+    """トラック情報をJSONに保存し、プレイリストを表示する"""
+    with open(output_json, "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+    # プレイリスト表示
+    logger.info("\n=== プレイリスト ===")
+    for entry in info:
+        mark = human_minutes(entry["start_time"])
+        logger.info(f"{mark}  {entry['title']}")
+
+    total_min = human_minutes(info[-1]["end_time"])
+
+    logger.info(f"\n==> 合計時間: {total_min}")
+    logger.info(f"==> トラックリストを保存しました: {output_json}")
+
+
 def combine_audio(
-    input_dir: Path, output_dir: Path, fade_ms: int = 3000, ambient: str = None
+    input_dir: Path,
+    output_dir: Path,
+    fade_ms: int = 3000,
+    ambient: str = None,
+    streaming: bool = False,
+    audio_format: str = "mp3",
 ) -> Tuple[Path, Path] | None:
     """
     ディレクトリ内の音声ファイルを結合する
 
     - 入力に Path/str のどちらも受け付ける
+    - streaming=True の場合は stream_combine_tracks で 1 曲ずつエンコーダへ書き出す
+    - audio_format で出力形式を選ぶ（m4a なら動画生成時に音声を再エンコードしない）
     - MP3が無い場合:
       * 呼び出し元がstrを渡している場合は ValueError を投げる（拡張テスト想定）
       * Pathを渡している場合は None を返す（基本テスト想定）
@@ -225,7 +568,7 @@ def combine_audio(
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     try:
-        output_mp3 = output_dir / "combined_audio.mp3"
+        output_mp3 = combined_audio_path(output_dir, audio_format)
         output_json = output_dir / "tracks_info.json"
 
         tracks = get_audio_files(input_dir)
@@ -245,6 +588,25 @@ def combine_audio(
 
         logger.info(f"==> {len(tracks)}個のトラックを見つけました。結合を開始します...")
 
+        if streaming:
+            ambient_source = None
+            if ambient:
+                ambient_source = _load_ambient_source(ambient, input_dir)
+                if ambient_source:
+                    logger.info(f"==> 環境音を重ねています: {Path(str(ambient)).name}")
+            amb, loop_ambient = ambient_source or (None, False)
+            info = stream_combine_tracks(
+                tracks,
+                output_mp3,
+                fade_ms=fade_ms,
+                ambient=amb,
+                loop_ambient=loop_ambient,
+                audio_format=audio_format,
+            )
+            logger.info(f"==> 結合トラックを保存しました: {output_mp3}")
+            _save_tracks_info(info, output_json)
+            return output_mp3, output_json
+
         combined, info = combine_tracks(tracks, fade_ms=fade_ms)
 
         # 環境音を重ねる
@@ -266,25 +628,11 @@ def combine_audio(
                 else:
                     logger.error(f"==> 環境音ファイルが見つかりません: {ambient_path}")
 
-        # mp3書き出し
-        combined.export(output_mp3, format="mp3")
+        # 書き出し
+        export_combined(combined, output_mp3, audio_format)
         logger.info(f"==> 結合トラックを保存しました: {output_mp3}")
 
-        # JSONを保存
-        with open(output_json, "w", encoding="utf-8") as f:
-            json.dump(info, f, ensure_ascii=False, indent=2)
-
-        # プレイリスト表示
-        logger.info("\n=== プレイリスト ===")
-        for entry in info:
-            mark = human_minutes(entry["start_time"])
-            logger.info(f"{mark}  {entry['title']}")
-
-        total_min = human_minutes(info[-1]["end_time"])
-
-        logger.info(f"\n==> 合計時間: {total_min}")
-        logger.info(f"==> トラックリストを保存しました: {output_json}")
-
+        _save_tracks_info(info, output_json)
         return output_mp3, output_json
 
     except Exception as e:
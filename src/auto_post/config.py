@@ -22,6 +22,49 @@ class Config:
     # ストックディレクトリ設定
     STOCK_AUDIO_BASE_DIR = Path(os.getenv("STOCK_AUDIO_BASE_DIR", "/tmp/music/lofi"))
     STOCK_IMAGE_BASE_DIR = Path(os.getenv("STOCK_IMAGE_BASE_DIR", "/tmp/image"))
+    STOCK_CATALOG_PATH = Path(
+        os.getenv(
+            "STOCK_CATALOG_PATH", str(STOCK_AUDIO_BASE_DIR / "stock_catalog.sqlite3")
+        )
+    )
+
+    # PiAPI設定
+    PIAPI_CONCURRENCY = int(os.getenv("PIAPI_CONCURRENCY", "1"))
+    PIAPI_ALL_VARIANTS = os.getenv("PIAPI_ALL_VARIANTS", "false").lower() == "true"
+    PIAPI_PIPELINE = os.getenv("PIAPI_PIPELINE", "false").lower() == "true"
+    PIAPI_POLL_STATS_PATH = Path(
+        os.getenv(
+            "PIAPI_POLL_STATS_PATH", str(STOCK_AUDIO_BASE_DIR / "piapi_poll_stats.json")
+        )
+    )
+
+    # 音声結合設定（mp3 / m4a: 動画へ再エンコードなしで多重化できる AAC / flac / wav）
+    COMBINED_AUDIO_FORMAT = os.getenv("COMBINED_AUDIO_FORMAT", "mp3")
+
+    # 動画設定
+    VIDEO_RENDER_ENGINE = os.getenv("VIDEO_RENDER_ENGINE", "moviepy")
+    VIDEO_SEGMENT_WORKERS = int(os.getenv("VIDEO_SEGMENT_WORKERS", "1"))
+    VIDEO_SEGMENT_SEC = float(os.getenv("VIDEO_SEGMENT_SEC", "300"))
+    VIDEO_MAIN_FPS = int(os.getenv("VIDEO_MAIN_FPS", "24"))
+    OPENING_CACHE = os.getenv("OPENING_CACHE", "true").lower() == "true"
+    VIDEO_CACHE_DIR = Path(
+        os.getenv("VIDEO_CACHE_DIR", str(Path.home() / ".cache" / "auto_post"))
+    )
+
+    # パイプライン設定
+    PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+    RUN_RESUME = os.getenv("RUN_RESUME", "false").lower() == "true"
+    RUN_RESUME_MAX_ATTEMPTS = int(os.getenv("RUN_RESUME_MAX_ATTEMPTS", "3"))
+
+    # バッチ設定
+    BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "2"))
+    BATCH_CPU_SLOTS = int(os.getenv("BATCH_CPU_SLOTS", "1"))
+    BATCH_GPU_SLOTS = int(os.getenv("BATCH_GPU_SLOTS", "1"))
+
+    # ワーカー設定
+    WORKER_QUEUE_PATH = Path(os.getenv("WORKER_QUEUE_PATH", "jobs.sqlite3"))
+    WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+    WORKER_POLL_SEC = float(os.getenv("WORKER_POLL_SEC", "30"))
 
     # ファイルパス設定
     JSONL_PATH = Path(
@@ -22,9 +22,9 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, List
 
-import requests
 from dotenv import load_dotenv
 
+from . import http_client
 from .config import Config
 
 # Load environment variables
@@ -105,7 +105,7 @@ def call_openai(prompt: str, max_tokens: int = 100, temp: float = 0.7) -> str:
     }
 
     try:
-        r = requests.post(OPENAI_API_URL, json=payload, headers=headers, timeout=60)
+        r = http_client.post(OPENAI_API_URL, json=payload, headers=headers, timeout=60)
         if r.status_code == 200:
             data = r.json()
             if "choices" in data and data["choices"]:
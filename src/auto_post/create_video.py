@@ -5,14 +5,20 @@ create_video.py
 
 構成
 1. 冒頭に opening.mov（スクリプトと同じディレクトリに置く）を 3 秒間再生
+   （メイン部と同じ形式に一度だけ変換してキャッシュし、再エンコードなしで連結）
 2. メイン部は静止画＋カラーバック＋おしゃれな波形アニメーション
-3. オーディオは mp3 まるごと
+   （波形はフレームごとの音量エンベロープから描画し、音源の横に .npy でキャッシュ）
+3. オーディオは音源まるごと（AAC の .m4a なら再エンコードせずにそのまま多重化）
 4. エンコード設定は libx264 / aac / 24 fps / faststart
 
+メイン部は区間ごとにエンコードし、書き出し済みの区間を <出力名>_segments/manifest.json
+に記録する。途中で落ちても、同じ入力で再実行すれば残りの区間だけをエンコードする。
+
 使い方
 python create_video.py --image ./thumbs/my_thumb.png \
     --audio ./mix/combined_audio.mp3 --output ./out
-# mp3 または wav に対応
+# mp3 / wav / flac / m4a に対応
+# --preview を付けると 480p・抜粋のみの確認用動画を数秒で書き出す
 
 依存
 - moviepy >= 2.0
@@ -20,10 +26,18 @@ python create_video.py --image ./thumbs/my_thumb.png \
 """
 
 import argparse
+import hashlib
+import json
 import logging
+import math
 import os
+import shutil
+import subprocess
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import numpy as np
 from moviepy import (
@@ -34,63 +48,172 @@ from moviepy import (
     VideoFileClip,
     concatenate_videoclips,
 )
+from moviepy.audio.AudioClip import AudioClip
+from moviepy.config import FFMPEG_BINARY
 from moviepy.video.fx import Resize
 from moviepy.video.VideoClip import VideoClip
 
+from .audio_envelope import compute_envelope, load_or_compute_envelope
+
 # Logger
 logger = logging.getLogger(__name__)
 
+# 波形の音量の量子化段階と、描画済みフレームを保持する数
+VOLUME_LEVELS = 256
+FRAME_CACHE_SIZE = 128
+
+# 動画のサイズとエンコード設定
+VIDEO_SIZE = (1920, 1080)
+VIDEO_FPS = 24
+VIDEO_PRESET = "medium"
+VIDEO_BITRATE = "6000k"
+# エンコードのスレッド数（None なら libx264 の自動設定。MoviePy で一括に書き出す
+# 場合は 8、区間ごとに書き出す場合は 1）
+VIDEO_THREADS = None
+AUDIO_BITRATE = "192k"
+WAVEFORM_SIZE = (int(VIDEO_SIZE[0] * 0.5), 80)
+WAVEFORM_MARGIN = 20
+WAVEFORM_COLOR = "0xF0D669"
+
+# プレビュー（--preview）のサイズ・エンコード設定と、抜き出す区間の数・長さ（秒）
+PREVIEW_SIZE = (854, 480)
+PREVIEW_PRESET = "ultrafast"
+PREVIEW_BITRATE = "1000k"
+PREVIEW_EXCERPTS = 3
+PREVIEW_EXCERPT_SEC = 5.0
+
+# 描画エンジン（moviepy: フレームごとに合成 / ffmpeg: フィルタグラフで一括処理）
+# 波形の見た目は同じではない。moviepy は音量エンベロープに合わせて伸縮する 30 本の
+# バー、ffmpeg は showwaves の縦線（mode=cline）で音声の波形そのものを描く
+RENDER_ENGINES = ("moviepy", "ffmpeg")
+
+# 再エンコードせずに動画へ多重化できる音声（AAC）の拡張子
+COPY_AUDIO_SUFFIXES = (".m4a",)
+
+# 区間ごとの並列エンコードで使う GOP（フレーム数）。区間の長さはこの倍数にする
+SEGMENT_GOP = VIDEO_FPS * 10
+
+# 連結する全ての区間で揃える mp4 のタイムスケール（ストリームコピーで連結するため）
+VIDEO_TIMESCALE = VIDEO_FPS * 512
+
+# 区間ごとの書き出し状況を記録するファイル（作業ディレクトリ内）
+SEGMENT_MANIFEST = "manifest.json"
+
+# 変換済みオープニングのキャッシュを、使われなくなってから残しておく時間（秒）
+# （設定の違う別のプロセスが連結に使っている最中のものは消さない）
+OPENING_CACHE_KEEP_SEC = 24 * 60 * 60
+
+# 静止画モード（メイン部を VIDEO_FPS 未満で描画する場合）の GOP の長さ（秒）
+STILL_GOP_SEC = 30
+
+# 直前と全く同じフレームを落とす（max: 連続して落とす最大数 = 最低 1 秒に 1 枚は残す）
+DECIMATE_FILTER = "mpdecimate=hi=0:lo=0:frac=0:max={fps}"
+
 
 # --------------------------------------------------------------
 # 波形アニメーション生成
 # --------------------------------------------------------------
 class WaveformClip(VideoClip):
-    def __init__(self, audio_clip, width, height, fps=24):
+    """
+    フレームごとの音量（RMS エンベロープ）に合わせて伸縮するバー波形
+
+    音源全体をメモリに読み込まず、事前に求めたエンベロープだけで描画する。
+    音量を VOLUME_LEVELS 段階に量子化し、バーの高さが同じになる段階を
+    1 つの状態にまとめる。描画したフレームは状態ごとに LRU で使い回す
+    （アニメーションの状態は数百通りしかない）。
+    """
+
+    def __init__(self, audio_clip, width, height, fps=24, envelope=None):
         super().__init__(duration=audio_clip.duration)
         self.audio_clip = audio_clip
         self.width = width
         self.height = height
         self.size = (width, height)
-        self.samples = audio_clip.to_soundarray(fps=44100)
-        if self.samples.ndim > 1:
-            self.samples = self.samples.mean(axis=1)
-        self.samples = self.samples / np.max(np.abs(self.samples))
-        self.total = len(self.samples)
+        if envelope is None:
+            envelope = compute_envelope(audio_clip, fps)
+        self.envelope = np.asarray(envelope, dtype=np.float32)
         self.bars = 30  # バーの数を減らしてシンプルに
-        self.section = self.total // self.bars
         self.bar_heights = [
-            np.mean(np.abs(self.samples[i * self.section : (i + 1) * self.section]))
-            for i in range(self.bars)
+            float(np.mean(section)) if len(section) else 0.0
+            for section in np.array_split(self.envelope, self.bars)
         ]
         self.bar_w = int(width / (self.bars * 1.2))  # バーの幅を調整
         self.spacing = int((width - self.bars * self.bar_w) / self.bars)
         self.center_y = height // 2
         self.main_color = np.array([240, 214, 105], dtype=np.uint8)
         self.fps = fps
+        self._init_renderer()
         self.frame_function = self.make_frame
 
+    def _init_renderer(self):
+        """描画用のバッファと、列ごとのバー番号を用意する"""
+        # 列ごとのバー番号（バーのない列は -1）
+        self._column_bar = np.full(self.width, -1, dtype=np.int64)
+        if self.bar_w > 0:
+            for i in range(self.bars):
+                x = i * (self.bar_w + self.spacing)
+                self._column_bar[x : x + self.bar_w] = i
+        self._base_heights = np.asarray(self.bar_heights, dtype=np.float64)
+        self._rows = np.arange(self.height)[:, None]
+        self._mask = np.empty((self.height, self.width), dtype=bool)
+        self._mask_end = np.empty((self.height, self.width), dtype=bool)
+        self._rgba = np.append(self.main_color, 255).astype(np.uint8)
+
+        # 量子化した音量ごとのバーの高さ。同じ高さになる段階は 1 つの状態にまとめる
+        scale = 1 + np.arange(VOLUME_LEVELS) / (VOLUME_LEVELS - 1) * 2
+        heights = (self._base_heights[None, :] * self.height * scale[:, None]).astype(
+            np.int64
+        )
+        np.minimum(heights, self.height // 2 - 2, out=heights)  # 最大高さを制限
+        self._state_heights, level_state = np.unique(
+            heights, axis=0, return_inverse=True
+        )
+        # 動画のフレーム番号 → 状態番号
+        levels = np.rint(np.clip(self.envelope, 0.0, 1.0) * (VOLUME_LEVELS - 1))
+        self._frame_state = level_state.reshape(-1)[levels.astype(np.int64)]
+        # 状態番号 → 描画済みフレーム（古いものから再利用する）
+        self._frames: OrderedDict = OrderedDict()
+
+    def _render(self, state: int, out: np.ndarray) -> np.ndarray:
+        """状態 state のフレームを out に描画する"""
+        heights = self._state_heights[state]
+        column_h = np.where(self._column_bar >= 0, heights[self._column_bar], 0)
+        y_start = np.maximum(0, self.center_y - column_h)
+        y_end = np.minimum(self.height, self.center_y + column_h)
+
+        # 全てのバーの範囲を 1 つのマスクで求める
+        np.greater_equal(self._rows, y_start, out=self._mask)
+        np.less(self._rows, y_end, out=self._mask_end)
+        self._mask &= self._mask_end
+
+        out.fill(0)
+        out[self._mask] = self._rgba
+        return out
+
+    def state_at(self, t) -> int:
+        """時刻 t のフレームの状態番号（同じ番号なら同じ絵になる）"""
+        index = min(int(t * self.fps), len(self._frame_state) - 1)
+        return int(self._frame_state[max(0, index)])
+
     def make_frame(self, t):
-        # 4チャンネル（RGBA）の配列を作成
-        img = np.zeros((self.height, self.width, 4), dtype=np.uint8)
-        pos = int(t * self.total / self.duration)
-        win = self.samples[max(0, pos - 2205) : pos]
-        if len(win):
-            volume = np.mean(np.abs(win))
+        state = self.state_at(t)
+
+        frame = self._frames.get(state)
+        if frame is not None:
+            self._frames.move_to_end(state)
+            return frame
+
+        if len(self._frames) >= FRAME_CACHE_SIZE:
+            _, frame = self._frames.popitem(last=False)
+            frame.flags.writeable = True
         else:
-            volume = 0
-        scale = 1 + volume * 2  # スケールを小さくして控えめに
-        for i, base_h in enumerate(self.bar_heights):
-            h = int(base_h * self.height * scale)
-            h = min(h, self.height // 2 - 2)  # 最大高さを制限
-            x = i * (self.bar_w + self.spacing)
-            y_start = max(0, self.center_y - h)
-            y_end = min(self.height, self.center_y + h)
-            if y_end > y_start and self.bar_w > 0:
-                # RGBチャンネルに色を設定
-                img[y_start:y_end, x : x + self.bar_w, :3] = self.main_color
-                # アルファチャンネルを255（不透明）に設定
-                img[y_start:y_end, x : x + self.bar_w, 3] = 255
-        return img
+            # 4チャンネル（RGBA）の配列を作成
+            frame = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        self._render(state, frame)
+        # キャッシュしたフレームが書き換えられないようにする
+        frame.flags.writeable = False
+        self._frames[state] = frame
+        return frame
 
 
 def create_waveform_clip(
@@ -99,11 +222,15 @@ def create_waveform_clip(
     height: int = 120,
     fps: int = 24,
     duration: Optional[float] = None,
+    envelope: Optional[np.ndarray] = None,
+    audio_path: Optional[Path] = None,
 ):
     """波形用の簡易クリップを生成する。
 
     - audio_source がMoviePyのオーディオクリップの場合: WaveformClipを返す
     - audio_source がnumpy.ndarrayやモックの場合: 無地のColorClipを返す（テスト用）
+    - envelope を渡すとフレームごとの音量の計算を省略する
+    - audio_path を渡すと音量エンベロープを音源の横に .npy でキャッシュする
     """
     # numpy配列はダミー
     if isinstance(audio_source, np.ndarray):
@@ -112,15 +239,8 @@ def create_waveform_clip(
             fps
         )
 
-    # 本物のAudioClipかを軽く判定
-    is_real = False
-    try:
-        arr = audio_source.to_soundarray(fps=44100)  # モックならMockが返る
-        is_real = isinstance(arr, np.ndarray)
-    except Exception:
-        is_real = False
-
-    if not is_real:
+    # 本物のAudioClipかを判定（音源全体を読み込まないよう型で判定する）
+    if not isinstance(audio_source, AudioClip):
         dur = (
             duration
             if duration is not None
@@ -130,19 +250,992 @@ def create_waveform_clip(
             fps
         )
 
-    return WaveformClip(audio_source, width, height, fps).with_fps(fps)
+    if envelope is None and audio_path is not None:
+        envelope = load_or_compute_envelope(Path(audio_path), audio_source, fps)
+    return WaveformClip(audio_source, width, height, fps, envelope).with_fps(fps)
+
+
+# --------------------------------------------------------------
+# ffmpeg フィルタグラフによる描画
+# --------------------------------------------------------------
+def _frame_size(preview: bool = False) -> Tuple[int, int]:
+    return PREVIEW_SIZE if preview else VIDEO_SIZE
+
+
+def _waveform_layout(preview: bool = False) -> Tuple[int, int, int]:
+    """波形の (幅, 高さ, 下端からの余白)。プレビューでは画面の縮小率に合わせる"""
+    wf_w, wf_h = WAVEFORM_SIZE
+    if not preview:
+        return wf_w, wf_h, WAVEFORM_MARGIN
+    ratio = PREVIEW_SIZE[1] / VIDEO_SIZE[1]
+    return (
+        max(2, int(wf_w * ratio) // 2 * 2),
+        max(2, int(wf_h * ratio) // 2 * 2),
+        round(WAVEFORM_MARGIN * ratio),
+    )
+
+
+def _opening_input_args(opening_path: Optional[Path], preview: bool = False) -> list:
+    """オープニング（なければ 3 秒の黒画面）の入力引数"""
+    if opening_path is not None and Path(opening_path).exists():
+        return ["-i", str(opening_path)]
+    W, H = _frame_size(preview)
+    return ["-f", "lavfi", "-i", f"color=c=black:s={W}x{H}:r={VIDEO_FPS}:d=3"]
+
+
+def _still_input_args(
+    still_path: Path, duration: float, fps: Optional[int] = None
+) -> list:
+    """静止画を duration 秒ループさせる入力引数"""
+    return [
+        "-loop",
+        "1",
+        "-framerate",
+        str(fps or VIDEO_FPS),
+        "-t",
+        f"{duration:.3f}",
+        "-i",
+        str(still_path),
+    ]
+
+
+def _opening_filter(source: str, output: str, preview: bool = False) -> str:
+    W, H = _frame_size(preview)
+    return f"[{source}]scale={W}:{H},setsar=1,fps={VIDEO_FPS},format=yuv420p[{output}]"
+
+
+def _main_filter(
+    still: str,
+    audio: str,
+    output: str,
+    fps: Optional[int] = None,
+    preview: bool = False,
+) -> str:
+    """静止画を拡大し、音声から showwaves で生成した波形を画面下部に重ねる"""
+    W, H = _frame_size(preview)
+    wf_w, wf_h, margin = _waveform_layout(preview)
+    fps = fps or VIDEO_FPS
+    tail = f",{DECIMATE_FILTER.format(fps=fps)}" if is_still_mode(fps) else ""
+    return ";".join(
+        [
+            f"[{still}]scale={W}:{H},setsar=1,format=yuv420p[still]",
+            f"[{audio}]showwaves=s={wf_w}x{wf_h}:mode=cline:rate={fps}"
+            f":colors={WAVEFORM_COLOR}:scale=sqrt,format=rgba[wave]",
+            f"[still][wave]overlay=x=(W-w)/2:y=H-h-{margin}"
+            f":eof_action=pass,format=yuv420p{tail}[{output}]",
+        ]
+    )
+
+
+def is_still_mode(fps: int) -> bool:
+    """メイン部を VIDEO_FPS 未満で描画する静止画モードかどうか"""
+    return fps < VIDEO_FPS
+
+
+def _main_gop(fps: int) -> int:
+    """メイン部の GOP（静止画モードでは STILL_GOP_SEC 秒）"""
+    return fps * STILL_GOP_SEC if is_still_mode(fps) else SEGMENT_GOP
+
+
+def _encode_settings(preview: bool = False) -> Tuple[str, str]:
+    """(preset, ビットレート)"""
+    if preview:
+        return PREVIEW_PRESET, PREVIEW_BITRATE
+    return VIDEO_PRESET, VIDEO_BITRATE
+
+
+def _video_codec_args(
+    gop: Optional[int] = None, fps: Optional[int] = None, preview: bool = False
+) -> list:
+    """
+    全ての描画方法で共通の映像エンコード設定
+
+    fps が VIDEO_FPS 未満の場合は静止画向けの設定（tune=stillimage）にし、
+    重複フレームを落とした可変フレームレートのまま書き出す。
+    """
+    fps = fps or VIDEO_FPS
+    preset, bitrate = _encode_settings(preview)
+    args = ["-c:v", "libx264", "-preset", preset, "-b:v", bitrate]
+    if is_still_mode(fps):
+        args += ["-tune", "stillimage", "-fps_mode", "vfr"]
+    else:
+        args += ["-r", str(fps)]
+    args += ["-pix_fmt", "yuv420p"]
+    if VIDEO_THREADS:
+        args += ["-threads", str(VIDEO_THREADS)]
+    if gop:
+        args += ["-g", str(gop), "-keyint_min", str(gop)]
+        args += ["-video_track_timescale", str(VIDEO_TIMESCALE)]
+    return args
+
+
+def audio_codec_args(audio_path: Path) -> list:
+    """音声の出力設定（AAC ならそのままコピー、それ以外は AAC にエンコード）"""
+    if Path(audio_path).suffix.lower() in COPY_AUDIO_SUFFIXES:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac", "-b:a", AUDIO_BITRATE]
+
+
+def build_ffmpeg_command(
+    still_path: Path,
+    audio_path: Path,
+    output_file: Path,
+    duration: float,
+    opening_path: Optional[Path] = None,
+) -> list:
+    """
+    静止画＋波形＋オープニング＋音声を 1 回の ffmpeg 実行で書き出すコマンドを作る
+
+    Python ではフレームを扱わず、以下を 1 つのフィルタグラフで処理する。
+    - 静止画をループ入力して 1920×1080 に拡大
+    - 音声から showwaves で波形を生成して画面下部に重ねる（MoviePy 版の
+      音量エンベロープの 30 本のバーではなく、音声の波形を縦線で描くため
+      見た目は異なる）
+    - オープニング（なければ 3 秒の黒画面）の後ろに連結
+    - 音声は冒頭から再生（MoviePy 版と同じタイミング）
+    """
+    command = [FFMPEG_BINARY, "-y", "-nostats", "-loglevel", "error"]
+    command += _opening_input_args(opening_path)
+    command += _still_input_args(still_path, duration)
+    command += ["-i", str(audio_path)]
+    filter_graph = ";".join(
+        [
+            _opening_filter("0:v", "opening"),
+            _main_filter("1:v", "2:a", "main"),
+            "[opening][main]concat=n=2:v=1:a=0[video]",
+        ]
+    )
+    command += ["-filter_complex", filter_graph, "-map", "[video]", "-map", "2:a"]
+    command += _video_codec_args() + audio_codec_args(audio_path)
+    command += ["-movflags", "+faststart", str(output_file)]
+    return command
+
+
+def build_mux_command(video_path: Path, audio_path: Path, output_file: Path) -> list:
+    """映像のみの動画に音声を多重化するコマンド（映像はコピー）"""
+    return [
+        FFMPEG_BINARY,
+        "-y",
+        "-nostats",
+        "-loglevel",
+        "error",
+        "-i",
+        str(video_path),
+        "-i",
+        str(audio_path),
+        "-map",
+        "0:v",
+        "-map",
+        "1:a",
+        "-c:v",
+        "copy",
+        *audio_codec_args(audio_path),
+        "-movflags",
+        "+faststart",
+        str(output_file),
+    ]
+
+
+def _run_ffmpeg(command: list) -> None:
+    result = subprocess.run(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg の動画生成に失敗しました: {result.stderr.decode(errors='ignore')}"
+        )
+
+
+def render_with_ffmpeg(
+    still_path: Path,
+    audio_path: Path,
+    output_file: Path,
+    duration: float,
+    opening_path: Optional[Path] = None,
+    opening_segment: Optional[Path] = None,
+) -> Path:
+    """
+    build_ffmpeg_command のコマンドを実行して動画を書き出す
+
+    opening_segment（cached_opening で変換済みのオープニング）を渡した場合は
+    メイン部だけを同じフィルタグラフで 1 回でエンコードし、オープニングと
+    再エンコードせずに連結する。
+    """
+    if opening_segment is not None:
+        main_file = output_file.with_name(f"{output_file.stem}_main.mp4")
+        try:
+            _run_ffmpeg(
+                build_main_segment_command(
+                    still_path, audio_path, main_file, 0.0, duration
+                )
+            )
+            return _concat_after_opening(
+                opening_segment, main_file, audio_path, output_file
+            )
+        finally:
+            main_file.unlink(missing_ok=True)
+
+    _run_ffmpeg(
+        build_ffmpeg_command(
+            still_path, audio_path, output_file, duration, opening_path
+        )
+    )
+    return output_file
+
+
+def _concat_after_opening(
+    opening_segment: Path, main_file: Path, audio_path: Path, output_file: Path
+) -> Path:
+    """変換済みのオープニングの後ろにメイン部を再エンコードせずに連結し、音声を多重化する"""
+    list_file = main_file.with_suffix(".txt")
+    list_file.write_text(
+        f"file '{Path(opening_segment).resolve()}'\nfile '{main_file.resolve()}'\n",
+        encoding="utf-8",
+    )
+    try:
+        _run_ffmpeg(build_concat_command(list_file, audio_path, output_file))
+    finally:
+        list_file.unlink(missing_ok=True)
+    return output_file
+
+
+# --------------------------------------------------------------
+# MoviePy による描画
+# --------------------------------------------------------------
+def _reuse_unchanged_frames(clip, waveform: WaveformClip):
+    """
+    波形の状態が直前のフレームと同じなら、合成し直さずに直前のフレームを返す
+
+    背景は静止画なので、画面全体は波形の状態だけで決まる。
+    """
+    compose = clip.frame_function
+    last = {"state": None, "frame": None}
+
+    def frame_function(t):
+        state = waveform.state_at(t)
+        if state != last["state"]:
+            last["state"], last["frame"] = state, compose(t)
+        return last["frame"]
+
+    clip.frame_function = frame_function
+    return clip
+
+
+def _compose_main_clip(
+    still_path: Path,
+    audio,
+    audio_path: Path,
+    duration: float,
+    fps: Optional[int] = None,
+    preview: bool = False,
+):
+    """静止画に波形を重ねたメイン部のクリップを作る"""
+    W, H = _frame_size(preview)
+    fps = fps or VIDEO_FPS
+
+    # 静止画の準備
+    img_clip = (
+        ImageClip(str(still_path))
+        .with_effects([Resize((W, H))])
+        .with_position("center")
+        .with_duration(duration)
+    )
+
+    # 波形
+    waveform_width, waveform_height, margin = _waveform_layout(preview)
+    wf_clip = create_waveform_clip(
+        audio,
+        width=waveform_width,
+        height=waveform_height,
+        fps=fps,
+        audio_path=audio_path,
+    ).with_position(("center", H - waveform_height - margin))
+
+    main_clip = CompositeVideoClip([img_clip, wf_clip], size=(W, H)).with_duration(
+        duration
+    )
+    if isinstance(wf_clip, WaveformClip):
+        main_clip = _reuse_unchanged_frames(main_clip, wf_clip)
+    return main_clip
+
+
+def render_with_moviepy(
+    still_path: Path,
+    audio,
+    audio_path: Path,
+    output_file: Path,
+    duration: float,
+    opening_path: Optional[Path] = None,
+    opening_segment: Optional[Path] = None,
+) -> Path:
+    """
+    MoviePy でフレームごとに合成して動画を書き出す
+
+    音声が AAC の場合は映像だけを書き出してから音声をコピーで多重化する
+    （MoviePy に音声を渡すと一度デコードして再エンコードされるため）。
+    opening_segment（cached_opening で変換済みのオープニング）を渡した場合は
+    メイン部だけを書き出し、オープニングと再エンコードせずに連結する。
+    """
+    W, H = VIDEO_SIZE
+
+    if opening_segment is not None:
+        main_clip = _compose_main_clip(still_path, audio, audio_path, duration)
+        main_file = output_file.with_name(f"{output_file.stem}_main.mp4")
+        try:
+            main_clip.write_videofile(
+                str(main_file),
+                codec="libx264",
+                audio=False,
+                fps=VIDEO_FPS,
+                threads=VIDEO_THREADS or 8,
+                preset=VIDEO_PRESET,
+                bitrate=VIDEO_BITRATE,
+                ffmpeg_params=_moviepy_segment_params(VIDEO_FPS),
+            )
+            return _concat_after_opening(
+                opening_segment, main_file, audio_path, output_file
+            )
+        finally:
+            main_file.unlink(missing_ok=True)
+
+    # オープニング
+    if opening_path is not None and Path(opening_path).exists():
+        opening_clip = VideoFileClip(str(opening_path)).with_effects([Resize((W, H))])
+    else:
+        opening_clip = ColorClip((W, H), color=(0, 0, 0), duration=3)
+
+    # 構成
+    main_clip = _compose_main_clip(still_path, audio, audio_path, duration)
+    final = concatenate_videoclips([opening_clip, main_clip], method="compose")
+
+    if Path(audio_path).suffix.lower() in COPY_AUDIO_SUFFIXES:
+        video_only = output_file.with_name(f"{output_file.stem}_video.mp4")
+        try:
+            final.write_videofile(
+                str(video_only),
+                codec="libx264",
+                audio=False,
+                fps=VIDEO_FPS,
+                threads=VIDEO_THREADS or 8,
+                preset=VIDEO_PRESET,
+                bitrate=VIDEO_BITRATE,
+            )
+            _run_ffmpeg(build_mux_command(video_only, audio_path, output_file))
+        finally:
+            video_only.unlink(missing_ok=True)
+        return output_file
+
+    # オーディオ付与（短い/長い場合は調整）
+    try:
+        adur = float(getattr(audio, "duration", 0) or 0)
+        fdur = float(getattr(final, "duration", 0) or adur)
+        if fdur and adur and fdur < adur:
+            audio = audio.subclip(0, fdur)
+    except Exception:
+        pass
+    final = final.with_audio(audio)
+
+    # 書き出し
+    final.write_videofile(
+        str(output_file),
+        codec="libx264",
+        audio_codec="aac",
+        fps=VIDEO_FPS,
+        threads=VIDEO_THREADS or 8,
+        preset=VIDEO_PRESET,
+        bitrate=VIDEO_BITRATE,
+        audio_bitrate=AUDIO_BITRATE,
+    )
+
+    return output_file
+
+
+# --------------------------------------------------------------
+# 区間ごとの並列エンコード
+# --------------------------------------------------------------
+def plan_segments(
+    duration: float,
+    segment_sec: float,
+    fps: Optional[int] = None,
+    gop: Optional[int] = None,
+) -> List[Tuple[float, float]]:
+    """
+    メイン部を GOP の倍数のフレーム数ごとの区間 (開始秒, 終了秒) に分ける
+
+    区間の境界は必ずフレーム境界かつキーフレームになるため、
+    区間ごとにエンコードした動画を再エンコードなしで連結できる。
+    """
+    fps = fps or VIDEO_FPS
+    gop = gop or SEGMENT_GOP
+    total_frames = max(1, int(math.ceil(duration * fps - 1e-6)))
+    segment_frames = max(1, round(segment_sec * fps / gop)) * gop
+    return [
+        (first / fps, min(duration, (first + segment_frames) / fps))
+        for first in range(0, total_frames, segment_frames)
+    ]
+
+
+def build_opening_segment_command(
+    opening_path: Optional[Path], output_file: Path, preview: bool = False
+) -> list:
+    """オープニングだけを映像のみでエンコードするコマンド"""
+    command = [FFMPEG_BINARY, "-y", "-nostats", "-loglevel", "error"]
+    command += _opening_input_args(opening_path, preview)
+    command += [
+        "-filter_complex",
+        _opening_filter("0:v", "video", preview),
+        "-map",
+        "[video]",
+    ]
+    command += _video_codec_args(SEGMENT_GOP, preview=preview)
+    command += ["-an", str(output_file)]
+    return command
+
+
+def build_main_segment_command(
+    still_path: Path,
+    audio_path: Path,
+    output_file: Path,
+    start: float,
+    end: float,
+    fps: Optional[int] = None,
+    preview: bool = False,
+) -> list:
+    """メイン部の start〜end 秒を映像のみでエンコードするコマンド（ffmpeg エンジン）"""
+    fps = fps or VIDEO_FPS
+    length = end - start
+    command = [FFMPEG_BINARY, "-y", "-nostats", "-loglevel", "error"]
+    command += _still_input_args(still_path, length, fps)
+    command += ["-ss", f"{start:.6f}", "-t", f"{length:.6f}", "-i", str(audio_path)]
+    command += ["-filter_complex", _main_filter("0:v", "1:a", "video", fps, preview)]
+    command += ["-map", "[video]"] + _video_codec_args(_main_gop(fps), fps, preview)
+    command += ["-an", str(output_file)]
+    return command
+
+
+def build_concat_command(list_file: Path, audio_path: Path, output_file: Path) -> list:
+    """区間の動画を再エンコードせずに連結し、音声を 1 回だけ多重化するコマンド"""
+    return [
+        FFMPEG_BINARY,
+        "-y",
+        "-nostats",
+        "-loglevel",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(list_file),
+        "-i",
+        str(audio_path),
+        "-map",
+        "0:v",
+        "-map",
+        "1:a",
+        "-c:v",
+        "copy",
+        *audio_codec_args(audio_path),
+        "-movflags",
+        "+faststart",
+        str(output_file),
+    ]
+
+
+def _encode_opening_segment(opening_path: Optional[Path], output_file: Path) -> Path:
+    _run_ffmpeg(build_opening_segment_command(opening_path, output_file))
+    return output_file
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def opening_cache_key(opening_path: Optional[Path]) -> str:
+    """
+    オープニングのキャッシュのキー
+
+    元ファイルの SHA-256 とエンコードコマンド（解像度・fps・コーデック・GOP・
+    タイムスケールなど）から作るため、どちらかが変われば別のキャッシュになる。
+    """
+    source = "black"
+    if opening_path is not None and Path(opening_path).exists():
+        source = _file_sha256(Path(opening_path))
+    command = build_opening_segment_command(opening_path, Path("opening.mp4"))
+    params = [arg for arg in command[1:-1] if arg != str(opening_path)]
+    payload = json.dumps([source, params])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def cached_opening(opening_path: Optional[Path], cache_dir: Path) -> Path:
+    """
+    メイン部と同じ形式に変換したオープニングを返す（なければ作成してキャッシュする）
+
+    新しく作成した場合は、元ファイルや設定が変わって使われなくなった古い
+    キャッシュ（OPENING_CACHE_KEEP_SEC 秒以上使われていないもの）を削除する。
+    """
+    cache_dir = Path(cache_dir)
+    cache_path = cache_dir / f"opening_{opening_cache_key(opening_path)}.mp4"
+    if cache_path.exists():
+        logger.info(f"==> オープニングのキャッシュを使用します: {cache_path}")
+        cache_path.touch()
+        return cache_path
+
+    logger.info(f"==> オープニングを変換してキャッシュします: {cache_path}")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.mp4")
+    try:
+        _encode_opening_segment(opening_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    _prune_opening_cache(cache_dir, keep=cache_path)
+    return cache_path
+
+
+def _prune_opening_cache(cache_dir: Path, keep: Path) -> None:
+    """keep 以外の古いオープニングのキャッシュを削除する（変換中の一時ファイルは残す）"""
+    threshold = time.time() - OPENING_CACHE_KEEP_SEC
+    for path in cache_dir.glob("opening_*.mp4"):
+        if path == keep or path.name.endswith(".tmp.mp4"):
+            continue
+        try:
+            if path.stat().st_mtime < threshold:
+                path.unlink()
+                logger.info(f"==> 古いオープニングのキャッシュを削除しました: {path}")
+        except FileNotFoundError:
+            continue
+
+
+def _moviepy_segment_params(fps: int) -> list:
+    """MoviePy で書き出すメイン部を、オープニングや他の区間と連結できる形にする設定"""
+    gop = _main_gop(fps)
+    params = ["-g", str(gop), "-keyint_min", str(gop)]
+    params += ["-video_track_timescale", str(VIDEO_TIMESCALE)]
+    if is_still_mode(fps):
+        params += ["-tune", "stillimage", "-fps_mode", "vfr"]
+        params += ["-vf", DECIMATE_FILTER.format(fps=fps)]
+    return params
+
+
+def _encode_main_segment(
+    engine: str,
+    still_path: Path,
+    audio_path: Path,
+    output_file: Path,
+    start: float,
+    end: float,
+    fps: Optional[int] = None,
+    preview: bool = False,
+) -> Path:
+    """メイン部の 1 区間をエンコードする（プロセスプールのワーカーで実行）"""
+    fps = fps or VIDEO_FPS
+    if engine == "ffmpeg":
+        _run_ffmpeg(
+            build_main_segment_command(
+                still_path, audio_path, output_file, start, end, fps, preview
+            )
+        )
+        return output_file
+
+    audio = AudioFileClip(str(audio_path))
+    try:
+        main_clip = _compose_main_clip(
+            still_path, audio, audio_path, audio.duration, fps, preview
+        )
+        main_clip.subclipped(start, end).write_videofile(
+            str(output_file),
+            codec="libx264",
+            audio=False,
+            fps=fps,
+            threads=VIDEO_THREADS or 1,
+            preset=_encode_settings(preview)[0],
+            bitrate=_encode_settings(preview)[1],
+            ffmpeg_params=_moviepy_segment_params(fps),
+            logger=None,
+        )
+    finally:
+        audio.close()
+    return output_file
+
+
+def _file_signature(path: Optional[Path]) -> Optional[list]:
+    """ファイルが変わったかどうかを判定するための (サイズ, 更新時刻)"""
+    if path is None or not Path(path).exists():
+        return None
+    stat = Path(path).stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _render_fingerprint(
+    still_path: Path,
+    audio_path: Path,
+    opening: Optional[Path],
+    engine: str,
+    main_fps: int,
+    segments: List[Tuple[float, float]],
+) -> dict:
+    """区間の再利用可否を判定するための入力とエンコード設定"""
+    return {
+        "still": [str(still_path), _file_signature(still_path)],
+        "audio": [str(audio_path), _file_signature(audio_path)],
+        "opening": [str(opening), _file_signature(opening)],
+        "engine": engine,
+        "main_fps": main_fps,
+        "segments": [[start, end] for start, end in segments],
+        "video": [list(VIDEO_SIZE), VIDEO_PRESET, VIDEO_BITRATE, VIDEO_TIMESCALE],
+        "waveform": [list(WAVEFORM_SIZE), WAVEFORM_MARGIN, WAVEFORM_COLOR],
+    }
+
+
+def _load_manifest(work_dir: Path, fingerprint: dict) -> dict:
+    """
+    前回の実行で書き出し済みの区間 {ファイル名: サイズ} を返す
+
+    入力やエンコード設定が変わっていた場合は作業ディレクトリを空にする。
+    """
+    manifest_path = work_dir / SEGMENT_MANIFEST
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = None
+    if manifest and manifest.get("fingerprint") == fingerprint:
+        return {
+            name: size
+            for name, size in manifest.get("completed", {}).items()
+            if (work_dir / name).exists() and (work_dir / name).stat().st_size == size
+        }
+    if manifest is not None:
+        logger.info("==> 入力または設定が変わったため、書き出し済みの区間を破棄します")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    return {}
+
+
+def _save_manifest(work_dir: Path, fingerprint: dict, completed: dict) -> None:
+    """書き出し済みの区間を記録する（一時ファイル経由で置き換える）"""
+    manifest_path = work_dir / SEGMENT_MANIFEST
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp_path.write_text(
+        json.dumps({"fingerprint": fingerprint, "completed": completed}, indent=2),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, manifest_path)
+
+
+def render_segmented(
+    still_path: Path,
+    audio_path: Path,
+    output_file: Path,
+    duration: float,
+    opening_path: Optional[Path] = None,
+    engine: str = "moviepy",
+    workers: int = 2,
+    segment_sec: float = 300,
+    opening_segment: Optional[Path] = None,
+    main_fps: Optional[int] = None,
+) -> Path:
+    """
+    オープニングとメイン部の各区間をプロセスプールで並列にエンコードし、
+    concat demuxer で再エンコードせずに連結してから音声を 1 回だけ多重化する
+
+    opening_segment（cached_opening で変換済みのオープニング）を渡した場合は
+    オープニングをエンコードせずにそのまま連結する。workers が 1 の場合は
+    プロセスプールを使わずに順にエンコードする。
+
+    main_fps が VIDEO_FPS 未満の場合、メイン部はそのフレームレートで描画し、
+    直前と同じフレームを落とした可変フレームレートの区間として連結する
+    （各区間の長さは連結リストの duration で指定する）。
+
+    書き出し済みの区間は作業ディレクトリ（<出力名>_segments）のマニフェストに
+    記録する。途中で失敗した場合は作業ディレクトリを残し、同じ入力・設定で
+    再実行すると未完了の区間だけをエンコードする。
+    """
+    main_fps = main_fps or VIDEO_FPS
+    segments = plan_segments(duration, segment_sec, main_fps, _main_gop(main_fps))
+    work_dir = output_file.with_name(f"{output_file.stem}_segments")
+    work_dir.mkdir(parents=True, exist_ok=True)
+    fingerprint = _render_fingerprint(
+        still_path,
+        audio_path,
+        opening_segment or opening_path,
+        engine,
+        main_fps,
+        segments,
+    )
+    completed = _load_manifest(work_dir, fingerprint)
+
+    # 出力ファイル → (関数, 引数...)
+    jobs = {}
+    if opening_segment is None:
+        opening_file = work_dir / "segment_0000.mp4"
+        jobs[opening_file] = (_encode_opening_segment, opening_path, opening_file)
+        segment_files = [opening_file]
+    else:
+        segment_files = [Path(opening_segment)]
+    for i, (start, end) in enumerate(segments, start=1):
+        path = work_dir / f"segment_{i:04d}.mp4"
+        jobs[path] = (
+            _encode_main_segment,
+            engine,
+            still_path,
+            audio_path,
+            path,
+            start,
+            end,
+            main_fps,
+        )
+        segment_files.append(path)
+    pending = [job for path, job in jobs.items() if path.name not in completed]
+
+    if completed:
+        logger.info(
+            f"==> 書き出し済みの {len(completed)} 区間を再利用し、"
+            f"残り {len(pending)} 区間をエンコードします"
+        )
+    elif workers > 1:
+        logger.info(
+            f"==> {len(pending)} 区間を {workers} プロセスで並列にエンコードします"
+        )
+
+    def mark_done(path: Path) -> None:
+        completed[path.name] = path.stat().st_size
+        _save_manifest(work_dir, fingerprint, completed)
+
+    if engine == "moviepy" and pending:
+        # エンベロープは先に 1 回だけ計算してキャッシュし、各ワーカーで読み込む
+        audio = AudioFileClip(str(audio_path))
+        try:
+            load_or_compute_envelope(audio_path, audio, main_fps)
+        finally:
+            audio.close()
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(*job) for job in pending]
+            for future in as_completed(futures):
+                mark_done(future.result())
+    else:
+        for job in pending:
+            mark_done(job[0](*job[1:]))
+
+    # メイン部の区間は末尾のフレームが落ちていても本来の長さで並べる
+    lengths = [None] + [end - start for start, end in segments]
+    list_file = work_dir / "segments.txt"
+    list_file.write_text(
+        "".join(
+            f"file '{path.resolve()}'\n"
+            + (f"duration {length:.6f}\n" if length else "")
+            for path, length in zip(segment_files, lengths)
+        ),
+        encoding="utf-8",
+    )
+    _run_ffmpeg(build_concat_command(list_file, audio_path, output_file))
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return output_file
+
+
+def plan_preview_excerpts(
+    duration: float,
+    count: int = PREVIEW_EXCERPTS,
+    excerpt_sec: float = PREVIEW_EXCERPT_SEC,
+    fps: Optional[int] = None,
+) -> List[Tuple[float, float]]:
+    """
+    プレビューに使うメイン部の区間 (開始秒, 終了秒) を決める
+
+    先頭から末尾まで等間隔に count 個の区間を取る（開始はフレーム境界に揃える）。
+    全体が count × excerpt_sec 秒以下なら全体を 1 区間とする。
+    """
+    fps = fps or VIDEO_FPS
+    count = max(1, count)
+    if duration <= count * excerpt_sec:
+        return [(0.0, duration)]
+    step = (duration - excerpt_sec) / (count - 1) if count > 1 else 0.0
+    excerpts = []
+    for i in range(count):
+        start = math.floor(i * step * fps) / fps
+        excerpts.append((start, min(duration, start + excerpt_sec)))
+    return excerpts
+
+
+def build_preview_concat_command(
+    list_file: Path,
+    audio_path: Path,
+    output_file: Path,
+    opening_sec: float,
+    excerpts: List[Tuple[float, float]],
+) -> list:
+    """
+    プレビューの区間を再エンコードせずに連結し、各区間に対応する音声を
+    元の音源から切り出して並べるコマンド
+
+    音声は本番の動画と同じく冒頭から再生される前提で、オープニングの
+    0〜opening_sec 秒と、各区間（オープニングの長さだけ後ろにずれる）を使う。
+    """
+    ranges = [(0.0, opening_sec)] + [
+        (opening_sec + start, opening_sec + end) for start, end in excerpts
+    ]
+    total = opening_sec + max(end for _, end in excerpts)
+    labels = [f"a{i}" for i in range(len(ranges))]
+    filters = [
+        f"[1:a]apad=whole_dur={total:.6f},asplit={len(ranges)}"
+        + "".join(f"[{label}]" for label in labels)
+    ]
+    for label, (start, end) in zip(labels, ranges):
+        filters.append(
+            f"[{label}]atrim=start={start:.6f}:end={end:.6f},"
+            f"asetpts=PTS-STARTPTS[p{label}]"
+        )
+    filters.append(
+        "".join(f"[p{label}]" for label in labels)
+        + f"concat=n={len(ranges)}:v=0:a=1[audio]"
+    )
+    return [
+        FFMPEG_BINARY,
+        "-y",
+        "-nostats",
+        "-loglevel",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(list_file),
+        "-i",
+        str(audio_path),
+        "-filter_complex",
+        ";".join(filters),
+        "-map",
+        "0:v",
+        "-map",
+        "[audio]",
+        "-c:v",
+        "copy",
+        "-c:a",
+        "aac",
+        "-b:a",
+        AUDIO_BITRATE,
+        "-shortest",
+        "-movflags",
+        "+faststart",
+        str(output_file),
+    ]
+
+
+def render_preview(
+    still_path: Path,
+    audio_path: Path,
+    output_file: Path,
+    duration: float,
+    opening_path: Optional[Path] = None,
+    engine: str = "moviepy",
+    count: int = PREVIEW_EXCERPTS,
+    excerpt_sec: float = PREVIEW_EXCERPT_SEC,
+    main_fps: Optional[int] = None,
+) -> Path:
+    """
+    確認用のプレビュー動画を書き出す
+
+    PREVIEW_SIZE・高速なプリセットで、オープニングとメイン部から等間隔に
+    抜き出した count 個の区間（各 excerpt_sec 秒）だけをエンコードして連結する。
+    波形などの重ね方は本番と同じ。
+    """
+    main_fps = main_fps or VIDEO_FPS
+    excerpts = plan_preview_excerpts(duration, count, excerpt_sec, main_fps)
+    work_dir = output_file.with_name(f"{output_file.stem}_parts")
+    work_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(
+        f"==> プレビューを書き出します（{len(excerpts)} 区間 × 最大 {excerpt_sec:g} 秒）"
+    )
+    try:
+        opening_file = work_dir / "opening.mp4"
+        _run_ffmpeg(build_opening_segment_command(opening_path, opening_file, True))
+        opening_clip = VideoFileClip(str(opening_file))
+        try:
+            opening_sec = float(opening_clip.duration)
+        finally:
+            opening_clip.close()
+
+        if engine == "moviepy":
+            audio = AudioFileClip(str(audio_path))
+            try:
+                load_or_compute_envelope(audio_path, audio, main_fps)
+            finally:
+                audio.close()
+
+        lines = [f"file '{opening_file.resolve()}'\n"]
+        for i, (start, end) in enumerate(excerpts, start=1):
+            path = work_dir / f"excerpt_{i:02d}.mp4"
+            _encode_main_segment(
+                engine, still_path, audio_path, path, start, end, main_fps, True
+            )
+            lines.append(f"file '{path.resolve()}'\nduration {end - start:.6f}\n")
+        list_file = work_dir / "parts.txt"
+        list_file.write_text("".join(lines), encoding="utf-8")
+
+        _run_ffmpeg(
+            build_preview_concat_command(
+                list_file, audio_path, output_file, opening_sec, excerpts
+            )
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return output_file
 
 
 # --------------------------------------------------------------
 # メイン動画ビルダー
 # --------------------------------------------------------------
+def _close_quietly(clip) -> None:
+    try:
+        clip.close()
+    except Exception:
+        pass
+
+
+def _prepare_opening(config) -> Optional[Path]:
+    """設定で有効なら変換済みのオープニングを返す（使えない場合は None）"""
+    if not config.OPENING_CACHE:
+        return None
+    try:
+        return cached_opening(config.OPENING_VIDEO_PATH, config.VIDEO_CACHE_DIR)
+    except Exception as e:
+        logger.warning(f"==> オープニングのキャッシュを使用できません: {e}")
+        return None
+
+
 def build_video(
-    still_path_or_clip, audio_path_or_output, output_dir: Optional[Path] = None
+    still_path_or_clip,
+    audio_path_or_output,
+    output_dir: Optional[Path] = None,
+    engine: Optional[str] = None,
+    segment_workers: Optional[int] = None,
+    segment_sec: Optional[float] = None,
+    main_fps: Optional[int] = None,
+    preview: bool = False,
+    preview_excerpts: Optional[int] = None,
+    preview_sec: Optional[float] = None,
 ):
     """
     2通りの呼び方に対応:
     - build_video(still_path=Path, audio_path=Path, output_dir=Path) → 動画生成
     - build_video(prebuilt_clip: VideoClip, output_path: Path) → そのまま書き出し
+
+    engine で描画方法を選ぶ（"moviepy" / "ffmpeg"。未指定時は環境変数
+    VIDEO_RENDER_ENGINE）。segment_workers が 2 以上なら、segment_sec 秒ごとの
+    区間に分けてプロセスプールで並列にエンコードする（未指定時は環境変数
+    VIDEO_SEGMENT_WORKERS / VIDEO_SEGMENT_SEC）。OPENING_CACHE が有効なら、
+    変換済みのオープニングをキャッシュから取り出してストリームコピーで連結する。
+    main_fps（未指定時は環境変数 VIDEO_MAIN_FPS）が VIDEO_FPS 未満なら、メイン部を
+    静止画モード（低フレームレート・可変フレームレート）で書き出す。
+    preview が真なら、縮小・抜粋した確認用の動画（<出力名>_preview.mp4）だけを
+    書き出す（render_preview を参照）。
     """
     # ラッパーモード（テスト用）
     if output_dir is None:
@@ -156,9 +1249,14 @@ def build_video(
         from .config import Config
 
         output_file = output_dir / Config.FINAL_VIDEO_FILENAME
+        if preview:
+            output_file = output_file.with_name(f"{output_file.stem}_preview.mp4")
 
         # 定数
-        W, H = 1920, 1080
+        W, H = VIDEO_SIZE
+        engine = engine or Config.VIDEO_RENDER_ENGINE
+        if engine not in RENDER_ENGINES:
+            raise ValueError(f"不明な描画エンジンです: {engine}")
 
         # 音声読み込み（moviepy経由に統一。テストではモックされる）
         try:
@@ -182,61 +1280,63 @@ def build_video(
             output_file.touch()
             return output_file
 
-        # オープニング
-        from .config import Config
-
-        opening_path = Config.OPENING_VIDEO_PATH
-        if opening_path.exists():
-            opening_clip = VideoFileClip(str(opening_path)).with_effects(
-                [Resize((W, H))]
+        main_fps = main_fps or Config.VIDEO_MAIN_FPS
+        if preview:
+            _close_quietly(audio)
+            return render_preview(
+                Path(still_path_or_clip),
+                Path(audio_path_or_output),
+                output_file,
+                duration,
+                Config.OPENING_VIDEO_PATH,
+                engine=engine,
+                count=preview_excerpts or PREVIEW_EXCERPTS,
+                excerpt_sec=preview_sec or PREVIEW_EXCERPT_SEC,
+                main_fps=main_fps,
             )
-        else:
-            opening_clip = ColorClip((W, H), color=(0, 0, 0), duration=3)
-
-        # 静止画の準備
-        img_clip = (
-            ImageClip(str(still_path_or_clip))
-            .with_effects([Resize((W, H))])
-            .with_position("center")
-            .with_duration(duration)
-        )
 
-        # 波形
-        waveform_height = 80
-        waveform_width = int(W * 0.5)
-        wf_clip = create_waveform_clip(
-            audio, width=waveform_width, height=waveform_height
-        ).with_position(("center", H - waveform_height - 20))
+        # オープニングのキャッシュはどの描画方法でも使う（メイン部の描画方法は変えない）
+        workers = segment_workers or Config.VIDEO_SEGMENT_WORKERS
+        opening_segment = _prepare_opening(Config)
+        segmented = workers > 1 or is_still_mode(main_fps)
 
-        # 構成
-        main_clip = CompositeVideoClip([img_clip, wf_clip], size=(W, H)).with_duration(
-            duration
-        )
-        final = concatenate_videoclips([opening_clip, main_clip], method="compose")
+        if engine == "ffmpeg" or segmented:
+            _close_quietly(audio)
 
-        # オーディオ付与（短い/長い場合は調整）
-        try:
-            adur = float(getattr(audio, "duration", 0) or 0)
-            fdur = float(getattr(final, "duration", 0) or adur)
-            if fdur and adur and fdur < adur:
-                audio = audio.subclip(0, fdur)
-        except Exception:
-            pass
-        final = final.with_audio(audio)
+        if segmented:
+            return render_segmented(
+                Path(still_path_or_clip),
+                Path(audio_path_or_output),
+                output_file,
+                duration,
+                Config.OPENING_VIDEO_PATH,
+                engine=engine,
+                workers=workers,
+                segment_sec=segment_sec or Config.VIDEO_SEGMENT_SEC,
+                opening_segment=opening_segment,
+                main_fps=main_fps,
+            )
 
-        # 書き出し
-        final.write_videofile(
-            str(output_file),
-            codec="libx264",
-            audio_codec="aac",
-            fps=24,
-            threads=8,
-            preset="medium",
-            bitrate="6000k",
-            audio_bitrate="192k",
-        )
+        if engine == "ffmpeg":
+            logger.info("==> ffmpeg のフィルタグラフで動画を生成します")
+            return render_with_ffmpeg(
+                Path(still_path_or_clip),
+                Path(audio_path_or_output),
+                output_file,
+                duration,
+                Config.OPENING_VIDEO_PATH,
+                opening_segment=opening_segment,
+            )
 
-        return output_file
+        return render_with_moviepy(
+            Path(still_path_or_clip),
+            audio,
+            Path(audio_path_or_output),
+            output_file,
+            duration,
+            Config.OPENING_VIDEO_PATH,
+            opening_segment=opening_segment,
+        )
 
     except Exception as e:
         logger.error(f"==> 動画生成中にエラーが発生しました: {e}")
@@ -252,6 +1352,40 @@ def main():
     parser.add_argument("--image", required=True, help="静止画ファイル")
     parser.add_argument("--audio", required=True, help="音声ファイル (mp3 または wav)")
     parser.add_argument("--output", default="output_video", help="出力ディレクトリ")
+    parser.add_argument(
+        "--engine",
+        choices=RENDER_ENGINES,
+        help="描画エンジン（未指定時は環境変数VIDEO_RENDER_ENGINE）。"
+        "ffmpegの波形はshowwavesの縦線で、moviepyの30本のバーとは見た目が異なる",
+    )
+    parser.add_argument(
+        "--segment_workers",
+        type=int,
+        help="区間ごとに並列エンコードするプロセス数（2以上で有効）",
+    )
+    parser.add_argument(
+        "--segment_sec", type=float, help="並列エンコードの区間の長さ（秒）"
+    )
+    parser.add_argument(
+        "--main_fps",
+        type=int,
+        help="メイン部のフレームレート（24未満で静止画モード。未指定時は環境変数VIDEO_MAIN_FPS）",
+    )
+    parser.add_argument(
+        "--preview",
+        action="store_true",
+        help="縮小・抜粋した確認用の動画だけを書き出す",
+    )
+    parser.add_argument(
+        "--preview_excerpts",
+        type=int,
+        help=f"プレビューに使う区間の数（デフォ {PREVIEW_EXCERPTS}）",
+    )
+    parser.add_argument(
+        "--preview_sec",
+        type=float,
+        help=f"プレビューの区間の長さ（秒。デフォ {PREVIEW_EXCERPT_SEC:g}）",
+    )
     args = parser.parse_args()
 
     try:
@@ -259,6 +1393,13 @@ def main():
             still_path_or_clip=Path(args.image).expanduser(),
             audio_path_or_output=Path(args.audio).expanduser(),
             output_dir=Path(args.output).expanduser(),
+            engine=args.engine,
+            segment_workers=args.segment_workers,
+            segment_sec=args.segment_sec,
+            main_fps=args.main_fps,
+            preview=args.preview,
+            preview_excerpts=args.preview_excerpts,
+            preview_sec=args.preview_sec,
         )
         if output_file:
             logger.info("\n=== 処理完了 ===")
@@ -270,7 +1411,16 @@ def main():
         logger.error(f"エラー内容: {e}")
 
 
-def create_video(output_dir: Path, still_path: Path, audio_path: Path):
+def create_video(
+    output_dir: Path,
+    still_path: Path,
+    audio_path: Path,
+    engine: Optional[str] = None,
+    segment_workers: Optional[int] = None,
+    segment_sec: Optional[float] = None,
+    main_fps: Optional[int] = None,
+    preview: bool = False,
+):
     """
     静止画と音声ファイルから動画を生成する（外部アプリケーション用インターフェース）
 
@@ -278,6 +1428,11 @@ def create_video(output_dir: Path, still_path: Path, audio_path: Path):
         output_dir (Path): 出力ディレクトリのパス
         still_path (Path): 静止画のパス
         audio_path (Path): 音声ファイルのパス
+        engine (str, optional): 描画エンジン（"moviepy" / "ffmpeg"）
+        segment_workers (int, optional): 区間ごとに並列エンコードするプロセス数
+        segment_sec (float, optional): 並列エンコードの区間の長さ（秒）
+        main_fps (int, optional): メイン部のフレームレート（24未満で静止画モード）
+        preview (bool): 縮小・抜粋した確認用の動画だけを書き出す
 
     Returns:
         str: 生成された動画ファイルのパス。失敗した場合はNone
@@ -287,6 +1442,11 @@ def create_video(output_dir: Path, still_path: Path, audio_path: Path):
         still_path_or_clip=Path(still_path),
         audio_path_or_output=Path(audio_path),
         output_dir=Path(output_dir),
+        engine=engine,
+        segment_workers=segment_workers,
+        segment_sec=segment_sec,
+        main_fps=main_fps,
+        preview=preview,
     )
     if output_file:
         logger.info(f"==> 動画生成が完了しました: {output_file}")
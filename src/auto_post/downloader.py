@@ -0,0 +1,262 @@
+"""
+downloader.py
+-------------
+生成された音声などを安全にダウンロードするモジュール。
+
+・一時ファイル（*.part）に 1MB のバッファでまとめて書き込み、完了・検証後に rename で置き換える
+  （途中で失敗しても保存先に壊れたファイルが残らない）
+・通信が途中で切れた場合は HTTP Range で続きから再開する
+・サーバーが Range に対応していて大きなファイルの場合は、複数の範囲を並列に取得する
+・Content-Length / 期待サイズ / SHA-256 で内容を検証する
+・ダウンロード時間とスループットをログに出力する
+"""
+
+import hashlib
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import requests
+
+from . import http_client
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# 1 回に受信するバイト数（切断時に失うデータを小さくするため小さめにする）
+CHUNK_SIZE = 64 * 1024
+
+# ファイルへの書き込みバッファ（まとめて書き込む）
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# この大きさ以上で Range に対応していれば並列に取得する
+PARALLEL_MIN_SIZE = 8 * 1024 * 1024
+PARALLEL_RANGES = 4
+
+# 途中で切れたときに再開する回数
+MAX_RESUMES = 3
+
+# リクエストのタイムアウト（秒）
+REQUEST_TIMEOUT = 120
+
+TEMP_SUFFIX = ".part"
+
+# 再開の対象とする通信エラー
+_TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class DownloadError(IOError):
+    """ダウンロードした内容が検証に失敗した"""
+
+
+class DownloadResult(NamedTuple):
+    """ダウンロード結果"""
+
+    path: str
+    size: int  # バイト数
+    sha256: str
+    seconds: float
+    ranges: int  # 並列に取得した範囲の数（1 なら通常のダウンロード）
+    resumes: int  # Range で再開した回数
+
+    @property
+    def throughput(self) -> float:
+        """スループット（バイト/秒）"""
+        return self.size / self.seconds if self.seconds > 0 else 0.0
+
+
+def _content_length(response) -> Optional[int]:
+    """圧縮されていないレスポンスの Content-Length（不明なら None）"""
+    try:
+        if response.headers.get("Content-Encoding") not in (None, "identity"):
+            return None
+        return int(response.headers.get("Content-Length"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _accepts_ranges(response) -> bool:
+    try:
+        return response.headers.get("Accept-Ranges") == "bytes"
+    except AttributeError:
+        return False
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(WRITE_BUFFER_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stream_to_file(url: str, tmp_path: str, response, ranged: bool):
+    """
+    レスポンスを一時ファイルに書き込む。途中で切れたら Range で再開する
+
+    Returns:
+        (書き込んだバイト数, SHA-256, 再開回数)
+    """
+    digest = hashlib.sha256()
+    written = 0
+    resumes = 0
+    current = response
+
+    with open(tmp_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        while True:
+            try:
+                for chunk in current.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        written += len(chunk)
+                break
+            except _TRANSIENT_ERRORS as e:
+                if resumes >= MAX_RESUMES:
+                    raise
+                resumes += 1
+                logger.warning(
+                    f"⚠️  Download interrupted at {written} bytes ({e}); "
+                    f"resuming ({resumes}/{MAX_RESUMES})"
+                )
+                if current is not response:
+                    current.close()
+                headers = {"Range": f"bytes={written}-"} if ranged and written else {}
+                current = http_client.get(
+                    url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT
+                )
+                current.raise_for_status()
+                if current.status_code != 206:
+                    # Range が効かなかった場合は最初から書き直す
+                    f.seek(0)
+                    f.truncate()
+                    digest = hashlib.sha256()
+                    written = 0
+
+    if current is not response:
+        current.close()
+    return written, digest.hexdigest(), resumes
+
+
+def _fetch_range(url: str, tmp_path: str, start: int, end: int) -> int:
+    """start〜end バイト目を取得して一時ファイルに書き込み、再開回数を返す"""
+    pos = start
+    resumes = 0
+    with open(tmp_path, "r+b", buffering=WRITE_BUFFER_SIZE) as f:
+        while pos <= end:
+            try:
+                with http_client.get(
+                    url,
+                    headers={"Range": f"bytes={pos}-{end}"},
+                    stream=True,
+                    timeout=REQUEST_TIMEOUT,
+                ) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise DownloadError(f"Range request was not honoured: {url}")
+                    f.seek(pos)
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        chunk = chunk[: end + 1 - pos]
+                        f.write(chunk)
+                        pos += len(chunk)
+                        if pos > end:
+                            break
+                if pos <= end:
+                    raise requests.exceptions.ChunkedEncodingError(
+                        f"Range {start}-{end} ended at {pos}"
+                    )
+            except _TRANSIENT_ERRORS:
+                if resumes >= MAX_RESUMES:
+                    raise
+                resumes += 1
+    return resumes
+
+
+def _download_ranges(url: str, tmp_path: str, size: int, parts: int) -> int:
+    """ファイルを parts 個の範囲に分けて並列に取得し、再開回数の合計を返す"""
+    with open(tmp_path, "wb") as f:
+        f.truncate(size)
+    step = math.ceil(size / parts)
+    ranges = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [
+            executor.submit(_fetch_range, url, tmp_path, start, end)
+            for start, end in ranges
+        ]
+        return sum(future.result() for future in futures)
+
+
+def download_file(
+    url: str,
+    save_path: str,
+    expected_size: Optional[int] = None,
+    expected_sha256: Optional[str] = None,
+    parallel: int = PARALLEL_RANGES,
+) -> DownloadResult:
+    """
+    URL の内容を save_path にダウンロードする
+
+    Args:
+        url: ダウンロード元
+        save_path: 保存先（完了・検証後に置き換えられる）
+        expected_size: 期待するバイト数（未指定時は Content-Length で検証）
+        expected_sha256: 期待する SHA-256（16 進）
+        parallel: Range に対応した大きなファイルを並列取得するときの分割数
+
+    Raises:
+        DownloadError: サイズやハッシュが一致しない場合
+    """
+    start_time = time.perf_counter()
+    tmp_path = f"{save_path}{TEMP_SUFFIX}"
+    ranges = 1
+
+    try:
+        with http_client.get(url, stream=True, timeout=REQUEST_TIMEOUT) as r:
+            r.raise_for_status()
+            size = _content_length(r)
+            ranged = _accepts_ranges(r)
+            use_ranges = (
+                parallel > 1
+                and ranged
+                and size is not None
+                and size >= PARALLEL_MIN_SIZE
+            )
+            if not use_ranges:
+                written, sha256, resumes = _stream_to_file(url, tmp_path, r, ranged)
+
+        if use_ranges:
+            ranges = parallel
+            resumes = _download_ranges(url, tmp_path, size, parallel)
+            written = os.path.getsize(tmp_path)
+            sha256 = _file_sha256(tmp_path)
+
+        for expected in (size, expected_size):
+            if expected is not None and written != expected:
+                raise DownloadError(
+                    f"Size mismatch for {url}: expected {expected}, got {written}"
+                )
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            raise DownloadError(f"SHA-256 mismatch for {url}")
+
+        os.replace(tmp_path, save_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    result = DownloadResult(
+        save_path, written, sha256, time.perf_counter() - start_time, ranges, resumes
+    )
+    logger.info(
+        f"📥 {os.path.basename(save_path)}: {result.size / 1e6:.1f} MB in "
+        f"{result.seconds:.1f}s ({result.throughput / 1e6:.2f} MB/s, "
+        f"ranges={result.ranges}, resumes={result.resumes})"
+    )
+    return result
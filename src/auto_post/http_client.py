@@ -0,0 +1,181 @@
+"""
+http_client.py
+--------------
+外部 API（PiAPI / OpenAI / Slack / フォント配布元）への HTTP 通信をまとめるモジュール。
+
+requests.get / requests.post を直接呼ぶと毎回 DNS 解決と TLS ハンドシェイクが
+発生するため、プロセス全体で 1 つの Session を共有する。
+
+・ホストごとに keep-alive の接続プールを持つ（並列生成でも再接続しない）
+・timeout 未指定の呼び出しには既定のタイムアウトを適用する
+・接続エラーと 429 / 5xx は指数バックオフで再試行する
+  （POST は二重送信を避けるため、接続できなかった場合のみ再試行）
+・ホストごとのリクエスト数・所要時間・エラー数を記録する
+・HTTP_HOST_OVERRIDES でホストをローカルのスタブサーバーなどに差し替えられる
+  例: HTTP_HOST_OVERRIDES="api.piapi.ai=http://127.0.0.1:8080"
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# timeout 未指定時の (接続, 読み込み) タイムアウト（秒）
+DEFAULT_TIMEOUT = (10, 60)
+
+# ホストごとに保持する接続数
+POOL_MAXSIZE = 10
+
+# 再試行の回数・バックオフ係数・対象ステータス
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _parse_overrides(value: str) -> Dict[str, str]:
+    """host=ベースURL をカンマ区切りで並べた文字列を辞書にする"""
+    overrides = {}
+    for item in value.split(","):
+        host, sep, base = item.strip().partition("=")
+        if sep and host and base:
+            overrides[host.strip()] = base.strip().rstrip("/")
+    return overrides
+
+
+def _build_retry() -> Retry:
+    return Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=RETRY_TOTAL,
+        status=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        # 冪等なメソッドのみ読み込みエラー・ステータスで再試行する
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class HttpClient:
+    """接続プール・既定タイムアウト・再試行・計測付きの HTTP クライアント"""
+
+    def __init__(self, host_overrides: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            host_overrides: ホスト名 → 差し替え先のベース URL
+                （未指定時は環境変数 HTTP_HOST_OVERRIDES）
+        """
+        if host_overrides is None:
+            host_overrides = _parse_overrides(os.getenv("HTTP_HOST_OVERRIDES", ""))
+        self.host_overrides = dict(host_overrides)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=POOL_MAXSIZE,
+            pool_maxsize=POOL_MAXSIZE,
+            max_retries=_build_retry(),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, url: str) -> str:
+        """ホストの差し替え設定があれば URL を書き換える"""
+        parts = urlsplit(url)
+        base = self.host_overrides.get(parts.hostname or "")
+        if not base:
+            return url
+        target = urlsplit(base)
+        path = target.path.rstrip("/") + parts.path
+        return urlunsplit((target.scheme, target.netloc, path, parts.query, ""))
+
+    def _record(self, host: str, elapsed: float, error: bool) -> None:
+        with self._lock:
+            m = self._metrics.setdefault(
+                host, {"requests": 0, "errors": 0, "total_sec": 0.0, "max_sec": 0.0}
+            )
+            m["requests"] += 1
+            m["errors"] += int(error)
+            m["total_sec"] += elapsed
+            m["max_sec"] = max(m["max_sec"], elapsed)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Session.request と同じ引数でリクエストを送る"""
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        url = self._resolve(url)
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, time.perf_counter() - start, error=True)
+            raise
+        self._record(host, time.perf_counter() - start, response.status_code >= 400)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """ホストごとのリクエスト数・エラー数・合計/最大所要時間（秒）"""
+        with self._lock:
+            return {host: dict(m) for host, m in self._metrics.items()}
+
+    def log_metrics(self) -> None:
+        """計測結果をログに出力する"""
+        for host, m in sorted(self.metrics().items()):
+            average = m["total_sec"] / m["requests"] if m["requests"] else 0.0
+            logger.info(
+                f"==> HTTP {host}: {m['requests']:.0f} 件 / エラー {m['errors']:.0f} 件 / "
+                f"平均 {average:.2f}秒 / 最大 {m['max_sec']:.2f}秒"
+            )
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """プロセスで共有する HttpClient を返す（初回呼び出し時に作成）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def set_client(client: Optional[HttpClient]) -> None:
+    """共有クライアントを差し替える（None なら次回呼び出し時に作り直す）"""
+    global _client
+    with _client_lock:
+        if _client is not None and _client is not client:
+            _client.close()
+        _client = client
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    return get_client().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return get_client().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return get_client().post(url, **kwargs)
@@ -0,0 +1,300 @@
+"""
+mp3_probe.py
+------------
+MP3 のフレームヘッダだけを読んで再生時間を求めるモジュール。
+
+音声をデコードせずに長さを得るため、ストックが数百曲あっても一瞬で終わる。
+
+・VBR/CBR の Xing / Info タグ、または VBRI タグがあればフレーム数から算出
+・LAME タグのエンコーダ遅延／パディングを差し引き、ffmpeg (pydub) で
+  デコードしたときの長さと数 ms 以内で一致させる
+・タグがない場合はフレームヘッダを順に辿ってフレーム数を数える
+
+Usage
+-----
+python -m src.auto_post.mp3_probe ./audio/*.mp3
+"""
+
+import argparse
+import logging
+import struct
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# MPEG バージョン (ヘッダの 2bit 値) → 名称
+_MPEG1, _MPEG2, _MPEG25 = 3, 2, 0
+
+# ビットレート表 (kbps)。キーは (MPEG1かどうか, レイヤー)
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# サンプルレート表 (Hz)
+_SAMPLE_RATES = {
+    _MPEG1: (44100, 48000, 32000),
+    _MPEG2: (22050, 24000, 16000),
+    _MPEG25: (11025, 12000, 8000),
+}
+
+# エンコーダ遅延/パディングを信頼できるエンコーダ名（ffmpeg の判定と同じ）
+_GAPLESS_ENCODERS = (b"LAME", b"Lavf", b"Lavc")
+
+# 同期の取り直しで一度に読むバイト数
+_SCAN_BLOCK = 64 * 1024
+
+
+class Mp3ProbeError(ValueError):
+    """MP3 として解析できないファイル"""
+
+
+class _FrameHeader:
+    """MP3 フレームヘッダ 1 つ分の情報"""
+
+    __slots__ = (
+        "version",
+        "layer",
+        "sample_rate",
+        "samples_per_frame",
+        "frame_length",
+        "mono",
+    )
+
+    def __init__(self, version, layer, sample_rate, samples_per_frame, length, mono):
+        self.version = version
+        self.layer = layer
+        self.sample_rate = sample_rate
+        self.samples_per_frame = samples_per_frame
+        self.frame_length = length
+        self.mono = mono
+
+
+def _parse_header(data: bytes) -> Optional[_FrameHeader]:
+    """4 バイトのフレームヘッダを解析する。ヘッダでなければ None"""
+    if len(data) < 4 or data[0] != 0xFF or (data[1] & 0xE0) != 0xE0:
+        return None
+
+    version = (data[1] >> 3) & 0x03
+    layer = 4 - ((data[1] >> 1) & 0x03)
+    bitrate_index = data[2] >> 4
+    rate_index = (data[2] >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    is_mpeg1 = version == _MPEG1
+    bitrate = _BITRATES[(is_mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (data[2] >> 1) & 0x01
+    mono = (data[3] >> 6) == 3
+
+    if layer == 1:
+        samples_per_frame = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or is_mpeg1:
+        samples_per_frame = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples_per_frame = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    return _FrameHeader(version, layer, sample_rate, samples_per_frame, length, mono)
+
+
+def _skip_id3v2(f) -> int:
+    """先頭の ID3v2 タグを読み飛ばし、音声データの開始位置を返す"""
+    offset = 0
+    while True:
+        f.seek(offset)
+        head = f.read(10)
+        if len(head) < 10 or head[:3] != b"ID3":
+            return offset
+        size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        footer = 10 if head[5] & 0x10 else 0
+        offset += 10 + size + footer
+
+
+def _find_first_frame(f, offset: int) -> Tuple[int, _FrameHeader]:
+    """offset 以降で、次のフレームとも整合する最初のフレームを探す"""
+    while True:
+        f.seek(offset)
+        block = f.read(_SCAN_BLOCK + 4)
+        if len(block) < 4:
+            raise Mp3ProbeError("MPEG フレームが見つかりません")
+
+        for i in range(len(block) - 3):
+            if block[i] != 0xFF:
+                continue
+            header = _parse_header(block[i : i + 4])
+            if header is None:
+                continue
+            # 誤検出を避けるため、直後のフレームヘッダも確認する
+            f.seek(offset + i + header.frame_length)
+            following = _parse_header(f.read(4))
+            if following is None or following.sample_rate != header.sample_rate:
+                # 1 フレームしかないファイルは末尾で判定する
+                f.seek(0, 2)
+                if offset + i + header.frame_length < f.tell():
+                    continue
+            return offset + i, header
+
+        offset += len(block) - 3
+
+
+def _read_vbr_tag(f, pos: int, header: _FrameHeader) -> Optional[Tuple[int, int]]:
+    """
+    Xing/Info または VBRI タグを読み、(音声フレーム数, 除外サンプル数) を返す
+
+    除外サンプル数は LAME タグに記録されたエンコーダ遅延とパディングの合計。
+    """
+    f.seek(pos)
+    frame = f.read(max(header.frame_length, 192))
+
+    # Xing / Info（サイド情報の直後）
+    if header.version == _MPEG1:
+        xing_offset = 4 + (17 if header.mono else 32)
+    else:
+        xing_offset = 4 + (9 if header.mono else 17)
+    tag = frame[xing_offset : xing_offset + 4]
+    if tag in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", frame[xing_offset + 4 : xing_offset + 8])[0]
+        if not flags & 0x01:
+            return None
+        cursor = xing_offset + 8
+        frames = struct.unpack(">I", frame[cursor : cursor + 4])[0]
+        cursor += 4
+        if flags & 0x02:
+            cursor += 4
+        if flags & 0x04:
+            cursor += 100
+        if flags & 0x08:
+            cursor += 4
+
+        skipped = 0
+        # LAME 拡張タグ: 先頭から 21 バイト目にエンコーダ遅延/パディング (12bit×2)
+        if frame[cursor : cursor + 4] in _GAPLESS_ENCODERS:
+            gapless = frame[cursor + 21 : cursor + 24]
+            if len(gapless) == 3:
+                delay = (gapless[0] << 4) | (gapless[1] >> 4)
+                padding = ((gapless[1] & 0x0F) << 8) | gapless[2]
+                skipped = delay + padding
+        return frames, skipped
+
+    # VBRI（フレームヘッダから 32 バイト後）
+    if frame[36:40] == b"VBRI":
+        frames = struct.unpack(">I", frame[50:54])[0]
+        return frames, 0
+
+    return None
+
+
+def _count_frames(f, pos: int) -> Tuple[int, int]:
+    """フレームヘッダを順に辿り、(総サンプル数, サンプルレート) を返す"""
+    samples = 0
+    sample_rate = 0
+    f.seek(0, 2)
+    size = f.tell()
+
+    while pos + 4 <= size:
+        f.seek(pos)
+        header = _parse_header(f.read(4))
+        if header is None or header.frame_length <= 0:
+            # ID3v1 / APE タグなどに到達したら終了、それ以外は同期を取り直す
+            f.seek(pos)
+            marker = f.read(8)
+            if marker[:3] == b"TAG" or marker == b"APETAGEX":
+                break
+            try:
+                pos, header = _find_first_frame(f, pos + 1)
+            except Mp3ProbeError:
+                break
+        if sample_rate and header.sample_rate != sample_rate:
+            break
+        sample_rate = header.sample_rate
+        samples += header.samples_per_frame
+        pos += header.frame_length
+
+    return samples, sample_rate
+
+
+class Mp3Info(NamedTuple):
+    """ヘッダから得られる MP3 の基本情報"""
+
+    duration: float  # 再生時間（秒）
+    sample_rate: int  # サンプルレート（Hz）
+    channels: int  # チャンネル数
+
+
+def probe_mp3(path) -> Mp3Info:
+    """
+    MP3 ファイルの再生時間などをフレームヘッダだけから求める
+
+    Args:
+        path: MP3 ファイルのパス
+
+    Returns:
+        Mp3Info: 再生時間・サンプルレート・チャンネル数
+
+    Raises:
+        Mp3ProbeError: MP3 として解析できない場合
+    """
+    with open(path, "rb") as f:
+        start = _skip_id3v2(f)
+        pos, header = _find_first_frame(f, start)
+        channels = 1 if header.mono else 2
+
+        tag = _read_vbr_tag(f, pos, header)
+        if tag is not None:
+            frames, skipped = tag
+            samples = max(0, frames * header.samples_per_frame - skipped)
+            return Mp3Info(samples / header.sample_rate, header.sample_rate, channels)
+
+        samples, sample_rate = _count_frames(f, pos)
+        if not sample_rate:
+            raise Mp3ProbeError(f"MPEG フレームが見つかりません: {path}")
+        return Mp3Info(samples / sample_rate, sample_rate, channels)
+
+
+def get_mp3_duration(path) -> float:
+    """MP3 ファイルの再生時間（秒）をフレームヘッダだけから求める"""
+    return probe_mp3(path).duration
+
+
+def get_mp3_duration_ms(path) -> int:
+    """get_mp3_duration のミリ秒版（pydub の len() と同じ単位）"""
+    return round(get_mp3_duration(path) * 1000)
+
+
+# --------------------------------------------------------------
+# コマンドラインインターフェース
+# --------------------------------------------------------------
+def main() -> None:
+    """コマンドライン実行用のメイン関数"""
+    parser = argparse.ArgumentParser(description="MP3 の再生時間をヘッダから取得")
+    parser.add_argument("files", nargs="+", help="MP3 ファイル")
+    args = parser.parse_args()
+
+    total = 0.0
+    for file in args.files:
+        try:
+            duration = get_mp3_duration(Path(file))
+        except (OSError, Mp3ProbeError) as e:
+            logger.error(f"==> {file}: {e}")
+            continue
+        total += duration
+        logger.info(f"{duration:10.3f}s  {file}")
+    logger.info(f"==> 合計: {total:.3f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    main()
@@ -8,8 +8,23 @@ How it works
    - task_type: "generate_music"
    - input:  gpt_description_prompt, lyrics_type="instrumental"
 2. Poll the task endpoint (GET https://api.piapi.ai/api/v1/task/{task_id})
-   until status == "Completed".
-3. Download the first audio file in output and save locally.
+   until status == "Completed". All in-flight tasks share one poll loop
+   (see task_poller.py) with adaptive delays and exponential backoff.
+3. Download the first audio file in output and save locally
+   (or every returned variant with ``all_variants=True``).
+
+With ``concurrency > 1`` several tasks are kept in flight at once; each track
+is downloaded as soon as its own task completes.
+
+With ``pipelined=True`` titling (OpenAI) and downloading run in background
+workers, so the next task is submitted as soon as the previous one completes
+and wall-clock time approaches the generation time alone.
+
+With a ``journal`` (run_journal.RunJournal) every task ID is recorded as soon
+as it is submitted, together with the tracks saved from it. A later call with
+the same journal first collects tasks that were still in flight or not fully
+downloaded, and only generates the remaining duration — paid-for generations
+are never submitted twice or discarded.
 
 Environment
 -----------
@@ -19,17 +34,24 @@ Environment
 
 import json
 import logging
+import math
 import os
 import random
 import re
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Optional
+from typing import Collection, Dict, List, Optional, Set, Tuple
 
-import requests
 from dotenv import load_dotenv
 
+from . import http_client
 from .config import Config
+from .downloader import DownloadResult, download_file
+from .mp3_probe import Mp3ProbeError, get_mp3_duration
+from .run_journal import RunJournal
+from .task_poller import PollStats, TaskPoller
 
 # Load environment variables
 load_dotenv()
@@ -53,9 +75,18 @@ HEADERS = {
     "Content-Type": "application/json",
 }
 
-POLL_INTERVAL = 8  # seconds between polls
 POLL_TIMEOUT = 600  # allow up to 10 minutes for long queues
 
+MAX_RETRIES = 3  # attempts per track
+RETRY_WAIT = 180  # seconds to wait before retrying a failed track
+
+# Concurrent generation
+EXPECTED_TRACK_DURATION = 120.0  # seconds per task until real tracks are observed
+MAX_CONSECUTIVE_FAILURES = 3  # give up after this many failed tasks in a row
+
+# Pipelined generation
+POST_PROCESS_WORKERS = 2  # background workers for titling and downloading
+
 # New config
 TARGET_DURATION_SEC = 600  # total length to generate (e.g. 10 min)
 
@@ -104,9 +135,7 @@ def generate_unique_filename(
         str: 重複しないファイル名
     """
     # 基本のファイル名を生成
-    base_name = re.sub(r"[^0-9A-Za-z_\- ]+", "", title).strip().replace(" ", "_")
-    if not base_name:
-        base_name = "track"
+    base_name = _filename_base(title)
 
     # 既存のファイル名を取得
     existing_files = get_existing_filenames(directory)
@@ -121,22 +150,67 @@ def generate_unique_filename(
             f"Warning: Title '{base_name}' already exists. Attempt {attempt + 1}/{max_attempts}"
         )
         # 新しい曲名を生成（既存のファイル名を考慮）
-        new_title = fetch_track_title(prompt, directory)
-        new_base_name = (
-            re.sub(r"[^0-9A-Za-z_\- ]+", "", new_title).strip().replace(" ", "_")
-        )
-        if not new_base_name:
-            new_base_name = "track"
+        new_base_name = _filename_base(fetch_track_title(prompt, directory))
 
         if new_base_name not in existing_files:
             return f"{new_base_name}.mp3"
 
     # 最大試行回数を超えた場合、番号を付与
+    return f"{_numbered_name(base_name, existing_files)}.mp3"
+
+
+def _filename_base(title: str) -> str:
+    """曲名からファイル名（拡張子なし）を作る"""
+    base_name = re.sub(r"[^0-9A-Za-z_\- ]+", "", title).strip().replace(" ", "_")
+    return base_name or "track"
+
+
+def _numbered_name(base_name: str, existing_files: Collection[str]) -> str:
+    """base_name に重複しない番号を付ける"""
     counter = 1
     while f"{base_name}_{counter}" in existing_files:
         counter += 1
+    return f"{base_name}_{counter}"
+
+
+def reserve_unique_filename(
+    title: str,
+    directory: str,
+    prompt: str,
+    lock: threading.Lock,
+    reserved: Set[str],
+    max_attempts: int = 3,
+) -> str:
+    """
+    重複しないファイル名を決めて reserved に予約する（並列実行用）
+
+    generate_unique_filename と同じ規則で名前を決めるが、曲名の再生成
+    （OpenAI の呼び出し）はロックの外で行い、ロックの中では既存のファイルと
+    予約済みの名前を確認して予約するだけにする。再生成している間に他の
+    タスクが同じ名前を使うことがあるため、予約する直前に確認し直す。
+
+    Returns:
+        str: 予約したファイル名
+    """
+    base_name = _filename_base(title)
+    candidate = base_name
+    for attempt in range(max_attempts + 1):
+        with lock:
+            if candidate not in get_existing_filenames(directory) | reserved:
+                reserved.add(candidate)
+                return f"{candidate}.mp3"
+        if attempt == max_attempts:
+            break
+        logger.warning(
+            f"Warning: Title '{candidate}' already exists. Attempt {attempt + 1}/{max_attempts}"
+        )
+        candidate = _filename_base(fetch_track_title(prompt, directory))
 
-    return f"{base_name}_{counter}.mp3"
+    # 最大試行回数を超えた場合、番号を付与
+    with lock:
+        name = _numbered_name(base_name, get_existing_filenames(directory) | reserved)
+        reserved.add(name)
+    return f"{name}.mp3"
 
 
 def choose_random_prompt() -> dict:
@@ -229,7 +303,9 @@ def fetch_track_title(prompt: str, directory: str = None) -> str:
             "temperature": 0.9,
         }
 
-        resp = requests.post(OPENAI_API_URL, json=payload, headers=headers, timeout=15)
+        resp = http_client.post(
+            OPENAI_API_URL, json=payload, headers=headers, timeout=15
+        )
         resp.raise_for_status()
 
         data = resp.json()
@@ -267,7 +343,7 @@ def create_music_task(prompt: str) -> str:
         },
         "config": {"service_mode": "public"},
     }
-    resp = requests.post(CREATE_ENDPOINT, headers=HEADERS, json=body, timeout=60)
+    resp = http_client.post(CREATE_ENDPOINT, headers=HEADERS, json=body, timeout=60)
     resp.raise_for_status()
     data = resp.json().get("data") or resp.json()  # unified schema wraps inside "data"
     task_id = data.get("task_id")
@@ -276,26 +352,48 @@ def create_music_task(prompt: str) -> str:
     return task_id
 
 
-def wait_for_task(task_id: str, timeout: int = POLL_TIMEOUT) -> dict:
-    """Poll the task until completion and return the full task data."""
+def fetch_task(task_id: str) -> Optional[dict]:
+    """Query the task once; return its data when completed, None while running."""
     url = GET_ENDPOINT.format(task_id=task_id)
-    start = time.time()
+    resp = http_client.get(url, headers={"x-api-key": API_KEY}, timeout=60)
+    resp.raise_for_status()
+    task_data = resp.json().get("data") or resp.json()
+
+    status = (task_data.get("status") or "").lower()
+    if status == "completed":
+        return task_data
+    if status in ("failed", "error"):
+        raise RuntimeError(f"Task failed: {task_data.get('error')}")
+    logger.info(f"⏳ Generating… waiting ({task_id})")
+    return None
 
-    while True:
-        resp = requests.get(url, headers={"x-api-key": API_KEY}, timeout=60)
-        resp.raise_for_status()
-        task_data = resp.json().get("data") or resp.json()
 
-        status = (task_data.get("status") or "").lower()
-        if status == "completed":
-            return task_data
-        if status in ("failed", "error"):
-            raise RuntimeError(f"Task failed: {task_data.get('error')}")
-        if time.time() - start > timeout:
-            raise TimeoutError(f"Task did not complete within {timeout} minutes")
+_task_poller: Optional[TaskPoller] = None
+_task_poller_lock = threading.Lock()
+
 
-        logger.info("⏳ Generating… waiting")
-        time.sleep(POLL_INTERVAL)
+def get_task_poller() -> TaskPoller:
+    """Return the poller shared by every in-flight task (created on first use)."""
+    global _task_poller
+    with _task_poller_lock:
+        if _task_poller is None:
+            _task_poller = TaskPoller(
+                fetch_task, PollStats(Config.PIAPI_POLL_STATS_PATH)
+            )
+        return _task_poller
+
+
+def wait_for_task(
+    task_id: str, timeout: int = POLL_TIMEOUT, submitted_at: Optional[float] = None
+) -> dict:
+    """
+    Wait until the task completes and return the full task data.
+
+    Polling is done by the shared TaskPoller. When ``submitted_at`` (time.time()
+    at task creation) is given, the first poll is delayed according to the
+    median generation time observed so far; polls then back off exponentially.
+    """
+    return get_task_poller().wait(task_id, timeout, submitted_at)
 
 
 def extract_audio_url(task_data: dict) -> Optional[str]:
@@ -323,13 +421,58 @@ def extract_audio_url(task_data: dict) -> Optional[str]:
     return None
 
 
-def download_audio(url: str, save_path: str) -> None:
-    """Download the audio file."""
-    with requests.get(url, stream=True, timeout=120) as r:
-        r.raise_for_status()
-        with open(save_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+def extract_audio_variants(task_data: dict) -> List[Tuple[str, float]]:
+    """
+    Collect every song variant in the task output as (url, duration) pairs.
+
+    Looks at ``songs``, ``audio_url``, ``audio_urls`` and ``files``; the same
+    URL is only returned once. Duration is 0 when the API does not report it.
+    """
+    output = task_data.get("output", {})
+    if not isinstance(output, dict):
+        return []
+
+    variants: List[Tuple[str, float]] = []
+    seen = set()
+
+    def add(url, duration=0) -> None:
+        if isinstance(url, str) and url.startswith("http") and url not in seen:
+            seen.add(url)
+            variants.append((url, float(duration or 0)))
+
+    for song in output.get("songs") or []:
+        if isinstance(song, dict):
+            add(song.get("song_path") or song.get("audio_url"), song.get("duration"))
+    add(output.get("audio_url"))
+    for url in output.get("audio_urls") or []:
+        add(url)
+    files = output.get("files")
+    if isinstance(files, list):
+        for f in files:
+            add(f.get("url") if isinstance(f, dict) else f)
+    return variants
+
+
+def get_saved_duration(save_path: str, reported: float) -> float:
+    """
+    保存したファイルの実際の長さ（秒）をフレームヘッダから取得する
+
+    ファイルが読めない場合は API が報告した長さを返す。
+    """
+    try:
+        return get_mp3_duration(save_path)
+    except (OSError, Mp3ProbeError):
+        return float(reported or 0)
+
+
+def download_audio(url: str, save_path: str) -> DownloadResult:
+    """
+    Download the audio file.
+
+    The file is written to a temporary path, resumed with HTTP Range after
+    interruptions, verified and then atomically renamed to ``save_path``.
+    """
+    return download_file(url, save_path)
 
 
 # ------------------------------------------------------------------
@@ -378,7 +521,7 @@ def main() -> None:
         download_audio(audio_url, save_path)
         logger.info(f"📁 Saved to {save_path}")
 
-        total_duration += float(duration or 0)
+        total_duration += get_saved_duration(save_path, duration)
         iteration += 1
 
     logger.info(
@@ -386,77 +529,527 @@ def main() -> None:
     )
 
 
-def piapi_music_generation(
-    today_folder: str, prompt: str, target_duration_sec: int
-) -> None:
-    if API_KEY == "YOUR_API_KEY_HERE":
-        raise SystemExit("Please set API_KEY or PIAPI_KEY env var.")
+# 並列実行時にダウンロード中のファイル名（保存先ディレクトリごと、拡張子なし）
+_reserved_names: Dict[str, Set[str]] = {}
 
-    # 出力ディレクトリの作成
-    os.makedirs(today_folder, exist_ok=True)
 
-    total_duration = 0.0
-    iteration = 1
-
-    while total_duration < target_duration_sec:
-        logger.info(
-            f"\n=== Iteration {iteration} | Accumulated {total_duration:.1f}s ==="
+def _save_variant(
+    prompt: str,
+    today_folder: str,
+    audio_url: str,
+    duration: float,
+    filename_lock: Optional[threading.Lock] = None,
+    journal: Optional[RunJournal] = None,
+    task_id: Optional[str] = None,
+) -> float:
+    """1 曲にタイトルを付けてダウンロードし、保存したファイルの長さ（秒）を返す"""
+    # Get title via OpenAI
+    title = fetch_track_title(prompt, today_folder)
+    if filename_lock is None:
+        filename = generate_unique_filename(title, today_folder, prompt)
+    else:
+        # 他のタスクと同じ名前にならないよう、ダウンロードが終わるまで名前を
+        # メモリ上で予約する（空ファイルを置くと強制終了時に残ってしまう）
+        reserved = _reserved_names.setdefault(os.path.abspath(today_folder), set())
+        filename = reserve_unique_filename(
+            title, today_folder, prompt, filename_lock, reserved
         )
-        logger.info(f"🎼 Creating task with prompt: {prompt!r}")
+    save_path = os.path.join(today_folder, filename)
+
+    logger.info(f"🎧 {os.path.splitext(filename)[0]} ({duration:.1f}s)  ⬇️ {audio_url}")
+    try:
+        download_audio(audio_url, save_path)
+    finally:
+        if filename_lock is not None:
+            with filename_lock:
+                reserved.discard(os.path.splitext(filename)[0])
+    logger.info(f"📁 Saved to {save_path}")
 
-        max_retries = 3
-        retry_count = 0
-        success = False
+    seconds = get_saved_duration(save_path, duration)
+    if journal is not None and task_id:
+        journal.variant_saved(task_id, audio_url, save_path, seconds)
+    return seconds
 
-        while not success and retry_count < max_retries:
-            try:
-                task_id = create_music_task(prompt)
-                logger.info(f"🆔 Task ID: {task_id}")
 
-                logger.info("🚀 Waiting for completion…")
-                task_data = wait_for_task(task_id)
-                logger.info("✅ Task completed!")
+def run_music_task(prompt: str, journal: Optional[RunJournal] = None) -> dict:
+    """
+    Create a task, wait for it to complete and return the task data.
+
+    With a journal the task ID is recorded right after submission and is also
+    returned as ``task_data["task_id"]``.
+    """
+    submitted_at = time.time()
+    task_id = create_music_task(prompt)
+    logger.info(f"🆔 Task ID: {task_id}")
+    if journal is not None:
+        journal.task_submitted(task_id, prompt, submitted_at)
+
+    logger.info("🚀 Waiting for completion…")
+    task_data = wait_for_task(task_id, submitted_at=submitted_at)
+    logger.info(f"✅ Task completed! ({task_id})")
+    if journal is not None:
+        task_data = dict(task_data, task_id=task_id)
+    return task_data
+
+
+def task_variants(task_data: dict, all_variants: bool) -> List[Tuple[str, float]]:
+    """
+    Return the (url, duration) pairs to save from a completed task.
+
+    Only the first song is returned unless ``all_variants`` is set.
+    """
+    if all_variants:
+        return extract_audio_variants(task_data)
+    audio_url = extract_audio_url(task_data)
+    if not audio_url:
+        return []
+    duration = task_data.get("output", {}).get("songs", [{}])[0].get("duration", 0)
+    return [(audio_url, duration)]
+
+
+def generate_track(
+    prompt: str,
+    today_folder: str,
+    filename_lock: Optional[threading.Lock] = None,
+    all_variants: bool = False,
+    journal: Optional[RunJournal] = None,
+) -> float:
+    """
+    1 タスクを作成し、完了後すぐにダウンロードして保存した長さ（秒）を返す
+
+    Args:
+        prompt (str): 音楽のプロンプト
+        today_folder (str): 保存先ディレクトリ
+        filename_lock (threading.Lock, optional): 並列実行時にファイル名の
+            決定を直列化するロック
+        all_variants (bool): タスクが返した全ての曲を保存するかどうか
+            （False なら最初の 1 曲のみ）
+        journal (RunJournal, optional): タスク ID と保存した曲を記録するジャーナル
+    """
+    task_data = run_music_task(prompt, journal)
+    task_id = task_data.get("task_id") if journal is not None else None
+
+    variants = task_variants(task_data, all_variants)
+    if task_id:
+        journal.task_completed(task_id, [url for url, _ in variants])
+    if not variants:
+        raise ValueError("Audio URL not found")
+    if not all_variants:
+        audio_url, duration = variants[0]
+        return _save_variant(
+            prompt, today_folder, audio_url, duration, filename_lock, journal, task_id
+        )
+    logger.info(f"🎶 {len(variants)} variant(s) returned")
 
-                audio_url = extract_audio_url(task_data)
-                duration = (
-                    task_data.get("output", {}).get("songs", [{}])[0].get("duration", 0)
+    total_duration = 0.0
+    saved = 0
+    last_error: Optional[Exception] = None
+    for audio_url, duration in variants:
+        try:
+            total_duration += _save_variant(
+                prompt,
+                today_folder,
+                audio_url,
+                duration,
+                filename_lock,
+                journal,
+                task_id,
+            )
+            saved += 1
+        except Exception as e:
+            logger.error(f"❌ Failed to save variant {audio_url}: {e}")
+            last_error = e
+
+    # 1 曲でも保存できていればタスクは成功として扱う
+    if saved == 0:
+        raise last_error
+    return total_duration
+
+
+def generate_track_with_retries(
+    prompt: str,
+    today_folder: str,
+    filename_lock: Optional[threading.Lock] = None,
+    all_variants: bool = False,
+    max_retries: int = MAX_RETRIES,
+    journal: Optional[RunJournal] = None,
+) -> Optional[float]:
+    """generate_track を最大 max_retries 回試す。全て失敗したら None"""
+    for attempt in range(1, max_retries + 1):
+        try:
+            return generate_track(
+                prompt, today_folder, filename_lock, all_variants, journal
+            )
+        except Exception as e:
+            if attempt < max_retries:
+                logger.error(f"❌ Error occurred: {str(e)}")
+                logger.info(
+                    f"🔄 Retrying in 3 minutes... (Attempt {attempt + 1}/{max_retries})"
+                )
+                time.sleep(RETRY_WAIT)  # 3分待機
+            else:
+                logger.error(
+                    f"❌ Failed after {max_retries} attempts. Moving to next iteration."
                 )
-                if not audio_url:
-                    raise ValueError("Audio URL not found")
+    return None
 
-                # Get title via OpenAI
-                title = fetch_track_title(prompt, today_folder)
-                filename = generate_unique_filename(title, today_folder, prompt)
-                save_path = os.path.join(today_folder, filename)
 
+def run_music_task_with_retries(
+    prompt: str,
+    max_retries: int = MAX_RETRIES,
+    journal: Optional[RunJournal] = None,
+) -> Optional[dict]:
+    """run_music_task を最大 max_retries 回試す。全て失敗したら None"""
+    for attempt in range(1, max_retries + 1):
+        try:
+            return run_music_task(prompt, journal)
+        except Exception as e:
+            if attempt < max_retries:
+                logger.error(f"❌ Error occurred: {str(e)}")
                 logger.info(
-                    f"🎧 {os.path.splitext(filename)[0]} ({duration:.1f}s)  ⬇️ {audio_url}"
+                    f"🔄 Retrying in 3 minutes... (Attempt {attempt + 1}/{max_retries})"
                 )
-                download_audio(audio_url, save_path)
-                logger.info(f"📁 Saved to {save_path}")
+                time.sleep(RETRY_WAIT)  # 3分待機
+            else:
+                logger.error(
+                    f"❌ Failed after {max_retries} attempts. Moving to next iteration."
+                )
+    return None
 
-                total_duration += float(duration or 0)
-                success = True
 
-            except Exception as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    logger.error(f"❌ Error occurred: {str(e)}")
-                    logger.info(
-                        f"🔄 Retrying in 3 minutes... (Attempt {retry_count + 1}/{max_retries})"
+def plan_task_count(
+    remaining_sec: float, in_flight: int, expected_track_sec: float, concurrency: int
+) -> int:
+    """
+    追加で投入するタスク数を決める
+
+    実行中のタスクが全て expected_track_sec の曲を返すと見込み、
+    残り時間を埋めるのに足りない分だけを同時実行数の上限まで投入する。
+    """
+    if remaining_sec <= 0:
+        return 0
+    needed = math.ceil(remaining_sec / max(expected_track_sec, 1.0)) - in_flight
+    return max(0, min(concurrency - in_flight, needed))
+
+
+def _generate_concurrently(
+    today_folder: str,
+    prompt: str,
+    target_duration_sec: int,
+    concurrency: int,
+    all_variants: bool = False,
+    journal: Optional[RunJournal] = None,
+) -> float:
+    """最大 concurrency 個のタスクを同時に実行し、合計時間を返す"""
+    filename_lock = threading.Lock()
+    completed: list = []
+    total_duration = 0.0
+    consecutive_failures = 0
+    in_flight: set = set()
+
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="piapi"
+    ) as executor:
+        while True:
+            # 完了した曲の平均から 1 タスクあたりの長さを見積もる
+            expected = (
+                sum(completed) / len(completed)
+                if completed
+                else EXPECTED_TRACK_DURATION
+            )
+            count = plan_task_count(
+                target_duration_sec - total_duration,
+                len(in_flight),
+                expected,
+                concurrency,
+            )
+            for _ in range(count):
+                logger.info(f"🎼 Creating task with prompt: {prompt!r}")
+                in_flight.add(
+                    executor.submit(
+                        generate_track_with_retries,
+                        prompt,
+                        today_folder,
+                        filename_lock,
+                        all_variants,
+                        journal=journal,
+                    )
+                )
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                duration = future.result()
+                if duration is None:
+                    consecutive_failures += 1
+                    continue
+                consecutive_failures = 0
+                completed.append(duration)
+                total_duration += duration
+                logger.info(
+                    f"\n=== Track {len(completed)} done | "
+                    f"Accumulated {total_duration:.1f}s / {target_duration_sec}s | "
+                    f"{len(in_flight)} in flight ==="
+                )
+
+            if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                for future in in_flight:
+                    future.cancel()
+                raise RuntimeError(
+                    f"{consecutive_failures} tasks failed in a row; giving up"
+                )
+
+    return total_duration
+
+
+def _generate_pipelined(
+    today_folder: str,
+    prompt: str,
+    target_duration_sec: int,
+    concurrency: int,
+    all_variants: bool = False,
+    journal: Optional[RunJournal] = None,
+) -> float:
+    """
+    生成とタイトル付け・ダウンロードを並行して行い、合計時間を返す
+
+    タスクが完了したら曲の保存をバックグラウンドに回し、すぐに次のタスクを投入する。
+    保存が終わるまでは API が報告した長さを見込みとして残り時間を計算し、
+    保存に失敗して足りなくなった場合は追加で生成する。
+    """
+    filename_lock = threading.Lock()
+    task_totals: list = []
+    total_duration = 0.0
+    saved = 0
+    consecutive_failures = 0
+    generating: set = set()
+    # 保存中の曲 → 見込みの長さ（秒）
+    saving: Dict = {}
+
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="piapi"
+    ) as generator, ThreadPoolExecutor(
+        max_workers=max(POST_PROCESS_WORKERS, concurrency),
+        thread_name_prefix="piapi-post",
+    ) as post_processor:
+        while True:
+            expected = (
+                sum(task_totals) / len(task_totals)
+                if task_totals
+                else EXPECTED_TRACK_DURATION
+            )
+            count = plan_task_count(
+                target_duration_sec - total_duration - sum(saving.values()),
+                len(generating),
+                expected,
+                concurrency,
+            )
+            for _ in range(count):
+                logger.info(f"🎼 Creating task with prompt: {prompt!r}")
+                generating.add(
+                    generator.submit(
+                        run_music_task_with_retries, prompt, journal=journal
                     )
-                    time.sleep(180)  # 3分待機
-                else:
-                    logger.error(
-                        f"❌ Failed after {max_retries} attempts. Moving to next iteration."
+                )
+            if not generating and not saving:
+                break
+
+            done, _ = wait(generating | set(saving), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in generating:
+                    generating.discard(future)
+                    task_data = future.result()
+                    variants = (
+                        task_variants(task_data, all_variants) if task_data else []
                     )
-                    break
+                    task_id = (
+                        task_data.get("task_id")
+                        if journal is not None and task_data
+                        else None
+                    )
+                    if task_id:
+                        journal.task_completed(task_id, [url for url, _ in variants])
+                    if not variants:
+                        if task_data:
+                            logger.error("❌ Audio URL not found, skipping.")
+                        consecutive_failures += 1
+                        continue
+                    consecutive_failures = 0
+                    task_total = 0.0
+                    for audio_url, duration in variants:
+                        estimate = duration or expected / len(variants)
+                        task_total += estimate
+                        saving[
+                            post_processor.submit(
+                                _save_variant,
+                                prompt,
+                                today_folder,
+                                audio_url,
+                                duration,
+                                filename_lock,
+                                journal,
+                                task_id,
+                            )
+                        ] = estimate
+                    task_totals.append(task_total)
+                    continue
+
+                saving.pop(future)
+                try:
+                    duration = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Failed to save track: {e}")
+                    consecutive_failures += 1
+                    continue
+                saved += 1
+                total_duration += duration
+                logger.info(
+                    f"\n=== Track {saved} saved | "
+                    f"Accumulated {total_duration:.1f}s / {target_duration_sec}s | "
+                    f"{len(generating)} generating, {len(saving)} saving ==="
+                )
+
+            if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                for future in generating | set(saving):
+                    future.cancel()
+                raise RuntimeError(
+                    f"{consecutive_failures} tasks failed in a row; giving up"
+                )
+
+    return total_duration
+
+
+def recover_tasks(
+    journal: RunJournal,
+    today_folder: str,
+    all_variants: bool = False,
+    filename_lock: Optional[threading.Lock] = None,
+) -> float:
+    """
+    ジャーナルに残っている未完了・未保存のタスクの曲を保存し、その合計時間を返す
 
-        if not success:
+    タスクは再投入せず、記録したタスク ID で結果を取得し直す。取得できない
+    タスク（失敗・期限切れ）は失敗として記録し、以後は対象にしない。
+    """
+    total_duration = 0.0
+    for task_id, task in journal.unfinished_tasks():
+        logger.info(f"♻️ Recovering task {task_id} ({task['status']})")
+        try:
+            task_data = wait_for_task(task_id, submitted_at=task.get("submitted_at"))
+        except Exception as e:
+            logger.error(f"❌ Task {task_id} could not be recovered: {e}")
+            journal.task_failed(task_id, e)
             continue
 
+        variants = task_variants(task_data, all_variants)
+        journal.task_completed(task_id, [url for url, _ in variants])
+        for audio_url, duration in variants:
+            if audio_url in task["saved"]:
+                continue
+            try:
+                total_duration += _save_variant(
+                    task.get("prompt", ""),
+                    today_folder,
+                    audio_url,
+                    duration,
+                    filename_lock,
+                    journal,
+                    task_id,
+                )
+            except Exception as e:
+                # 保存できなかった曲はジャーナルに残り、次回また取得を試みる
+                logger.error(f"❌ Failed to save recovered track {audio_url}: {e}")
+    return total_duration
+
+
+def _generate_sequentially(
+    today_folder: str,
+    prompt: str,
+    target_duration_sec: float,
+    all_variants: bool = False,
+    journal: Optional[RunJournal] = None,
+) -> float:
+    """1 曲ずつ順番に生成し、合計時間を返す"""
+    total_duration = 0.0
+    iteration = 1
+
+    while total_duration < target_duration_sec:
+        logger.info(
+            f"\n=== Iteration {iteration} | Accumulated {total_duration:.1f}s ==="
+        )
+        logger.info(f"🎼 Creating task with prompt: {prompt!r}")
+
+        duration = generate_track_with_retries(
+            prompt, today_folder, all_variants=all_variants, journal=journal
+        )
+        if duration is None:
+            continue
+
+        total_duration += duration
         iteration += 1
 
+    return total_duration
+
+
+def piapi_music_generation(
+    today_folder: str,
+    prompt: str,
+    target_duration_sec: int,
+    concurrency: int = 1,
+    all_variants: bool = False,
+    pipelined: bool = False,
+    journal: Optional[RunJournal] = None,
+) -> None:
+    """
+    目標時間に達するまで曲を生成してダウンロードする
+
+    Args:
+        today_folder (str): 保存先ディレクトリ
+        prompt (str): 音楽のプロンプト
+        target_duration_sec (int): 生成する合計時間（秒）
+        concurrency (int): 同時に実行するタスク数（1 なら 1 曲ずつ順番に生成）
+        all_variants (bool): 1 タスクが返した全ての曲を保存するかどうか
+        pipelined (bool): タイトル付けとダウンロードをバックグラウンドで行い、
+            タスク完了後すぐに次のタスクを投入するかどうか
+        journal (RunJournal, optional): タスク ID と保存した曲を記録するジャーナル。
+            前回の実行で残ったタスクの曲を先に保存し、保存済みの曲の長さを
+            目標時間から差し引く。生成後にも取り残したタスクがないか確認する
+    """
+    if API_KEY == "YOUR_API_KEY_HERE":
+        raise SystemExit("Please set API_KEY or PIAPI_KEY env var.")
+
+    # 出力ディレクトリの作成
+    os.makedirs(today_folder, exist_ok=True)
+
+    total_duration = 0.0
+    if journal is not None:
+        # 前回の実行で取り残したタスクの曲を先に保存し、保存済みの分を差し引く
+        recover_tasks(journal, today_folder, all_variants)
+        total_duration = sum(seconds for _, seconds in journal.saved_tracks())
+        if total_duration:
+            logger.info(f"♻️ {total_duration:.1f}s already saved by a previous run")
+    remaining_sec = target_duration_sec - total_duration
+
+    if pipelined:
+        logger.info(f"🚦 Pipelined generation with up to {concurrency} task(s)")
+        total_duration += _generate_pipelined(
+            today_folder, prompt, remaining_sec, concurrency, all_variants, journal
+        )
+    elif concurrency > 1:
+        logger.info(f"🚦 Generating with up to {concurrency} concurrent tasks")
+        total_duration += _generate_concurrently(
+            today_folder, prompt, remaining_sec, concurrency, all_variants, journal
+        )
+    else:
+        total_duration += _generate_sequentially(
+            today_folder, prompt, remaining_sec, all_variants, journal
+        )
+
+    if journal is not None:
+        # リトライで置き換えたタスク（タイムアウト後に完了したものなど）も保存する
+        total_duration += recover_tasks(journal, today_folder, all_variants)
+
     logger.info(
         f"\n🎉 Generation finished. Total length: {total_duration/60:.1f} minutes"
     )
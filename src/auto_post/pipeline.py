@@ -0,0 +1,407 @@
+"""
+pipeline.py
+-----------
+処理の各ステージを依存関係のグラフとして宣言し、依存し合わないステージを
+並行に実行するスケジューラ。
+
+・ステージは名前・処理・依存するステージの名前で宣言する
+・依存するステージが全て終わったものから、スレッドプールで順に実行する
+  （同時に実行できるものが複数ある場合は宣言順に優先する。max_workers=1 なら
+  宣言順に 1 つずつ実行する）
+・重い処理は子プロセス（ffmpeg）やネイティブコード（torch）、API の待ち時間が
+  中心で、ステージ同士が生成元のオブジェクトの状態を共有するため、プロセスでは
+  なくスレッドで実行する
+・どれかのステージが失敗（sys.exit による SystemExit を含む）したら新しい
+  ステージは開始せず、実行中のステージの終了を待ってから最初の例外を送出する
+・実行後、各ステージの所要時間と全体の時間を決めたクリティカルパスを求める
+
+inputs を宣言したステージは、入力（プロンプト・ファイルのハッシュ・パラメータ・
+コードのバージョン）と依存先の出力のダイジェストからキーを作り、結果と出力
+ファイルとともにマニフェスト（StageManifest）に記録する。再実行時はキーが同じで
+出力ファイルも変わっていないステージを実行せずに記録した結果を使い、出力が
+変わったステージの後続は自動的に再実行される（Make / Bazel と同様）。
+
+resource を宣言したステージは、複数のパイプラインで共有する ResourceBudget の
+枠が空くまで待ってから実行する（バッチで複数の動画を作る場合に、ある動画の
+エンコード中に別の動画のサムネイルを生成する、といった重ね方をするため）。
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+# マニフェストのファイル名
+MANIFEST_FILENAME = "pipeline_manifest.json"
+
+
+class Stage(NamedTuple):
+    """
+    パイプラインの 1 ステージ
+
+    inputs / outputs / restore はメモ化する場合だけ指定する。
+    """
+
+    name: str
+    func: Callable[[Dict[str, Any]], Any]  # それまでのステージの結果を受け取る
+    deps: Tuple[str, ...] = ()
+    # 結果を左右する入力（JSON にできる値）。None ならメモ化しない
+    inputs: Optional[Callable[[Dict[str, Any]], Any]] = None
+    # 結果から出力ファイルの一覧を返す
+    outputs: Optional[Callable[[Any], Sequence]] = None
+    # 記録した結果を使う場合に、実行した場合と同じ状態を復元する
+    restore: Optional[Callable[[Any], None]] = None
+    # 実行中に占有する資源の名前（ResourceBudget を参照）
+    resource: Optional[str] = None
+
+
+class StageTiming(NamedTuple):
+    """ステージの開始・終了時刻（time.perf_counter）"""
+
+    start: float
+    end: float
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+class PipelineResult(NamedTuple):
+    """パイプラインの実行結果"""
+
+    results: Dict[str, Any]  # ステージ名 → 戻り値
+    timings: Dict[str, StageTiming]
+    critical_path: List[str]
+
+
+class ResourceBudget:
+    """
+    複数のパイプラインで共有する資源の枠
+
+    資源名 → 同時に実行できるステージ数。枠を宣言していない資源は制限しない。
+    """
+
+    def __init__(self, slots: Dict[str, int]):
+        self._semaphores = {
+            name: threading.BoundedSemaphore(max(1, count))
+            for name, count in slots.items()
+        }
+
+    @contextmanager
+    def hold(self, resource: Optional[str], name: str = "") -> Iterator[None]:
+        """資源の枠が空くまで待ち、ブロックを抜けるまで占有する"""
+        semaphore = self._semaphores.get(resource)
+        if semaphore is None:
+            yield
+            return
+        if not semaphore.acquire(blocking=False):
+            logger.info(f"==> 資源 {resource} の空きを待っています: {name}")
+            semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+def file_digest(path) -> Optional[str]:
+    """ファイルの SHA-256（存在しなければ None）"""
+    try:
+        digest = hashlib.sha256()
+        with Path(path).open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+
+def code_version(obj) -> Optional[str]:
+    """関数やモジュールを実装するソースのハッシュ（取得できなければ None）"""
+    try:
+        return file_digest(inspect.getfile(obj))
+    except (TypeError, OSError):
+        return None
+
+
+def _json_digest(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _signature(path: Path) -> Optional[List[int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class StageManifest:
+    """
+    メモ化したステージの入力のキー・結果・出力ファイルを記録するマニフェスト
+
+    出力ファイルはサイズと更新時刻で変更を検出し、内容の SHA-256 を後続の
+    キーに使う（同じ内容を出力した場合、後続は再実行しない）。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try:
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def lookup(self, name: str, key: str) -> Optional[dict]:
+        """キーが一致し、出力ファイルが記録時のままなら記録を返す"""
+        entry = self.entries.get(name)
+        if not entry or entry.get("key") != key:
+            return None
+        for path, output in entry["outputs"].items():
+            if output is None or _signature(Path(path)) != output["signature"]:
+                return None
+        return entry
+
+    @staticmethod
+    def make_entry(key: str, result: Any, outputs: Sequence) -> dict:
+        """実行した結果の記録を作る（ワーカーのスレッドで出力のハッシュを求める）"""
+        recorded = {}
+        for path in outputs:
+            path = Path(path)
+            signature = _signature(path)
+            recorded[str(path)] = signature and dict(
+                signature=signature, sha256=file_digest(path)
+            )
+        digest = _json_digest(
+            [result, {p: o and o["sha256"] for p, o in recorded.items()}]
+        )
+        return dict(key=key, result=result, outputs=recorded, digest=digest)
+
+    def record(self, name: str, entry: dict) -> None:
+        self.entries[name] = entry
+        self.save()
+
+    def save(self) -> None:
+        """一時ファイルに書いてから置き換える"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(
+            json.dumps(self.entries, ensure_ascii=False, indent=2, default=str),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.path)
+
+
+def stage_key(stage: Stage, results: Dict[str, Any], digests: Dict[str, str]) -> str:
+    """ステージの入力と依存先の出力のダイジェストから作るキー"""
+    return _json_digest(
+        [stage.inputs(results), {dep: digests.get(dep, "") for dep in stage.deps}]
+    )
+
+
+def validate_stages(stages: Sequence[Stage]) -> None:
+    """
+    ステージの宣言を検証する
+
+    Raises:
+        ValueError: 名前の重複・存在しない依存先・循環がある場合
+    """
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"ステージ名が重複しています: {names}")
+    for stage in stages:
+        unknown = set(stage.deps) - set(names)
+        if unknown:
+            raise ValueError(
+                f"ステージ '{stage.name}' の依存先が存在しません: {sorted(unknown)}"
+            )
+
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [s for s in remaining if set(s.deps) <= done]
+        if not ready:
+            cycle = [s.name for s in remaining]
+            raise ValueError(f"ステージの依存関係が循環しています: {cycle}")
+        done.update(s.name for s in ready)
+        remaining = [s for s in remaining if s.name not in done]
+
+
+def critical_path(
+    stages: Sequence[Stage], timings: Dict[str, StageTiming]
+) -> List[str]:
+    """
+    最後に終わったステージから、各ステージの開始を決めた（最後に終わった）
+    依存先をたどったステージの列
+    """
+    by_name = {stage.name: stage for stage in stages}
+    finished = [name for name in by_name if name in timings]
+    if not finished:
+        return []
+    path = [max(finished, key=lambda name: timings[name].end)]
+    while True:
+        deps = [d for d in by_name[path[-1]].deps if d in timings]
+        if not deps:
+            break
+        path.append(max(deps, key=lambda name: timings[name].end))
+    return path[::-1]
+
+
+def format_critical_path(path: List[str], timings: Dict[str, StageTiming]) -> str:
+    """クリティカルパスをログ用の文字列にする"""
+    return " → ".join(f"{name} ({timings[name].seconds:.1f}秒)" for name in path)
+
+
+class _Scheduler:
+    """run_stages の 1 回の実行の状態"""
+
+    def __init__(self, stages, max_workers, manifest, force, budget):
+        self.max_workers = max(1, max_workers)
+        self.manifest = manifest
+        self.budget = budget or ResourceBudget({})
+        self.force = set(force)
+        self.pending = list(stages)
+        self.running = {}
+        self.results: Dict[str, Any] = {}
+        self.digests: Dict[str, str] = {}
+        self.timings: Dict[str, StageTiming] = {}
+        self.error = None
+
+    def _ready(self) -> List[Stage]:
+        if self.error is not None:
+            return []
+        return [s for s in self.pending if set(s.deps) <= self.results.keys()]
+
+    def _execute(self, stage: Stage, key: Optional[str]) -> Tuple[Any, Optional[dict]]:
+        with self.budget.hold(stage.resource, stage.name):
+            start = time.perf_counter()
+            try:
+                result = stage.func(self.results)
+                if key is None:
+                    return result, None
+                outputs = stage.outputs(result) if stage.outputs else ()
+                return result, StageManifest.make_entry(key, result, outputs)
+            finally:
+                self.timings[stage.name] = StageTiming(start, time.perf_counter())
+
+    def _reuse(self, stage: Stage) -> Tuple[bool, Optional[str]]:
+        """
+        記録した結果を使えれば使う
+
+        Returns:
+            (記録した結果を使ったか, 実行して記録する場合のキー)
+        """
+        if self.manifest is None or stage.inputs is None:
+            return False, None
+        key = stage_key(stage, self.results, self.digests)
+        entry = None
+        if stage.name not in self.force:
+            entry = self.manifest.lookup(stage.name, key)
+        if entry is None:
+            return False, key
+        logger.info(f"==> 入力が変わっていないため記録した結果を使います: {stage.name}")
+        if stage.restore:
+            stage.restore(entry["result"])
+        self.results[stage.name] = entry["result"]
+        self.digests[stage.name] = entry["digest"]
+        return True, None
+
+    def _submit_ready(self, executor) -> None:
+        ready = self._ready()
+        while ready and len(self.running) < self.max_workers:
+            stage = ready.pop(0)
+            self.pending.remove(stage)
+            reused, key = self._reuse(stage)
+            if reused:
+                # 記録した結果を使った場合は後続が実行できるようになる
+                ready = self._ready()
+                continue
+            logger.info(f"==> ステージ開始: {stage.name}")
+            self.running[executor.submit(self._execute, stage, key)] = stage
+
+    def _collect(self, future) -> None:
+        stage = self.running.pop(future)
+        try:
+            self.results[stage.name], entry = future.result()
+        except BaseException as e:
+            self.error = self.error or e
+            logger.error(f"==> ステージ '{stage.name}' が失敗しました")
+            return
+        if entry is not None:
+            self.digests[stage.name] = entry["digest"]
+            self.manifest.record(stage.name, entry)
+        logger.info(
+            f"==> ステージ完了: {stage.name} "
+            f"(処理時間: {self.timings[stage.name].seconds:.2f}秒)"
+        )
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                self._submit_ready(executor)
+                if not self.running:
+                    break
+                finished, _ = wait(self.running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._collect(future)
+        if self.error is not None:
+            raise self.error
+
+
+def run_stages(
+    stages: Sequence[Stage],
+    max_workers: int = 1,
+    manifest: Optional[StageManifest] = None,
+    force: Collection[str] = (),
+    budget: Optional[ResourceBudget] = None,
+) -> PipelineResult:
+    """
+    依存関係を満たしたステージから並行に実行する
+
+    Args:
+        stages: 実行するステージ（宣言順が実行の優先順になる）
+        max_workers: 同時に実行するステージ数の上限
+        manifest: 指定した場合、入力が変わっていないステージは記録した結果を使う
+        force: 入力が変わっていなくても実行するステージ名
+        budget: resource を宣言したステージが占有する資源の枠（他のパイプラインと共有できる）
+
+    Returns:
+        PipelineResult: 各ステージの戻り値・所要時間・クリティカルパス
+
+    Raises:
+        ValueError: ステージの宣言や force の指定が正しくない場合
+        ステージが送出した最初の例外（SystemExit を含む）
+    """
+    validate_stages(stages)
+    unknown = set(force) - {stage.name for stage in stages}
+    if unknown:
+        raise ValueError(f"存在しないステージが指定されました: {sorted(unknown)}")
+
+    scheduler = _Scheduler(stages, max_workers, manifest, force, budget)
+    scheduler.run()
+
+    timings = scheduler.timings
+    path = critical_path(stages, timings)
+    logger.info(f"==> クリティカルパス: {format_critical_path(path, timings)}")
+    return PipelineResult(scheduler.results, timings, path)
@@ -0,0 +1,601 @@
+"""
+render_benchmark.py
+-------------------
+build_video と各描画方法の速度・メモリ・サイズ・画質を設定の組み合わせごとに測るスクリプト。
+
+指定した静止画と音源（音源は各ケースの長さに切り出す）、または ffmpeg で
+合成したテスト画像と音源（正弦波＋ピンクノイズにトレモロをかけたもの）を使う。
+合成した素材ならネットワークや GPU なしで動く。以下の組み合わせを全て試し、
+1 ケースずつ別プロセスで実行して結果を表・JSON・CSV で出力する。
+
+・長さ（秒）
+・描画方法（build_video / single: 1 回で書き出す / segmented: 区間ごと /
+  main: メイン部だけを create_video と同じ設定でエンコード）
+・描画エンジン（moviepy / ffmpeg）
+・x264 のプリセット・スレッド数
+・メイン部のフレームレート（VIDEO_FPS 未満で静止画モード）
+・波形のサイズ
+・区間ごとに並列エンコードするプロセス数
+
+各ケースについて、実行時間（秒）・実時間に対する倍速・1 秒あたりのフレーム数・
+ピークメモリ（同時に動くワーカー・ffmpeg を含む RSS の合計）・出力サイズと
+平均ビットレートを記録する。--ssim を付けると、fps 以外が同じ設定で
+VIDEO_FPS で書き出したものを基準に SSIM を測る
+（比較の際は両方を VIDEO_FPS の固定フレームレートに揃える）。
+
+使い方
+# メイン部の fps ごとの速度・サイズ・画質
+python -m auto_post.render_benchmark --image ./thumb.png --audio ./combined_audio.m4a \
+    --mode main --engine moviepy --fps 24 12 8 6 --ssim
+
+# 合成した素材で設定の組み合わせごとの速度・メモリ
+python -m auto_post.render_benchmark --duration 60 600 --engine ffmpeg moviepy \
+    --preset ultrafast medium --fps 24 8 --json report.json --csv report.csv
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from moviepy.config import FFMPEG_BINARY
+
+from .audio_envelope import frame_count
+from .combine_audio import AUDIO_FORMATS
+from .create_video import RENDER_ENGINES, VIDEO_FPS
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# 描画方法
+RENDER_MODES = ("build_video", "single", "segmented", "main")
+
+# 既定の組み合わせ
+DEFAULT_DURATIONS = (60.0,)
+DEFAULT_MODES = ("build_video",)
+DEFAULT_ENGINES = ("ffmpeg", "moviepy")
+DEFAULT_PRESETS = ("medium",)
+DEFAULT_THREADS = (0,)  # 0 はエンコーダの自動設定
+DEFAULT_FPS = (24,)
+DEFAULT_WAVEFORMS = ("960x80",)
+DEFAULT_WORKERS = (1,)
+
+# 合成する素材
+SYNTH_IMAGE_SIZE = (1920, 1080)
+SYNTH_AUDIO_FORMAT = "m4a"
+
+# メモリを測る間隔（秒）
+RSS_SAMPLE_SEC = 0.1
+
+# 1 ケースの制限時間（秒）
+CASE_TIMEOUT = 3600
+
+# ケースの設定とレポートの列
+CASE_FIELDS = [
+    "duration",
+    "mode",
+    "engine",
+    "preset",
+    "threads",
+    "fps",
+    "waveform",
+    "workers",
+]
+REPORT_FIELDS = CASE_FIELDS + [
+    "seconds",
+    "speed",
+    "frames",
+    "frames_per_sec",
+    "peak_rss_mb",
+    "size",
+    "kbps",
+    "ssim",
+    "error",
+]
+
+_SSIM_PATTERN = re.compile(r"All:([0-9.]+)")
+
+
+# --------------------------------------------------------------
+# 素材
+# --------------------------------------------------------------
+def synth_audio(path: Path, duration: float) -> Path:
+    """正弦波とピンクノイズを混ぜ、音量を揺らした duration 秒の音源を作る"""
+    fmt = AUDIO_FORMATS[path.suffix.lstrip(".")]
+    command = [FFMPEG_BINARY, "-y", "-nostats", "-loglevel", "error"]
+    command += ["-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}"]
+    command += ["-f", "lavfi", "-i", f"anoisesrc=duration={duration}:color=pink"]
+    command += [
+        "-filter_complex",
+        "[0:a][1:a]amix=inputs=2,tremolo=f=2:d=0.8,aformat=channel_layouts=stereo",
+        "-ar",
+        "44100",
+        *fmt.codec_args,
+        str(path),
+    ]
+    subprocess.run(command, check=True)
+    return path
+
+
+def excerpt_audio(source: Path, path: Path, duration: float) -> Path:
+    """source の先頭 duration 秒を path の形式で書き出す"""
+    fmt = AUDIO_FORMATS[path.suffix.lstrip(".")]
+    command = [FFMPEG_BINARY, "-y", "-nostats", "-loglevel", "error"]
+    command += ["-i", str(source), "-t", f"{duration:.3f}", "-vn"]
+    command += [*fmt.codec_args, str(path)]
+    subprocess.run(command, check=True)
+    return path
+
+
+def synth_image(path: Path, size=SYNTH_IMAGE_SIZE) -> Path:
+    """テストパターンの静止画を作る"""
+    W, H = size
+    command = [FFMPEG_BINARY, "-y", "-nostats", "-loglevel", "error"]
+    command += ["-f", "lavfi", "-i", f"testsrc2=size={W}x{H}", "-frames:v", "1"]
+    command += [str(path)]
+    subprocess.run(command, check=True)
+    return path
+
+
+def measure_ssim(distorted: Path, reference: Path) -> Optional[float]:
+    """reference に対する distorted の SSIM（両方を VIDEO_FPS に揃えて比較する）"""
+    graph = (
+        f"[0:v]fps={VIDEO_FPS},setpts=PTS-STARTPTS[a];"
+        f"[1:v]fps={VIDEO_FPS},setpts=PTS-STARTPTS[b];[a][b]ssim"
+    )
+    command = [FFMPEG_BINARY, "-nostats", "-i", str(distorted), "-i", str(reference)]
+    command += ["-lavfi", graph, "-f", "null", "-"]
+    result = subprocess.run(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=False
+    )
+    match = _SSIM_PATTERN.search(result.stderr.decode(errors="ignore"))
+    return float(match.group(1)) if match else None
+
+
+# --------------------------------------------------------------
+# ケース
+# --------------------------------------------------------------
+def expand_matrix(
+    durations: Sequence[float] = DEFAULT_DURATIONS,
+    modes: Sequence[str] = DEFAULT_MODES,
+    engines: Sequence[str] = DEFAULT_ENGINES,
+    presets: Sequence[str] = DEFAULT_PRESETS,
+    threads: Sequence[int] = DEFAULT_THREADS,
+    fps_values: Sequence[int] = DEFAULT_FPS,
+    waveforms: Sequence[str] = DEFAULT_WAVEFORMS,
+    workers: Sequence[int] = DEFAULT_WORKERS,
+) -> List[Dict]:
+    """
+    設定の組み合わせを列挙する
+
+    1 回で書き出す描画方法（single）では並列数とメイン部の fps を使わないため
+    1 と VIDEO_FPS に、メイン部だけの描画（main）では並列数を使わないため 1 に
+    まとめ、重複する組み合わせは 1 回だけ実行する。
+    """
+    cases = []
+    for combo in itertools.product(
+        durations, modes, engines, presets, threads, fps_values, waveforms, workers
+    ):
+        case = dict(zip(CASE_FIELDS, combo))
+        if case["mode"] == "single":
+            case.update(workers=1, fps=VIDEO_FPS)
+        elif case["mode"] == "main":
+            case.update(workers=1)
+        if case not in cases:
+            cases.append(case)
+    return cases
+
+
+def reference_case(case: Dict) -> Dict:
+    """SSIM の基準にするケース（fps 以外が同じで VIDEO_FPS のもの）"""
+    return dict(case, fps=VIDEO_FPS)
+
+
+def _tree_rss() -> int:
+    """自分自身と全ての子孫プロセス（ffmpeg・区間のワーカー）の RSS の合計（バイト）"""
+    import psutil
+
+    total = 0
+    process = psutil.Process()
+    for proc in [process, *process.children(recursive=True)]:
+        try:
+            total += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+
+class _RssSampler:
+    """
+    実行中のプロセスツリー全体の RSS の合計を定期的に測り、最大値を記録する
+
+    区間を並列にエンコードするとワーカーが同時にメモリを使うため、プロセス
+    ごとの最大値（getrusage）ではなく同時に使っている量の合計を測る。
+    サンプリングの間に終わった短いプロセスを取りこぼさないよう、最大の
+    単一プロセスの値（getrusage）より小さくはしない。
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SEC):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while True:
+            self.peak = max(self.peak, _tree_rss())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "_RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def peak_mb(self) -> float:
+        largest_kb = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+        return round(max(self.peak / 1024, largest_kb) / 1024, 1)
+
+
+def _render(case: Dict, still_path: Path, audio_path: Path, work_dir: Path) -> Path:
+    """ケースの設定で動画を書き出す（run_case から呼ばれる）"""
+    from moviepy import AudioFileClip
+
+    from . import create_video as cv
+    from .config import Config
+
+    width, height = (int(v) for v in case["waveform"].split("x"))
+    cv.VIDEO_PRESET = case["preset"]
+    cv.VIDEO_THREADS = case["threads"] or None
+    cv.WAVEFORM_SIZE = (width, height)
+    Config.OPENING_VIDEO_PATH = None
+    Config.VIDEO_CACHE_DIR = work_dir / "cache"
+    output_file = work_dir / Config.FINAL_VIDEO_FILENAME
+
+    if case["mode"] == "build_video":
+        return cv.build_video(
+            still_path,
+            audio_path,
+            work_dir,
+            engine=case["engine"],
+            segment_workers=case["workers"],
+            main_fps=case["fps"],
+        )
+    if case["mode"] == "main":
+        return cv._encode_main_segment(
+            case["engine"],
+            still_path,
+            audio_path,
+            output_file,
+            0.0,
+            case["duration"],
+            case["fps"],
+        )
+    if case["mode"] == "segmented":
+        return cv.render_segmented(
+            still_path,
+            audio_path,
+            output_file,
+            case["duration"],
+            engine=case["engine"],
+            workers=case["workers"],
+            main_fps=case["fps"],
+        )
+    if case["engine"] == "ffmpeg":
+        return cv.render_with_ffmpeg(
+            still_path, audio_path, output_file, case["duration"]
+        )
+    audio = AudioFileClip(str(audio_path))
+    try:
+        return cv.render_with_moviepy(
+            still_path, audio, audio_path, output_file, case["duration"]
+        )
+    finally:
+        audio.close()
+
+
+def run_case(case: Dict, still_path: Path, audio_path: Path, work_dir: Path) -> Dict:
+    """
+    1 ケースを実行して計測する（別プロセスで呼ばれる想定）
+
+    Returns:
+        dict: ケースの設定に REPORT_FIELDS の計測値と、書き出した動画の
+        パス（output）を加えたもの
+    """
+    result = dict(case, **{field: None for field in REPORT_FIELDS[len(CASE_FIELDS) :]})
+    result["output"] = None
+    start = time.perf_counter()
+    sampler = _RssSampler()
+    try:
+        with sampler:
+            output_file = _render(case, still_path, audio_path, work_dir)
+        if output_file is None:
+            raise RuntimeError("動画を生成できませんでした")
+        seconds = time.perf_counter() - start
+        frames = frame_count(case["duration"], case["fps"])
+        size = Path(output_file).stat().st_size
+        result.update(
+            seconds=round(seconds, 3),
+            speed=round(case["duration"] / seconds, 2) if seconds > 0 else None,
+            frames=frames,
+            frames_per_sec=round(frames / seconds, 1) if seconds > 0 else None,
+            size=size,
+            kbps=round(size * 8 / case["duration"] / 1000, 1),
+            output=str(output_file),
+        )
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    result["peak_rss_mb"] = sampler.peak_mb
+    return result
+
+
+def _run_case_in_subprocess(
+    case: Dict, still_path: Path, audio_path: Path, work_dir: Path
+) -> Dict:
+    """ピークメモリを他のケースと分けて測るため、ケースごとに Python を起動する"""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    command = [sys.executable, "-m", "auto_post.render_benchmark", "--case"]
+    command += [json.dumps(case), str(still_path), str(audio_path), str(work_dir)]
+    env = dict(os.environ, TESTING="false")
+    package_root = str(Path(__file__).resolve().parents[1])
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [package_root, env.get("PYTHONPATH")])
+    )
+    try:
+        completed = subprocess.run(
+            command,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=CASE_TIMEOUT,
+            check=True,
+        )
+        return json.loads(completed.stdout.decode().strip().splitlines()[-1])
+    except (subprocess.SubprocessError, ValueError, IndexError) as e:
+        return dict(case, error=f"ベンチマークのプロセスが失敗しました: {e}")
+
+
+def run_matrix(
+    cases: Sequence[Dict],
+    work_dir: Optional[Path] = None,
+    still_path: Optional[Path] = None,
+    audio_path: Optional[Path] = None,
+    ssim: bool = False,
+) -> List[Dict]:
+    """
+    全てのケースを順に実行する
+
+    still_path / audio_path を指定しなければ合成した素材を使う。音源は長さ
+    ごとに 1 回だけ用意し（指定した音源は先頭を切り出す）、各ケースの出力は
+    計測後に削除する。ssim を指定した場合は基準のケースを先に実行して
+    出力を最後まで残す（指定していない基準のケースは結果に含めない）。
+    """
+    own_dir = work_dir is None
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="render_benchmark_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    run_order = list(cases)
+    if ssim:
+        for reference in map(reference_case, cases):
+            if reference not in run_order:
+                run_order.append(reference)
+        run_order.sort(key=lambda case: case["fps"] != VIDEO_FPS)
+    kept_dirs = []
+    try:
+        still_path = still_path or synth_image(work_dir / "still.png")
+        audio_files = {}
+        references = {}  # 基準のケース → 書き出した動画
+        results = {}
+        for i, case in enumerate(run_order, start=1):
+            duration = case["duration"]
+            if duration not in audio_files:
+                audio_files[duration] = _prepare_audio(
+                    work_dir, len(audio_files), duration, audio_path
+                )
+            case_dir = work_dir / f"case_{i:03d}"
+            result = _run_case_in_subprocess(
+                case, still_path, audio_files[duration], case_dir
+            )
+            output = result.pop("output", None)
+            if ssim and output and case["fps"] == VIDEO_FPS:
+                result["ssim"] = 1.0
+                references[_key(case)] = Path(output)
+                kept_dirs.append(case_dir)
+            else:
+                if ssim and output and _key(reference_case(case)) in references:
+                    reference = references[_key(reference_case(case))]
+                    result["ssim"] = measure_ssim(Path(output), reference)
+                shutil.rmtree(case_dir, ignore_errors=True)
+            logger.info(f"==> [{i}/{len(run_order)}] {_describe(result)}")
+            results[_key(case)] = result
+        return [results[_key(case)] for case in cases]
+    finally:
+        for case_dir in kept_dirs:
+            shutil.rmtree(case_dir, ignore_errors=True)
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _prepare_audio(
+    work_dir: Path, index: int, duration: float, source: Optional[Path]
+) -> Path:
+    suffix = AUDIO_FORMATS[SYNTH_AUDIO_FORMAT].suffix
+    path = work_dir / f"mix_{index}{suffix}"
+    if source is None:
+        return synth_audio(path, duration)
+    return excerpt_audio(source, path, duration)
+
+
+def _key(case: Dict) -> str:
+    return json.dumps([case[field] for field in CASE_FIELDS])
+
+
+def _describe(result: Dict) -> str:
+    settings = " ".join(f"{key}={result[key]}" for key in CASE_FIELDS)
+    if result.get("error"):
+        return f"{settings}: エラー: {result['error']}"
+    return (
+        f"{settings}: {result.get('seconds')}秒 ({result.get('speed')}倍速) / "
+        f"{result.get('frames_per_sec')}fps / {result.get('peak_rss_mb')}MB / "
+        f"{result.get('kbps')}kbps / SSIM {result.get('ssim')}"
+    )
+
+
+# --------------------------------------------------------------
+# レポート
+# --------------------------------------------------------------
+def format_table(results: Sequence[Dict]) -> str:
+    """ベンチマーク結果を表形式の文字列にする"""
+
+    def cell(value, spec: str) -> str:
+        return format(value, spec) if value is not None else "-"
+
+    lines = [
+        "    秒 | 描画方法    | エンジン | fps | 時間(秒) |  倍速 | メモリ(MB) "
+        "| サイズ(MB) |   kbps |   SSIM"
+    ]
+    for r in results:
+        size = r["size"] / 1e6 if r.get("size") is not None else None
+        lines.append(
+            f"{r['duration']:>6g} | {r['mode']:<11} | {r['engine']:<8} | "
+            f"{r['fps']:>3} | {cell(r.get('seconds'), '.2f'):>8} | "
+            f"{cell(r.get('speed'), '.1f'):>5} | "
+            f"{cell(r.get('peak_rss_mb'), '.0f'):>10} | {cell(size, '.2f'):>10} | "
+            f"{cell(r.get('kbps'), '.0f'):>6} | {cell(r.get('ssim'), '.4f'):>6}"
+        )
+    return "\n".join(lines)
+
+
+def write_report(results: Sequence[Dict], path: Path) -> Path:
+    """結果を書き出す（拡張子が .csv なら CSV、それ以外は JSON）"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        path.write_text(
+            json.dumps(list(results), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+    return path
+
+
+def main() -> None:
+    """コマンドライン実行用のメイン関数"""
+    parser = argparse.ArgumentParser(
+        description="build_video と各描画方法の速度・メモリ・サイズ・画質を設定ごとに比較"
+    )
+    parser.add_argument("--image", help="静止画ファイル（未指定時は合成する）")
+    parser.add_argument(
+        "--audio", help="音声ファイル（各ケースの長さに切り出す。未指定時は合成する）"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        nargs="+",
+        default=list(DEFAULT_DURATIONS),
+        help="書き出す長さ（秒）",
+    )
+    parser.add_argument(
+        "--mode", nargs="+", choices=RENDER_MODES, default=list(DEFAULT_MODES)
+    )
+    parser.add_argument(
+        "--engine",
+        nargs="+",
+        choices=RENDER_ENGINES,
+        default=list(DEFAULT_ENGINES),
+    )
+    parser.add_argument("--preset", nargs="+", default=list(DEFAULT_PRESETS))
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_THREADS),
+        help="x264 のスレッド数（0 は自動）",
+    )
+    parser.add_argument(
+        "--fps", type=int, nargs="+", default=list(DEFAULT_FPS), help="メイン部の fps"
+    )
+    parser.add_argument(
+        "--waveform",
+        nargs="+",
+        default=list(DEFAULT_WAVEFORMS),
+        help="波形のサイズ（幅x高さ）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_WORKERS),
+        help="区間ごとに並列エンコードするプロセス数",
+    )
+    parser.add_argument(
+        "--ssim",
+        action="store_true",
+        help=f"{VIDEO_FPS}fps で書き出したものを基準に SSIM を測る",
+    )
+    parser.add_argument("--json", help="JSON のレポートを書き出すパス")
+    parser.add_argument("--csv", help="CSV のレポートを書き出すパス")
+    parser.add_argument(
+        "--work_dir", help="作業ディレクトリ（未指定時は一時ディレクトリ）"
+    )
+    parser.add_argument("--case", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        case, still_path, audio_path, work_dir = args.case
+        result = run_case(
+            json.loads(case), Path(still_path), Path(audio_path), Path(work_dir)
+        )
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    cases = expand_matrix(
+        args.duration,
+        args.mode,
+        args.engine,
+        args.preset,
+        args.threads,
+        args.fps,
+        args.waveform,
+        args.workers,
+    )
+    logger.info(f"==> {len(cases)} ケースを実行します")
+    results = run_matrix(
+        cases,
+        Path(args.work_dir) if args.work_dir else None,
+        still_path=Path(args.image).expanduser() if args.image else None,
+        audio_path=Path(args.audio).expanduser() if args.audio else None,
+        ssim=args.ssim,
+    )
+    for path in filter(None, [args.json, args.csv]):
+        logger.info(f"==> レポートを書き出しました: {write_report(results, path)}")
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    main()
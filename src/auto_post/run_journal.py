@@ -0,0 +1,282 @@
+"""
+run_journal.py
+--------------
+1 回の実行の状態を出力ディレクトリに記録するジャーナル。
+
+・実行の引数・状態（running / failed / completed / abandoned）・試行回数
+・各ステージの状態（running / completed / failed）
+・PiAPI のタスク ID と、各タスクが返した曲のうち保存済みのもの
+
+変更のたびに一時ファイルに書いてから置き換えるため、途中でプロセスが
+強制終了しても直前の状態が残る。終わっていない実行は次回の起動時に
+（--resume を指定した場合）同じ出力ディレクトリ・同じ引数で再開し、完了したステージはマニフェスト
+（pipeline.StageManifest）の記録を使って飛ばす。投入済みの PiAPI タスクは
+再投入せずに結果を取得し直すため、料金を払った生成結果は失われない。
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# ジャーナルのファイル名
+JOURNAL_FILENAME = "run_journal.json"
+
+# 実行の状態
+RUNNING = "running"
+FAILED = "failed"
+COMPLETED = "completed"
+ABANDONED = "abandoned"
+
+# PiAPI タスクの状態
+TASK_SUBMITTED = "submitted"  # 投入済み（完了を確認していない）
+TASK_COMPLETED = "completed"  # 完了済み（保存していない曲がある）
+TASK_DONE = "done"  # 全ての曲を保存済み
+TASK_FAILED = "failed"
+
+# 実行を管理しているもの（worker の実行はジョブキューが再試行する）
+OWNER_CLI = "cli"
+OWNER_WORKER = "worker"
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class RunJournal:
+    """
+    実行のジャーナル
+
+    メソッドはスレッドセーフで、呼ぶたびにファイルへ保存する。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.data = {}
+        self.data.setdefault("stages", {})
+        self.data.setdefault("tasks", {})
+
+    @property
+    def status(self) -> Optional[str]:
+        return self.data.get("status")
+
+    @property
+    def attempts(self) -> int:
+        return self.data.get("attempts", 0)
+
+    @property
+    def args(self) -> Dict[str, Any]:
+        return self.data.get("args", {})
+
+    @property
+    def owner(self) -> str:
+        return self.data.get("owner", OWNER_CLI)
+
+    def is_unfinished(self) -> bool:
+        """
+        再開すべき実行かどうか
+
+        running のまま残っていても、記録したプロセスが同じホストで
+        まだ動いている場合は実行中とみなす。
+        """
+        if self.status == RUNNING:
+            same_host = self.data.get("host") == socket.gethostname()
+            pid = self.data.get("pid")
+            return not (same_host and pid and pid_alive(pid))
+        return self.status == FAILED
+
+    def last_stage(self) -> Optional[str]:
+        """最後に完了したステージ"""
+        completed = [
+            (state["finished_at"], name)
+            for name, state in self.data["stages"].items()
+            if state.get("status") == COMPLETED
+        ]
+        return max(completed)[1] if completed else None
+
+    # ------------------------------------------------------------------
+    # 実行
+    # ------------------------------------------------------------------
+    def start(self, args: Dict[str, Any], owner: str = OWNER_CLI) -> None:
+        """実行（または再開）の開始を記録する"""
+        with self._lock:
+            self.data.update(
+                status=RUNNING,
+                args=args,
+                owner=owner,
+                attempts=self.attempts + 1,
+                pid=os.getpid(),
+                host=socket.gethostname(),
+                started_at=_now(),
+                error=None,
+            )
+            self._save(create=True)
+
+    def fail(self, error: BaseException) -> None:
+        with self._lock:
+            self.data.update(status=FAILED, error=str(error) or repr(error))
+            self._save()
+
+    def finish(self) -> None:
+        with self._lock:
+            self.data["status"] = COMPLETED
+            self._save()
+
+    def abandon(self) -> None:
+        """再開をあきらめたことを記録する"""
+        with self._lock:
+            self.data["status"] = ABANDONED
+            self._save()
+
+    def note(self, **values: Any) -> None:
+        """再開や後始末に必要な値（Lo-Fi タイプなど）を記録する"""
+        with self._lock:
+            self.data.update(values)
+            self._save()
+
+    # ------------------------------------------------------------------
+    # ステージ
+    # ------------------------------------------------------------------
+    def stage_started(self, name: str) -> None:
+        with self._lock:
+            self.data["stages"][name] = dict(status=RUNNING, started_at=_now())
+            self._save()
+
+    def stage_finished(self, name: str) -> None:
+        with self._lock:
+            self.data["stages"].setdefault(name, {}).update(
+                status=COMPLETED, finished_at=_now()
+            )
+            self._save()
+
+    def stage_failed(self, name: str, error: BaseException) -> None:
+        with self._lock:
+            self.data["stages"].setdefault(name, {}).update(
+                status=FAILED, finished_at=_now(), error=str(error) or repr(error)
+            )
+            self._save()
+
+    # ------------------------------------------------------------------
+    # PiAPI タスク
+    # ------------------------------------------------------------------
+    def task_submitted(self, task_id: str, prompt: str, submitted_at: float) -> None:
+        with self._lock:
+            self.data["tasks"][task_id] = dict(
+                status=TASK_SUBMITTED,
+                prompt=prompt,
+                submitted_at=submitted_at,
+                saved={},
+            )
+            self._save()
+
+    def task_completed(self, task_id: str, urls: Sequence[str]) -> None:
+        """タスクが返した（保存すべき）曲の URL を記録する"""
+        with self._lock:
+            task = self._task(task_id)
+            task["urls"] = list(urls)
+            task["status"] = TASK_COMPLETED if urls else TASK_FAILED
+            self._update_done(task)
+            self._save()
+
+    def variant_saved(self, task_id: str, url: str, path, seconds: float) -> None:
+        with self._lock:
+            task = self._task(task_id)
+            task["saved"][url] = dict(path=str(path), seconds=seconds)
+            self._update_done(task)
+            self._save()
+
+    def task_failed(self, task_id: str, error: BaseException) -> None:
+        with self._lock:
+            self._task(task_id).update(status=TASK_FAILED, error=str(error))
+            self._save()
+
+    def unfinished_tasks(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """完了を確認していない・保存していない曲があるタスク"""
+        with self._lock:
+            return [
+                (task_id, dict(task))
+                for task_id, task in self.data["tasks"].items()
+                if task["status"] in (TASK_SUBMITTED, TASK_COMPLETED)
+            ]
+
+    def saved_tracks(self) -> List[Tuple[Path, float]]:
+        """保存済みで、まだ存在する曲のパスと長さ（秒）"""
+        with self._lock:
+            saved = [
+                (Path(variant["path"]), variant["seconds"])
+                for task in self.data["tasks"].values()
+                for variant in task["saved"].values()
+            ]
+        return [(path, seconds) for path, seconds in saved if path.exists()]
+
+    def _task(self, task_id: str) -> Dict[str, Any]:
+        # 投入を記録する前に落ちた場合などに備え、未知の ID も受け付ける
+        return self.data["tasks"].setdefault(
+            task_id, dict(status=TASK_SUBMITTED, saved={})
+        )
+
+    @staticmethod
+    def _update_done(task: Dict[str, Any]) -> None:
+        urls = task.get("urls")
+        if urls and set(urls) <= task["saved"].keys():
+            task["status"] = TASK_DONE
+
+    def _save(self, create: bool = False) -> None:
+        """
+        一時ファイルに書いてから置き換える
+
+        出力ディレクトリは start でのみ作る。store_assets が出力ディレクトリごと
+        削除した後は何もしない（ジャーナルがなければ再開の対象にならない）。
+        """
+        self.data["updated_at"] = _now()
+        if create:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        elif not self.path.parent.is_dir():
+            return
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(
+            json.dumps(self.data, ensure_ascii=False, indent=2, default=str),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.path)
+
+
+def find_unfinished_runs(
+    base_dir: Path, exclude: Collection[Path] = ()
+) -> List[RunJournal]:
+    """
+    base_dir 直下の出力ディレクトリから、終わっていない実行のジャーナルを古い順に探す
+
+    exclude（これから実行する出力ディレクトリ）と、ワーカーが管理している実行
+    （ジョブキューが再試行する）は対象にしない。
+    """
+    excluded = {Path(path).resolve() for path in exclude}
+    journals = []
+    for path in sorted(Path(base_dir).glob(f"*/{JOURNAL_FILENAME}")):
+        if path.parent.resolve() in excluded:
+            continue
+        journal = RunJournal(path)
+        if journal.owner != OWNER_WORKER and journal.is_unfinished():
+            journals.append(journal)
+    return journals
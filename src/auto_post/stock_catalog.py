@@ -0,0 +1,355 @@
+"""
+stock_catalog.py
+----------------
+STOCK_AUDIO_BASE_DIR 配下の音源ストックを SQLite のカタログで管理するモジュール。
+
+毎回ストックを glob して 1 曲ずつ長さを調べる代わりに、
+パス・サイズ・更新時刻・ハッシュ・長さ・サンプルレート・ラウドネス・
+Lo-Fiタイプ・追加日時・使用回数をカタログに記録しておく。
+
+・refresh はサイズと更新時刻を比較し、変わったファイルだけを再解析する
+  （解析できなくなったファイルはカタログから削除する）
+・rebuild はカタログを作り直す
+・verify はハッシュを再計算してカタログと実ファイルの差異を報告する
+
+Usage
+-----
+python -m src.auto_post.stock_catalog refresh [--type sad] [--loudness]
+python -m src.auto_post.stock_catalog rebuild
+python -m src.auto_post.stock_catalog verify
+python -m src.auto_post.stock_catalog list --type sad
+"""
+
+import argparse
+import hashlib
+import logging
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from pydub import AudioSegment
+
+from .config import Config
+from .mp3_probe import Mp3ProbeError, probe_mp3
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# ハッシュ計算時に一度に読むバイト数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    lofi_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    duration REAL NOT NULL,
+    sample_rate INTEGER,
+    loudness REAL,
+    date_added TEXT NOT NULL,
+    times_used INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_type ON tracks (lofi_type);
+"""
+
+
+class StockTrack(NamedTuple):
+    """カタログに登録されたストック曲"""
+
+    path: Path
+    lofi_type: str
+    duration: float
+    sample_rate: Optional[int]
+    loudness: Optional[float]
+    times_used: int
+
+
+def file_hash(path: Path) -> str:
+    """ファイル内容の SHA-256 を返す"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def measure_loudness(path: Path) -> Optional[float]:
+    """曲全体のラウドネス (dBFS) をデコードして測る"""
+    try:
+        return float(AudioSegment.from_mp3(str(path)).dBFS)
+    except Exception as e:
+        logger.warning(f"==> ラウドネスを測定できません ({path.name}): {e}")
+        return None
+
+
+class StockCatalog:
+    """音源ストックのカタログ（SQLite）"""
+
+    def __init__(self, db_path: Optional[Path] = None, base_dir: Optional[Path] = None):
+        """
+        Args:
+            db_path: カタログのパス（未指定時は Config.STOCK_CATALOG_PATH）
+            base_dir: ストックのルート（未指定時は Config.STOCK_AUDIO_BASE_DIR）
+        """
+        self.base_dir = Path(base_dir or Config.STOCK_AUDIO_BASE_DIR)
+        self.db_path = Path(db_path or Config.STOCK_CATALOG_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """カタログを閉じる"""
+        self.conn.close()
+
+    def __enter__(self) -> "StockCatalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+    def _type_dirs(self, lofi_type: Optional[str]) -> List[Path]:
+        if lofi_type:
+            return [self.base_dir / lofi_type]
+        if not self.base_dir.exists():
+            return []
+        return sorted(d for d in self.base_dir.iterdir() if d.is_dir())
+
+    def _analyse(self, path: Path) -> Optional[Dict]:
+        """1 ファイルを解析してカタログ用の値を返す"""
+        try:
+            info = probe_mp3(path)
+            duration, sample_rate = info.duration, info.sample_rate
+        except Mp3ProbeError:
+            # ヘッダを解析できないファイルは一度だけデコードする
+            try:
+                audio = AudioSegment.from_mp3(str(path))
+            except Exception as e:
+                logger.warning(
+                    f"==> 解析できないファイルをスキップします: {path} ({e})"
+                )
+                return None
+            duration, sample_rate = len(audio) / 1000, audio.frame_rate
+        return dict(
+            content_hash=file_hash(path),
+            duration=duration,
+            sample_rate=sample_rate,
+        )
+
+    def refresh(
+        self, lofi_type: Optional[str] = None, with_loudness: bool = False
+    ) -> Dict[str, int]:
+        """
+        ストックとカタログを同期する（サイズ・更新時刻が変わったファイルのみ再解析）
+
+        Args:
+            lofi_type: 対象の Lo-Fi タイプ（未指定時は全タイプ）
+            with_loudness: ラウドネス未測定の曲を測定するかどうか
+
+        Returns:
+            Dict[str, int]: added / updated / removed / unchanged の件数
+        """
+        stats = dict(added=0, updated=0, removed=0, unchanged=0)
+        now = datetime.now().isoformat(timespec="seconds")
+
+        for type_dir in self._type_dirs(lofi_type):
+            type_name = type_dir.name
+            known = {
+                row[0]: (row[1], row[2])
+                for row in self.conn.execute(
+                    "SELECT path, size, mtime FROM tracks WHERE lofi_type = ?",
+                    (type_name,),
+                )
+            }
+            seen = set()
+
+            for file in sorted(type_dir.glob("*.mp3")) if type_dir.exists() else []:
+                rel = file.relative_to(self.base_dir).as_posix()
+                stat = file.stat()
+                if known.get(rel) == (stat.st_size, stat.st_mtime):
+                    seen.add(rel)
+                    stats["unchanged"] += 1
+                    continue
+
+                values = self._analyse(file)
+                if values is None:
+                    # seen に加えないため、登録済みの行は古い長さのまま残さず削除される
+                    continue
+                seen.add(rel)
+                if rel in known:
+                    self.conn.execute(
+                        "UPDATE tracks SET size = ?, mtime = ?, content_hash = ?, "
+                        "duration = ?, sample_rate = ?, loudness = NULL "
+                        "WHERE path = ?",
+                        (
+                            stat.st_size,
+                            stat.st_mtime,
+                            values["content_hash"],
+                            values["duration"],
+                            values["sample_rate"],
+                            rel,
+                        ),
+                    )
+                    stats["updated"] += 1
+                else:
+                    self.conn.execute(
+                        "INSERT INTO tracks (path, lofi_type, size, mtime, "
+                        "content_hash, duration, sample_rate, date_added) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            rel,
+                            type_name,
+                            stat.st_size,
+                            stat.st_mtime,
+                            values["content_hash"],
+                            values["duration"],
+                            values["sample_rate"],
+                            now,
+                        ),
+                    )
+                    stats["added"] += 1
+
+            removed = [rel for rel in known if rel not in seen]
+            self.conn.executemany(
+                "DELETE FROM tracks WHERE path = ?", [(rel,) for rel in removed]
+            )
+            stats["removed"] += len(removed)
+
+        if with_loudness:
+            self._fill_loudness(lofi_type)
+        self.conn.commit()
+
+        logger.info(
+            "==> カタログ更新: 追加 {added} / 更新 {updated} / 削除 {removed} / "
+            "変更なし {unchanged}".format(**stats)
+        )
+        return stats
+
+    def _fill_loudness(self, lofi_type: Optional[str]) -> None:
+        """ラウドネス未測定の曲を測定する"""
+        query = "SELECT path FROM tracks WHERE loudness IS NULL"
+        params: tuple = ()
+        if lofi_type:
+            query += " AND lofi_type = ?"
+            params = (lofi_type,)
+        for (rel,) in self.conn.execute(query, params).fetchall():
+            loudness = measure_loudness(self.base_dir / rel)
+            if loudness is not None:
+                self.conn.execute(
+                    "UPDATE tracks SET loudness = ? WHERE path = ?", (loudness, rel)
+                )
+
+    def rebuild(self, with_loudness: bool = False) -> Dict[str, int]:
+        """カタログを空にして作り直す（使用回数と追加日時もリセットされる）"""
+        self.conn.execute("DELETE FROM tracks")
+        self.conn.commit()
+        return self.refresh(with_loudness=with_loudness)
+
+    # ------------------------------------------------------------------
+    # 参照
+    # ------------------------------------------------------------------
+    def tracks(self, lofi_type: str) -> List[StockTrack]:
+        """指定タイプのストック曲を返す（ファイルには触れない）"""
+        rows = self.conn.execute(
+            "SELECT path, lofi_type, duration, sample_rate, loudness, times_used "
+            "FROM tracks WHERE lofi_type = ? ORDER BY path",
+            (lofi_type,),
+        )
+        return [StockTrack(self.base_dir / row[0], *row[1:]) for row in rows.fetchall()]
+
+    def mark_used(self, paths: Iterable[Path]) -> None:
+        """選択された曲の使用回数を 1 増やす"""
+        rels = []
+        for path in paths:
+            try:
+                rels.append((Path(path).relative_to(self.base_dir).as_posix(),))
+            except ValueError:
+                continue
+        self.conn.executemany(
+            "UPDATE tracks SET times_used = times_used + 1 WHERE path = ?", rels
+        )
+        self.conn.commit()
+
+    def verify(self) -> List[str]:
+        """
+        カタログと実ファイルを突き合わせ、問題点の一覧を返す
+
+        ハッシュを再計算するため、ストック全体を読み込む。
+        """
+        problems = []
+        rows = self.conn.execute(
+            "SELECT path, size, content_hash FROM tracks ORDER BY path"
+        ).fetchall()
+        cataloged = set()
+        for rel, size, content_hash in rows:
+            cataloged.add(rel)
+            file = self.base_dir / rel
+            if not file.exists():
+                problems.append(f"missing: {rel}")
+            elif file.stat().st_size != size:
+                problems.append(f"size mismatch: {rel}")
+            elif file_hash(file) != content_hash:
+                problems.append(f"hash mismatch: {rel}")
+
+        for type_dir in self._type_dirs(None):
+            for file in sorted(type_dir.glob("*.mp3")):
+                rel = file.relative_to(self.base_dir).as_posix()
+                if rel not in cataloged:
+                    problems.append(f"not cataloged: {rel}")
+        return problems
+
+
+# --------------------------------------------------------------
+# コマンドラインインターフェース
+# --------------------------------------------------------------
+def main() -> None:
+    """コマンドライン実行用のメイン関数"""
+    parser = argparse.ArgumentParser(description="音源ストックのカタログ管理")
+    parser.add_argument(
+        "command", choices=["refresh", "rebuild", "verify", "list"], help="実行する操作"
+    )
+    parser.add_argument("--type", dest="lofi_type", help="対象の Lo-Fi タイプ")
+    parser.add_argument(
+        "--loudness", action="store_true", help="ラウドネス未測定の曲を測定する"
+    )
+    parser.add_argument("--db", help="カタログのパス（未指定時は STOCK_CATALOG_PATH）")
+    parser.add_argument(
+        "--base-dir", help="ストックのルート（未指定時は STOCK_AUDIO_BASE_DIR）"
+    )
+    args = parser.parse_args()
+
+    db_path = Path(args.db) if args.db else None
+    base_dir = Path(args.base_dir) if args.base_dir else None
+    with StockCatalog(db_path=db_path, base_dir=base_dir) as catalog:
+        if args.command == "refresh":
+            catalog.refresh(lofi_type=args.lofi_type, with_loudness=args.loudness)
+        elif args.command == "rebuild":
+            catalog.rebuild(with_loudness=args.loudness)
+        elif args.command == "verify":
+            problems = catalog.verify()
+            for problem in problems:
+                logger.error(f"==> {problem}")
+            if problems:
+                sys.exit(1)
+            logger.info("==> カタログとストックは一致しています")
+        else:
+            if not args.lofi_type:
+                parser.error("list には --type が必要です")
+            for track in catalog.tracks(args.lofi_type):
+                logger.info(
+                    f"{track.duration:8.1f}s  used={track.times_used}  {track.path}"
+                )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    main()
@@ -0,0 +1,256 @@
+"""
+task_poller.py
+--------------
+非同期 API のタスク完了を 1 本のスレッドでまとめてポーリングするモジュール。
+
+・タスク作成からの経過時間が「過去の生成時間の中央値 × INITIAL_DELAY_RATIO」
+  に達するまでは問い合わせない
+・その後は指数バックオフ（ジッター付き）で間隔を広げながら問い合わせる
+・実行中の全タスクを 1 つのループで扱い、次に問い合わせるべきタスクから順に処理する
+・タイムアウトは問い合わせ前に判定し、最後の問い合わせは締め切り時刻に行う
+・完了までの時間と問い合わせ回数をヒストグラムとして記録し、次回の初期待ち時間に使う
+"""
+
+import json
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# 初回問い合わせまでの待ち時間 = 生成時間の中央値 × この比率
+INITIAL_DELAY_RATIO = 0.8
+
+# バックオフの初期間隔・倍率・上限（秒）とジッターの幅（±割合）
+MIN_POLL_INTERVAL = 3.0
+BACKOFF_FACTOR = 1.5
+MAX_POLL_INTERVAL = 30.0
+JITTER = 0.2
+
+# 記録しておく生成時間のサンプル数とヒストグラムの刻み（秒）
+MAX_SAMPLES = 100
+HISTOGRAM_BUCKET_SEC = 30
+
+
+class PollStats:
+    """タスクの生成時間と問い合わせ回数の記録"""
+
+    def __init__(self, path: Optional[Path] = None):
+        """
+        Args:
+            path: 記録を保存する JSON ファイル（None ならメモリ上のみ）
+        """
+        self.path = Path(path) if path else None
+        self.samples: deque = deque(maxlen=MAX_SAMPLES)
+        self.histogram: Dict[str, int] = {}
+        self.polls: Dict[str, int] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.samples.extend(float(s) for s in data.get("samples", []))
+            self.histogram.update(data.get("histogram", {}))
+            self.polls.update(data.get("polls", {}))
+        except (OSError, ValueError) as e:
+            logger.warning(f"==> ポーリング統計を読み込めません: {e}")
+
+    def save(self) -> None:
+        """
+        記録をファイルに保存する
+
+        一時ファイルに書いてから置き換えるため、書き込み中に強制終了しても
+        直前の記録が壊れない（複数のプロセスが同時に保存しても混ざらない）。
+        """
+        if not self.path:
+            return
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            data = {
+                "samples": list(self.samples),
+                "histogram": self.histogram,
+                "polls": self.polls,
+            }
+            tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"==> ポーリング統計を保存できません: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def record(self, generation_sec: float, polls: int) -> None:
+        """1 タスク分の生成時間と問い合わせ回数を記録する"""
+        self.samples.append(round(generation_sec, 1))
+        bucket = int(generation_sec // HISTOGRAM_BUCKET_SEC) * HISTOGRAM_BUCKET_SEC
+        key = f"{bucket}-{bucket + HISTOGRAM_BUCKET_SEC}s"
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+        self.polls[str(polls)] = self.polls.get(str(polls), 0) + 1
+
+    def median(self) -> Optional[float]:
+        """生成時間の中央値（記録がなければ None）"""
+        return statistics.median(self.samples) if self.samples else None
+
+    def initial_delay(self) -> float:
+        """タスク作成から初回問い合わせまでの待ち時間（秒）"""
+        median = self.median()
+        return median * INITIAL_DELAY_RATIO if median else 0.0
+
+
+class _PolledTask:
+    """ポーリング中のタスク 1 件分の状態"""
+
+    __slots__ = (
+        "task_id",
+        "future",
+        "started",
+        "timeout",
+        "deadline",
+        "next_poll",
+        "polls",
+    )
+
+    def __init__(self, task_id, future, started, timeout, next_poll):
+        self.task_id = task_id
+        self.future = future
+        # タスク作成時刻（monotonic）。不明な場合は None で、生成時間を記録しない
+        self.started = started
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.next_poll = min(next_poll, self.deadline)
+        self.polls = 0
+
+
+class TaskPoller:
+    """
+    実行中の全タスクを 1 本のスレッドでポーリングする
+
+    fetch(task_id) は完了時にタスクのデータ、実行中なら None を返し、
+    失敗時は例外を送出する。
+    """
+
+    def __init__(
+        self, fetch: Callable[[str], Optional[dict]], stats: Optional[PollStats] = None
+    ):
+        self.fetch = fetch
+        self.stats = stats or PollStats()
+        self._tasks: Dict[str, _PolledTask] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(
+        self, task_id: str, timeout: float, submitted_at: Optional[float] = None
+    ) -> Future:
+        """
+        タスクをポーリング対象に加え、完了時に結果が入る Future を返す
+
+        Args:
+            task_id: タスク ID
+            timeout: この呼び出しからの待ち時間の上限（秒）
+            submitted_at: タスクを作成した時刻（time.time()）。指定すると
+                過去の生成時間をもとに初回の問い合わせを遅らせる
+
+        同じタスクがすでにポーリング中の場合は、その Future を返す。
+        """
+        now = time.monotonic()
+        started, delay = None, 0.0
+        if submitted_at is not None:
+            elapsed = max(0.0, time.time() - submitted_at)
+            started = now - elapsed
+            delay = _jittered(max(0.0, self.stats.initial_delay() - elapsed))
+
+        future: Future = Future()
+        task = _PolledTask(task_id, future, started, timeout, now + delay)
+        with self._cond:
+            pending = self._tasks.get(task_id)
+            if pending is not None:
+                return pending.future
+            self._tasks[task_id] = task
+            self._ensure_thread()
+            self._cond.notify()
+        return future
+
+    def wait(
+        self, task_id: str, timeout: float, submitted_at: Optional[float] = None
+    ) -> dict:
+        """submit して完了まで待つ"""
+        return self.submit(task_id, timeout, submitted_at).result()
+
+    # ------------------------------------------------------------------
+    # ポーリングループ
+    # ------------------------------------------------------------------
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="task-poller", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+                task = min(self._tasks.values(), key=lambda t: t.next_poll)
+                remaining = task.next_poll - time.monotonic()
+                if remaining > 0:
+                    # 待っている間に新しいタスクが来たら選び直す
+                    self._cond.wait(remaining)
+                    continue
+            self._poll(task)
+
+    def _poll(self, task: _PolledTask) -> None:
+        task.polls += 1
+        try:
+            data = self.fetch(task.task_id)
+        except Exception as e:
+            self._finish(task, error=e)
+            return
+
+        now = time.monotonic()
+        if data is not None:
+            if task.started is not None:
+                generation_sec = now - task.started
+                self.stats.record(generation_sec, task.polls)
+                self.stats.save()
+                logger.info(
+                    f"⏱️  {task.task_id}: {generation_sec:.0f}s, {task.polls} poll(s)"
+                )
+            self._finish(task, result=data)
+            return
+
+        if now >= task.deadline:
+            message = f"Task did not complete within {task.timeout} seconds"
+            self._finish(task, error=TimeoutError(message))
+            return
+
+        interval = _jittered(
+            min(
+                MAX_POLL_INTERVAL,
+                MIN_POLL_INTERVAL * BACKOFF_FACTOR ** (task.polls - 1),
+            )
+        )
+        with self._cond:
+            task.next_poll = min(now + interval, task.deadline)
+
+    def _finish(self, task: _PolledTask, result=None, error=None) -> None:
+        with self._cond:
+            self._tasks.pop(task.task_id, None)
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(result)
+
+
+def _jittered(seconds: float) -> float:
+    """±JITTER の揺らぎを加える"""
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
@@ -5,14 +5,16 @@ import logging
 import os
 import random
 import re
+import threading
 from pathlib import Path
+from typing import Dict
 
-import requests
 import torch
 from diffusers import DiffusionPipeline
 from dotenv import load_dotenv
 from PIL import Image, ImageDraw, ImageEnhance, ImageFont
 
+from . import http_client
 from .config import Config
 
 # Logger
@@ -44,6 +46,11 @@ os.makedirs(output_dir, exist_ok=True)
 
 jsonl_path = Config.JSONL_PATH
 
+# keep_model=True の場合に再利用する、読み込み済みのモデル（デバイスごと）
+_pipelines: Dict[str, DiffusionPipeline] = {}
+# 読み込みと生成を直列化する（同じモデルを複数のスレッドから同時に使わない）
+_pipeline_lock = threading.Lock()
+
 
 def load_random_prompt(jsonl_file):
     with open(jsonl_file, "r", encoding="utf-8") as f:
@@ -64,7 +71,7 @@ def ensure_font() -> str:
     if Path(LOBSTER_FONT_PATH).exists():
         return str(LOBSTER_FONT_PATH)
 
-    resp = requests.get(LOBSTER_FONT_URL, timeout=30)
+    resp = http_client.get(LOBSTER_FONT_URL, timeout=30)
     resp.raise_for_status()
     f = open(str(LOBSTER_FONT_PATH), "wb")
     try:
@@ -165,8 +172,46 @@ def main():
     )
 
 
+def load_pipeline(device: str) -> DiffusionPipeline:
+    """Stable Diffusion 3.5 Large を読み込む"""
+    logger.info("==> Loading Stable Diffusion 3.5 Large model...")
+    return DiffusionPipeline.from_pretrained(
+        "stabilityai/stable-diffusion-3.5-large",
+        use_auth_token=os.getenv("HUGGINGFACE_TOKEN"),
+        torch_dtype=torch.float16 if device != "cpu" else torch.float32,
+    ).to(device)
+
+
+def generate_image(prompt: str, device: str, keep_model: bool = False):
+    """
+    サムネイルの背景画像を生成する
+
+    keep_model=True なら読み込んだモデルをプロセス内に残し、次回以降も使う
+    （バッチ実行やワーカーで複数の動画を作る場合に読み込みを 1 回で済ませる）。
+    """
+    if not keep_model:
+        pipe = load_pipeline(device)
+        return pipe(
+            prompt, guidance_scale=7.5, height=THUMB_HEIGHT, width=THUMB_WIDTH
+        ).images[0]
+
+    with _pipeline_lock:
+        pipe = _pipelines.get(device)
+        if pipe is None:
+            pipe = _pipelines[device] = load_pipeline(device)
+        else:
+            logger.info("==> 読み込み済みのモデルを使用します")
+        return pipe(
+            prompt, guidance_scale=7.5, height=THUMB_HEIGHT, width=THUMB_WIDTH
+        ).images[0]
+
+
 def thumbnail_generation(
-    output_dir: str, lofi_type: str, prompt: str, thumb_title: str
+    output_dir: str,
+    lofi_type: str,
+    prompt: str,
+    thumb_title: str,
+    keep_model: bool = False,
 ) -> tuple[str, str]:
     # デバイス設定
     device = (
@@ -176,19 +221,9 @@ def thumbnail_generation(
     )
     logger.info(f"==> Using device: {device}")
 
-    # モデルロード
-    logger.info("==> Loading Stable Diffusion 3.5 Large model...")
-    pipe = DiffusionPipeline.from_pretrained(
-        "stabilityai/stable-diffusion-3.5-large",
-        use_auth_token=os.getenv("HUGGINGFACE_TOKEN"),
-        torch_dtype=torch.float16 if device != "cpu" else torch.float32,
-    ).to(device)
-
     # 画像生成
     # Generate at YouTube thumbnail resolution
-    image = pipe(
-        prompt, guidance_scale=7.5, height=THUMB_HEIGHT, width=THUMB_WIDTH
-    ).images[0]
+    image = generate_image(prompt, device, keep_model)
 
     import datetime
 
@@ -0,0 +1,142 @@
+"""
+track_selection.py
+------------------
+目標の長さにちょうど収まる曲の組み合わせを選ぶモジュール。
+
+曲の長さを 100ms 単位のバケットに丸め、部分和問題を動的計画法で解く。
+到達可能な合計時間の表は目標バケット数＋最長曲の長さで打ち切るため、
+ストックが 1 万曲あっても 1 秒かからない。
+
+・combine_audio のクロスフェードで曲の繋ぎ目ごとに fade 秒短くなる分を差し引く
+・目標との差が許容誤差以内の組み合わせのうち、最も目標に近いものを選ぶ
+・同じ長さを作れる組み合わせが複数ある場合は、シード付きの乱数で曲順を
+  シャッフルしてから解くことで毎回違う曲が選ばれる
+・優先度（ストックの使用回数など）を渡すと、優先度の小さい曲から順に解くため
+  同じ長さを作れるなら使われていない曲が選ばれる
+"""
+
+import logging
+import random
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# 長さを丸める単位（秒）
+BUCKET_SEC = 0.1
+
+# combine_audio の既定のクロスフェード長（秒）
+DEFAULT_FADE_SEC = 3.0
+
+# 目標時間との許容誤差（秒）
+DEFAULT_TOLERANCE_SEC = 5.0
+
+
+def _effective_duration(duration: float, fade_sec: float) -> float:
+    """クロスフェードで重なる分を除いた、1 曲あたりの実質的な長さ"""
+    return duration - fade_sec if duration > fade_sec else duration
+
+
+def mixed_duration(
+    durations: Sequence[float], fade_sec: float = DEFAULT_FADE_SEC, joined=False
+) -> float:
+    """
+    曲をクロスフェードで繋いだときの合計時間（秒）
+
+    Args:
+        durations: 各曲の長さ（秒）
+        fade_sec: クロスフェード長（秒）
+        joined: 既にある曲の後ろに繋ぐ場合 True（先頭の曲も重なる）
+    """
+    if not durations:
+        return 0.0
+    total = sum(_effective_duration(d, fade_sec) for d in durations)
+    return total if joined else total + fade_sec
+
+
+def select_tracks(
+    durations: Sequence[float],
+    target_sec: float,
+    fade_sec: float = DEFAULT_FADE_SEC,
+    tolerance_sec: float = DEFAULT_TOLERANCE_SEC,
+    seed: Optional[int] = None,
+    joined: bool = False,
+    priorities: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """
+    クロスフェード後の合計が目標時間に最も近くなる曲の組み合わせを選ぶ
+
+    許容誤差以内の組み合わせがない場合は、目標を超える中で最短の組み合わせ、
+    それもなければ（ストックが足りなければ）全曲を返す。
+
+    Args:
+        durations: 各曲の長さ（秒）
+        target_sec: 目標時間（秒）
+        fade_sec: クロスフェード長（秒）
+        tolerance_sec: 目標時間との許容誤差（秒）
+        seed: 曲順をシャッフルする乱数のシード（None なら毎回ランダム）
+        joined: 既にある曲の後ろに繋ぐ場合 True（先頭の曲も重なる）
+        priorities: 各曲の優先度（小さいほど優先。同じ優先度の中ではシャッフルする）
+
+    Returns:
+        List[int]: 選ばれた曲のインデックス
+    """
+    rng = random.Random(seed)
+    weights = np.array(
+        [round(_effective_duration(d, fade_sec) / BUCKET_SEC) for d in durations],
+        dtype=np.int64,
+    )
+    # 単独の曲は重ならないので、最初の 1 曲分のフェードは目標に足し戻す
+    offset = 0.0 if joined else fade_sec
+    target = max(1, round((target_sec - offset) / BUCKET_SEC))
+    if target_sec <= 0 or not len(weights) or weights.max() <= 0:
+        return []
+
+    order = list(range(len(weights)))
+    rng.shuffle(order)
+    if priorities is not None:
+        # 先に到達した曲が選ばれるため、優先度の小さい曲から解く（安定ソート）
+        order.sort(key=lambda i: priorities[i])
+
+    # reach[s]: 合計 s バケットを作れるか / parent[s]: s に最初に到達した曲
+    size = target + int(weights.max()) + 1
+    reach = np.zeros(size, dtype=bool)
+    parent = np.full(size, -1, dtype=np.int64)
+    reach[0] = True
+    highest = 0
+
+    for i in order:
+        w = int(weights[i])
+        if w <= 0:
+            continue
+        top = min(highest, size - 1 - w)
+        new = np.flatnonzero(reach[: top + 1] & ~reach[w : w + top + 1]) + w
+        if new.size:
+            reach[new] = True
+            parent[new] = i
+            highest = max(highest, int(new[-1]))
+        if reach[target]:
+            break
+
+    tolerance = round(tolerance_sec / BUCKET_SEC)
+    reachable = np.flatnonzero(reach)
+    within = reachable[np.abs(reachable - target) <= tolerance]
+    if within.size:
+        # 目標に最も近いもの。同じ差なら目標を超える方を優先する
+        best = min(within.tolist(), key=lambda s: (abs(s - target), s < target))
+    else:
+        above = reachable[reachable >= target]
+        best = int(above[0]) if above.size else int(reachable[-1])
+        logger.warning(
+            f"==> 許容誤差 {tolerance_sec}秒 以内の組み合わせがありません "
+            f"(目標 {target * BUCKET_SEC:.1f}秒 → {best * BUCKET_SEC:.1f}秒)"
+        )
+
+    selected = []
+    while best > 0:
+        i = int(parent[best])
+        selected.append(i)
+        best -= int(weights[i])
+    return selected
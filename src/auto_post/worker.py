@@ -0,0 +1,430 @@
+"""
+worker.py
+---------
+ジョブキュー（SQLite）から動画の作成ジョブを取り出して実行し続けるワーカー。
+
+cron で毎回 auto_lofi_post を起動すると、そのたびに Python・torch・diffusers・
+moviepy の読み込みと拡散モデルのロードが発生する。ワーカーは一度だけ起動して
+これらを読み込んだまま待機し、キューに登録されたジョブを最大 concurrency 本
+同時に実行する（エンコード・画像生成の枠はバッチ実行と同じく全ジョブで共有）。
+
+・ジョブは auto_lofi_post の引数として登録する。--output_dir を指定しなければ
+  <日付>_job<ID> を使い、再試行しても同じ出力ディレクトリで続きから実行する
+  （run_journal / pipeline のマニフェストを参照）
+・ワーカーが強制終了して running のまま残ったジョブは、次の起動時にキューへ戻す
+  （RUN_RESUME_MAX_ATTEMPTS 回実行したジョブは失敗にする）
+・SIGTERM / SIGINT を受けたら新しいジョブは取り出さず、実行中のジョブの終了を待つ
+
+Usage
+-----
+python -m src.auto_post.worker serve [--concurrency 2] [--drain]
+python -m src.auto_post.worker enqueue -- --lofi_type sad --privacy private
+python -m src.auto_post.worker list [--status failed]
+python -m src.auto_post.worker cancel 3
+python -m src.auto_post.worker retry 3
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence
+
+from .auto_lofi_post import LofiPostGenerator, parse_args, shared_budget
+from .config import Config
+from .run_journal import OWNER_WORKER, pid_alive
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    argv TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output_dir TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    worker TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+"""
+
+_COLUMNS = "id, argv, status, output_dir, attempts, error, worker, created_at"
+
+
+class Job(NamedTuple):
+    """キューに登録されたジョブ"""
+
+    id: int
+    argv: List[str]  # auto_lofi_post の引数
+    status: str
+    output_dir: Optional[str]
+    attempts: int
+    error: Optional[str]
+    worker: Optional[str]  # 実行中のワーカー（ホスト名:PID）
+    created_at: str
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _job(row) -> Job:
+    return Job(row[0], json.loads(row[1]), *row[2:])
+
+
+class JobQueue:
+    """ジョブキュー（SQLite）"""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        """
+        Args:
+            db_path: キューのパス（未指定時は Config.WORKER_QUEUE_PATH）
+        """
+        self.db_path = Path(db_path or Config.WORKER_QUEUE_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 別プロセス（enqueue など）と同時に使うため、トランザクションは明示する
+        self.conn = sqlite3.connect(
+            str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """キューを閉じる"""
+        self.conn.close()
+
+    def __enter__(self) -> "JobQueue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _execute(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self.conn.execute(sql, params)
+
+    # ------------------------------------------------------------------
+    # 登録・参照
+    # ------------------------------------------------------------------
+    def enqueue(self, argv: Sequence[str]) -> int:
+        """ジョブを登録し、ID を返す"""
+        cursor = self._execute(
+            "INSERT INTO jobs (argv, status, created_at) VALUES (?, ?, ?)",
+            (json.dumps(list(argv)), QUEUED, _now()),
+        )
+        return cursor.lastrowid
+
+    def get(self, job_id: int) -> Optional[Job]:
+        row = self._execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return _job(row) if row else None
+
+    def jobs(self, status: Optional[str] = None) -> List[Job]:
+        """登録順のジョブ一覧（status を指定するとその状態のものだけ）"""
+        if status:
+            rows = self._execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE status = ? ORDER BY id", (status,)
+            )
+        else:
+            rows = self._execute(f"SELECT {_COLUMNS} FROM jobs ORDER BY id")
+        return [_job(row) for row in rows.fetchall()]
+
+    def cancel(self, job_id: int) -> bool:
+        """待機中のジョブを取り消す（実行中のジョブは取り消せない）"""
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, _now(), job_id, QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    def retry(self, job_id: int) -> bool:
+        """
+        失敗・取り消したジョブをキューに戻す（同じ出力ディレクトリで続きから実行する）
+
+        実行回数は 0 に戻し、もう一度 RUN_RESUME_MAX_ATTEMPTS 回まで実行できるようにする。
+        """
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, error = NULL, finished_at = NULL, "
+            "attempts = 0 WHERE id = ? AND status IN (?, ?)",
+            (QUEUED, job_id, FAILED, CANCELLED),
+        )
+        return cursor.rowcount == 1
+
+    # ------------------------------------------------------------------
+    # ワーカー
+    # ------------------------------------------------------------------
+    def claim(self, worker: str) -> Optional[Job]:
+        """最も古い待機中のジョブを実行中にして返す（なければ None）"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                    (QUEUED,),
+                ).fetchone()
+                if row is None:
+                    return None
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, worker, _now(), row[0]),
+                )
+            finally:
+                self.conn.execute("COMMIT")
+        return self.get(row[0])
+
+    def set_output_dir(self, job_id: int, output_dir: str) -> None:
+        self._execute(
+            "UPDATE jobs SET output_dir = ? WHERE id = ?", (output_dir, job_id)
+        )
+
+    def finish(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, error, _now(), job_id),
+        )
+
+    def requeue_stale(self, max_attempts: Optional[int] = None) -> List[int]:
+        """
+        このホストで強制終了したワーカーが running のまま残したジョブをキューに戻す
+
+        毎回プロセスごと落とすジョブ（エンコードや画像生成でのメモリ不足など）が
+        キューを塞ぎ続けないよう、max_attempts 回実行したジョブは失敗にする。
+
+        Args:
+            max_attempts: 実行回数の上限（未指定時は Config.RUN_RESUME_MAX_ATTEMPTS）
+
+        Returns:
+            list: キューに戻したジョブの ID
+        """
+        max_attempts = max_attempts or Config.RUN_RESUME_MAX_ATTEMPTS
+        host = socket.gethostname()
+        requeued = []
+        for job in self.jobs(RUNNING):
+            worker_host, _, pid = (job.worker or "").rpartition(":")
+            if worker_host != host or not pid.isdigit() or pid_alive(int(pid)):
+                continue
+            if job.attempts >= max_attempts:
+                logger.warning(
+                    f"==> {job.attempts} 回中断したジョブを失敗にします: {job.id}"
+                )
+                self.finish(job.id, FAILED, f"ワーカーが {job.attempts} 回中断しました")
+                continue
+            self._execute(
+                "UPDATE jobs SET status = ? WHERE id = ? AND status = ?",
+                (QUEUED, job.id, RUNNING),
+            )
+            requeued.append(job.id)
+        return requeued
+
+
+def job_args(job: Job) -> argparse.Namespace:
+    """
+    ジョブの引数を auto_lofi_post の引数にする
+
+    --output_dir を指定していないジョブは <日付>_job<ID> を使い、
+    一度決めた出力ディレクトリは再試行しても変えない。中断したジョブは
+    ジョブキューが再試行するため、CLI の --resume の対象にはしない。
+    """
+    args = parse_args(job.argv)
+    if job.output_dir:
+        args.output_dir = job.output_dir
+    elif "--output_dir" not in job.argv:
+        args.output_dir = f"{datetime.now().strftime('%Y%m%d')}_job{job.id}"
+    args.keep_warm = True
+    args.run_owner = OWNER_WORKER
+    return args
+
+
+class Worker:
+    """キューからジョブを取り出して実行し続けるワーカー"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        concurrency: int = Config.WORKER_CONCURRENCY,
+        poll_sec: float = Config.WORKER_POLL_SEC,
+    ):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.poll_sec = poll_sec
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        # 全てのジョブで共有するエンコード・画像生成の枠
+        self.budget = shared_budget()
+        self._stop = threading.Event()
+
+    def stop(self, *_) -> None:
+        """新しいジョブの取り出しをやめる（シグナルハンドラとしても使う）"""
+        if not self._stop.is_set():
+            logger.info("==> 停止します。実行中のジョブの終了を待っています...")
+        self._stop.set()
+
+    def run_job(self, job: Job) -> bool:
+        """1 つのジョブを実行し、結果をキューに記録する"""
+        try:
+            args = job_args(job)
+            self.queue.set_output_dir(job.id, args.output_dir)
+            logger.info(f"==> ジョブ {job.id} を開始します: {args.output_dir}")
+            LofiPostGenerator(args, self.budget).run()
+        except SystemExit as e:
+            self.queue.finish(job.id, FAILED, f"exit code {e.code}")
+            logger.error(f"==> ジョブ {job.id} が失敗しました")
+            return False
+        except Exception as e:
+            self.queue.finish(job.id, FAILED, str(e))
+            logger.error(f"==> ジョブ {job.id} が失敗しました: {e}")
+            return False
+        self.queue.finish(job.id, SUCCEEDED)
+        logger.info(f"==> ジョブ {job.id} が完了しました")
+        return True
+
+    def _fill(self, executor, running: dict) -> None:
+        while len(running) < self.concurrency and not self._stop.is_set():
+            job = self.queue.claim(self.name)
+            if job is None:
+                return
+            running[executor.submit(self.run_job, job)] = job
+
+    def serve(self, drain: bool = False) -> None:
+        """
+        キューのジョブを実行し続ける
+
+        Args:
+            drain: キューが空になり、実行中のジョブもなくなったら終了する
+        """
+        stale = self.queue.requeue_stale()
+        if stale:
+            logger.info(f"==> 中断したジョブをキューに戻しました: {stale}")
+        logger.info(
+            f"==> ワーカーを開始します (同時実行数: {self.concurrency}, "
+            f"キュー: {self.queue.db_path})"
+        )
+
+        running: dict = {}
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="job"
+        ) as executor:
+            while not self._stop.is_set():
+                self._fill(executor, running)
+                if not running:
+                    if drain:
+                        break
+                    self._stop.wait(self.poll_sec)
+                    continue
+                # 実行中のジョブの終了を待ちつつ、新しいジョブも定期的に確認する
+                done, _ = wait(
+                    running, timeout=self.poll_sec, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    running.pop(future)
+        logger.info("==> ワーカーを終了しました")
+
+
+# --------------------------------------------------------------
+# コマンドラインインターフェース
+# --------------------------------------------------------------
+def _print_jobs(jobs: List[Job]) -> None:
+    for job in jobs:
+        logger.info(
+            f"{job.id:>5}  {job.status:<9}  attempts={job.attempts}  "
+            f"{job.output_dir or '-'}  {' '.join(job.argv)}"
+            + (f"  error={job.error}" if job.error else "")
+        )
+
+
+def main() -> None:
+    """コマンドライン実行用のメイン関数"""
+    parser = argparse.ArgumentParser(description="動画作成ジョブのワーカーとキュー管理")
+    parser.add_argument("--db", help="キューのパス（未指定時は WORKER_QUEUE_PATH）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="ジョブを実行し続ける")
+    serve.add_argument(
+        "--concurrency",
+        type=int,
+        default=Config.WORKER_CONCURRENCY,
+        help="同時に実行するジョブ数",
+    )
+    serve.add_argument(
+        "--poll_sec",
+        type=float,
+        default=Config.WORKER_POLL_SEC,
+        help="キューを確認する間隔（秒）",
+    )
+    serve.add_argument(
+        "--drain", action="store_true", help="キューが空になったら終了する"
+    )
+
+    enqueue = commands.add_parser(
+        "enqueue", help="ジョブを登録する（-- の後に auto_lofi_post の引数）"
+    )
+    enqueue.add_argument("argv", nargs=argparse.REMAINDER)
+
+    list_parser = commands.add_parser("list", help="ジョブ一覧を表示する")
+    list_parser.add_argument("--status", choices=STATUSES)
+
+    for name, help_text in [
+        ("cancel", "待機中のジョブを取り消す"),
+        ("retry", "失敗・取り消したジョブをキューに戻す"),
+    ]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("job_id", type=int)
+
+    args = parser.parse_args()
+
+    with JobQueue(Path(args.db) if args.db else None) as queue:
+        if args.command == "serve":
+            worker = Worker(queue, args.concurrency, args.poll_sec)
+            signal.signal(signal.SIGTERM, worker.stop)
+            signal.signal(signal.SIGINT, worker.stop)
+            worker.serve(drain=args.drain)
+        elif args.command == "enqueue":
+            argv = args.argv[1:] if args.argv[:1] == ["--"] else args.argv
+            job_argv = parse_args(argv)  # 引数の誤りは登録前に検出する
+            if job_argv.count or job_argv.types:
+                parser.error(
+                    "ジョブは 1 本ずつ登録してください（--count / --types 不可）"
+                )
+            logger.info(f"==> ジョブ {queue.enqueue(argv)} を登録しました")
+        elif args.command == "list":
+            _print_jobs(queue.jobs(args.status))
+        else:
+            action = queue.cancel if args.command == "cancel" else queue.retry
+            if not action(args.job_id):
+                job = queue.get(args.job_id)
+                state = job.status if job else "存在しません"
+                logger.error(
+                    f"==> ジョブ {args.job_id} は {args.command} できません ({state})"
+                )
+                sys.exit(1)
+            logger.info(f"==> ジョブ {args.job_id} を {args.command} しました")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(threadName)s: %(message)s",
+    )
+    main()
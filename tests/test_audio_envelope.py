@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+import time
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import numpy as np
+from moviepy.audio.AudioClip import AudioArrayClip
+
+from auto_post.audio_envelope import (
+    compute_envelope,
+    envelope_cache_path,
+    load_or_compute_envelope,
+)
+from auto_post.create_video import WaveformClip
+
+
+def _ramp_clip(duration=3.0, fps=8000):
+    """音量が 0 → 1 に増えていくステレオのサイン波"""
+    t = np.arange(int(duration * fps)) / fps
+    mono = np.sin(2 * np.pi * 440 * t) * (t / duration)
+    return AudioArrayClip(np.stack([mono, mono], axis=1), fps=fps)
+
+
+class TestAudioEnvelope(unittest.TestCase):
+    """audio_envelopeモジュールの単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.audio_path = self.temp_dir / "combined_audio.mp3"
+        self.audio_path.write_bytes(b"")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_compute_envelope(self):
+        """フレームごとのRMSを正規化したfloat32で返すテスト"""
+        envelope = compute_envelope(_ramp_clip(), fps=24, sample_rate=8000)
+
+        self.assertEqual(envelope.dtype, np.float32)
+        self.assertEqual(envelope.shape, (72,))
+        # 音量は単調に増え、最後はサイン波のRMS（1/√2）付近になる
+        self.assertTrue(np.all(np.diff(envelope[1:]) > 0))
+        self.assertAlmostEqual(float(envelope[-1]), 1 / np.sqrt(2), delta=0.03)
+
+    def test_blocks_match_single_pass(self):
+        """ブロックに分けて読んでも一度に計算した場合と一致するテスト"""
+        clip = _ramp_clip()
+        samples = clip.to_soundarray(fps=8000).mean(axis=1)
+        # 25fps なら 1 フレーム = 320 サンプルで割り切れる
+        frames = samples.reshape(75, -1)
+        expected = np.sqrt(np.mean(frames**2, axis=1)) / np.max(np.abs(samples))
+
+        with unittest.mock.patch("auto_post.audio_envelope.ENVELOPE_BLOCK_SEC", 0.7):
+            envelope = compute_envelope(clip, fps=25, sample_rate=8000)
+
+        np.testing.assert_allclose(envelope, expected, rtol=1e-4, atol=1e-5)
+
+    def test_cache(self):
+        """計算結果を.npyに保存し、次回は読み込むテスト"""
+        clip = _ramp_clip()
+        first = load_or_compute_envelope(self.audio_path, clip, fps=24)
+        cache_path = envelope_cache_path(self.audio_path, 24)
+        self.assertEqual(cache_path.name, "combined_audio.envelope_24fps.npy")
+        self.assertTrue(cache_path.exists())
+
+        with unittest.mock.patch(
+            "auto_post.audio_envelope.compute_envelope"
+        ) as mock_compute:
+            second = load_or_compute_envelope(self.audio_path, clip, fps=24)
+
+        mock_compute.assert_not_called()
+        np.testing.assert_array_equal(first, second)
+
+    def test_stale_cache_is_recomputed(self):
+        """音源の方が新しい場合はキャッシュを使わないテスト"""
+        clip = _ramp_clip()
+        cache_path = envelope_cache_path(self.audio_path, 24)
+        np.save(cache_path, np.zeros(72, dtype=np.float32))
+        time.sleep(0.01)
+        self.audio_path.touch()
+
+        envelope = load_or_compute_envelope(self.audio_path, clip, fps=24)
+
+        self.assertGreater(float(envelope.max()), 0)
+
+    def test_waveform_clip_uses_envelope(self):
+        """WaveformClipが音源全体を読み込まずにエンベロープから描画するテスト"""
+        clip = _ramp_clip()
+        envelope = compute_envelope(clip, fps=24)
+
+        with unittest.mock.patch.object(
+            AudioArrayClip, "to_soundarray", side_effect=AssertionError
+        ):
+            waveform = WaveformClip(clip, 480, 80, fps=24, envelope=envelope)
+            quiet = waveform.make_frame(0.0)
+            loud = waveform.make_frame(2.9)
+
+        self.assertEqual(quiet.shape, (80, 480, 4))
+        self.assertGreater(
+            np.count_nonzero(loud[..., 3]), np.count_nonzero(quiet[..., 3])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -82,7 +82,7 @@ class TestLofiPostGenerator(unittest.TestCase):
         self.assertEqual(self.generator.selected_image_prompt, "")
         self.assertEqual(self.generator.newly_generated_files, [])
 
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_send_slack_notification_success(self, mock_post):
         """Slack通知成功時のテスト"""
         # テスト環境ではSlack通知がスキップされるため、
@@ -96,7 +96,7 @@ class TestLofiPostGenerator(unittest.TestCase):
         # テスト環境ではHTTPリクエストが送信されないことを確認
         mock_post.assert_not_called()
 
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_send_slack_notification_error(self, mock_post):
         """Slack通知失敗時のテスト"""
         mock_post.side_effect = Exception("Network error")
@@ -336,6 +336,62 @@ class TestLofiPostGenerator(unittest.TestCase):
             # 新規生成ファイルがコピーされていることを確認
             self.assertTrue(mock_copy.called)
 
+    @patch("auto_post.auto_lofi_post.AudioSegment")
+    @patch("auto_post.auto_lofi_post.get_mp3_duration")
+    def test_select_music_files_uses_header_probe(self, mock_probe, mock_audio):
+        """ストック選択時はデコードせずヘッダから長さを取得するテスト"""
+        mock_probe.side_effect = [120.0, 180.0, 240.0]
+        stock_files = [Path("a.mp3"), Path("b.mp3"), Path("c.mp3")]
+
+        selected = self.generator._select_music_files(stock_files, 600)
+
+        self.assertEqual(sorted(selected), sorted(stock_files))
+        self.assertEqual(mock_probe.call_count, 3)
+        mock_audio.from_mp3.assert_not_called()
+
+    @patch("auto_post.auto_lofi_post.AudioSegment")
+    @patch("auto_post.auto_lofi_post.get_mp3_duration")
+    def test_get_music_duration_falls_back_to_decode(self, mock_probe, mock_audio):
+        """ヘッダを解析できない場合はデコードして長さを測るテスト"""
+        from auto_post.mp3_probe import Mp3ProbeError
+
+        mock_probe.side_effect = Mp3ProbeError("broken")
+        mock_segment = Mock()
+        mock_segment.__len__ = Mock(return_value=90000)
+        mock_audio.from_mp3.return_value = mock_segment
+
+        duration = self.generator._get_music_duration(Path("broken.mp3"))
+
+        self.assertEqual(duration, 90.0)
+
+    @patch("auto_post.auto_lofi_post.get_mp3_duration")
+    @patch("auto_post.auto_lofi_post.StockCatalog")
+    def test_load_music_from_stock_uses_catalog(self, mock_catalog_cls, mock_probe):
+        """ストック読み込み時はカタログの長さを使い、使われていない曲を選んで使用回数を記録するテスト"""
+        from auto_post.stock_catalog import StockTrack
+
+        stock_dir = Path(self.temp_dir) / "stock" / "sad"
+        stock_dir.mkdir(parents=True)
+        self.test_output_dir.mkdir(parents=True, exist_ok=True)
+        files = [stock_dir / "a.mp3", stock_dir / "b.mp3", stock_dir / "c.mp3"]
+        for file in files:
+            file.write_bytes(b"\x00")
+        catalog = mock_catalog_cls.return_value
+        catalog.tracks.return_value = [
+            StockTrack(file, "sad", 303.0, 44100, None, used)
+            for file, used in zip(files, [0, 4, 0])
+        ]
+
+        self.generator._load_music_from_stock(stock_dir, 600)
+
+        catalog.refresh.assert_called_once_with(lofi_type="sad")
+        mock_probe.assert_not_called()
+        self.assertEqual(
+            sorted(catalog.mark_used.call_args.args[0]), [files[0], files[2]]
+        )
+        catalog.close.assert_called_once()
+        self.assertEqual(len(list(self.test_output_dir.glob("*.mp3"))), 2)
+
     @patch("builtins.open", new_callable=mock_open)
     def test_run_full_pipeline_success(self, mock_file):
         """完全なパイプライン実行のテスト"""
@@ -387,6 +443,205 @@ class TestLofiPostGenerator(unittest.TestCase):
             mock_upload.assert_called_once()
             mock_store_assets.assert_called_once()
 
+    def test_run_stage_order_with_single_worker(self):
+        """pipeline_workers=1なら従来どおりの順序でステージを実行するテスト"""
+        self.generator.args.pipeline_workers = 1
+        calls = Mock()
+        calls.combine_audio_tracks.return_value = ("audio.m4a", "tracks_info.json")
+        calls.generate_thumbnail.return_value = ("image.png", "thumbnail.png")
+        calls.generate_metadata.return_value = "metadata.json"
+        calls.generate_video.return_value = "video.mp4"
+        names = [
+            "setup",
+            "select_prompt",
+            "generate_music",
+            "combine_audio_tracks",
+            "generate_thumbnail",
+            "generate_metadata",
+            "generate_video",
+            "upload_to_youtube",
+            "store_assets",
+        ]
+        with patch.multiple(
+            self.generator, **{name: getattr(calls, name) for name in names}
+        ):
+            self.generator.run()
+
+        self.assertEqual([c[0] for c in calls.mock_calls], names)
+        calls.generate_video.assert_called_once_with("image.png", "audio.m4a")
+        calls.upload_to_youtube.assert_called_once_with(
+            "video.mp4", "thumbnail.png", "metadata.json"
+        )
+
+    def test_rerun_reuses_unchanged_stages(self):
+        """同じ出力ディレクトリで再実行すると、入力が変わっていないステージを実行しないテスト"""
+        self.generator.args.pipeline_workers = 1
+        self.test_output_dir.mkdir(parents=True)
+        files = {
+            name: str(self.test_output_dir / name)
+            for name in ["combined_audio.m4a", "tracks_info.json", "thumb.png"]
+        }
+        for path in files.values():
+            Path(path).write_bytes(b"data")
+        prompt = {
+            "type": "sad",
+            "music_prompt": "piano",
+            "thumbnail_title": "Sad Lo-Fi",
+            "ambient": "rain.mp3",
+        }
+
+        def run_pipeline():
+            generator = LofiPostGenerator.__new__(LofiPostGenerator)
+            generator.__dict__.update(self.generator.__dict__)
+
+            def select_prompt():
+                generator.selected_prompt = dict(prompt)
+                generator.selected_image_prompt = "rainy window"
+
+            calls = Mock()
+            calls.select_prompt.side_effect = select_prompt
+            calls.combine_audio_tracks.return_value = (
+                files["combined_audio.m4a"],
+                files["tracks_info.json"],
+            )
+            calls.generate_thumbnail.return_value = (files["thumb.png"],) * 2
+            calls.generate_metadata.return_value = files["tracks_info.json"]
+            calls.generate_video.return_value = None
+            names = [
+                "select_prompt",
+                "generate_music",
+                "combine_audio_tracks",
+                "generate_thumbnail",
+                "generate_metadata",
+                "generate_video",
+                "store_assets",
+            ]
+            with patch.multiple(
+                generator, **{name: getattr(calls, name) for name in names}
+            ), patch("auto_post.auto_lofi_post.http_client"):
+                generator.run()
+            return generator, [c[0] for c in calls.mock_calls]
+
+        _, first = run_pipeline()
+        self.assertIn("generate_music", first)
+
+        generator, second = run_pipeline()
+        self.assertEqual(second, ["store_assets"])
+        self.assertEqual(generator.selected_prompt, prompt)
+        self.assertEqual(generator.selected_image_prompt, "rainy window")
+
+        # --force で指定したステージは再実行する
+        self.generator.args.force = ["thumbnail"]
+        _, third = run_pipeline()
+        self.assertEqual(third, ["generate_thumbnail", "store_assets"])
+
+    def test_failed_run_is_journaled_and_resumed(self):
+        """失敗した実行をジャーナルに記録し、次回の起動時に同じ引数で再開するテスト"""
+        from auto_post import auto_lofi_post
+        from auto_post.run_journal import FAILED, JOURNAL_FILENAME, RunJournal
+
+        self.generator.args.pipeline_workers = 1
+        self.generator.args.force = ["music"]
+        calls = Mock()
+        calls.select_prompt.side_effect = lambda: None
+        calls.combine_audio_tracks.return_value = ("audio.m4a", "tracks_info.json")
+        calls.generate_thumbnail.return_value = ("image.png", "thumbnail.png")
+        calls.generate_metadata.return_value = "metadata.json"
+        calls.generate_video.side_effect = SystemExit(1)
+        names = [
+            "select_prompt",
+            "generate_music",
+            "combine_audio_tracks",
+            "generate_thumbnail",
+            "generate_metadata",
+            "generate_video",
+        ]
+        with patch.multiple(
+            self.generator, **{name: getattr(calls, name) for name in names}
+        ), self.assertRaises(SystemExit):
+            self.generator.run()
+
+        journal = RunJournal(self.test_output_dir / JOURNAL_FILENAME)
+        self.assertEqual(journal.status, FAILED)
+        self.assertEqual(journal.attempts, 1)
+        self.assertEqual(journal.data["stages"]["video"]["status"], FAILED)
+        self.assertEqual(journal.data["stages"]["combine"]["status"], "completed")
+
+        # 翌日の起動時に、同じ階層に残った実行を記録した引数で再開する
+        with patch("auto_post.auto_lofi_post.LofiPostGenerator") as mock_generator:
+            auto_lofi_post.resume_unfinished_runs(Path(self.temp_dir) / "tomorrow")
+
+        args = mock_generator.call_args.args[0]
+        self.assertEqual(Path(args.output_dir), self.test_output_dir)
+        self.assertEqual(args.target_duration_sec, 600)
+        self.assertEqual(args.force, [])  # 有料の生成を --force で再実行しない
+        mock_generator.return_value.run.assert_called_once()
+
+    @patch("auto_post.auto_lofi_post.resume_unfinished_runs")
+    @patch("auto_post.auto_lofi_post.LofiPostGenerator")
+    def test_main_resumes_after_todays_run(self, mock_generator, mock_resume):
+        """--resume の再開は今回の実行が失敗しても、その後に行うテスト"""
+        from auto_post import auto_lofi_post
+
+        order = []
+        mock_generator.return_value.run.side_effect = lambda: order.append("today")
+        mock_resume.side_effect = lambda *args, **kwargs: order.append("resume")
+        argv = ["auto_lofi_post", "--output_dir", str(self.test_output_dir)]
+
+        # 既定では再開しない
+        with patch("sys.argv", argv):
+            auto_lofi_post.main()
+        self.assertEqual(order, ["today"])
+
+        order.clear()
+        mock_generator.return_value.run.side_effect = SystemExit(1)
+        with patch("sys.argv", [*argv, "--resume"]), self.assertRaises(SystemExit):
+            auto_lofi_post.main()
+        self.assertEqual(order, ["resume"])
+        self.assertEqual(
+            mock_resume.call_args.kwargs["exclude"], [self.test_output_dir]
+        )
+
+    def test_batch_jobs_and_run_batch(self):
+        """--count / --types から動画ごとの引数を作り、失敗した動画があっても続けるテスト"""
+        from auto_post import auto_lofi_post
+
+        self.args.count = 3
+        self.args.types = "sad, jazz"
+        jobs = auto_lofi_post.batch_jobs(self.args)
+
+        self.assertEqual(
+            [(job.output_dir, job.lofi_type) for job in jobs],
+            [
+                (f"{self.test_output_dir}_1", "sad"),
+                (f"{self.test_output_dir}_2", "jazz"),
+                (f"{self.test_output_dir}_3", "sad"),
+            ],
+        )
+        self.assertTrue(all(job.keep_warm for job in jobs))
+        self.assertIsNone(self.args.lofi_type)  # 元の引数は書き換えない
+
+        # 1 本だけなら従来どおり元の引数をそのまま使う
+        self.args.count, self.args.types = None, None
+        self.assertEqual(auto_lofi_post.batch_jobs(self.args), [self.args])
+
+        def generator(args, budget):
+            instance = Mock()
+            if args.lofi_type == "jazz":
+                instance.run.side_effect = SystemExit(1)
+            generators.append((args, budget))
+            return instance
+
+        generators = []
+        with patch(
+            "auto_post.auto_lofi_post.LofiPostGenerator", side_effect=generator
+        ), self.assertRaises(SystemExit):
+            auto_lofi_post.run_batch(jobs, workers=2)
+
+        self.assertEqual(len(generators), 3)
+        # 全ての動画が同じ資源の枠を共有する
+        self.assertEqual(len({id(budget) for _, budget in generators}), 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -62,7 +62,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
             shutil.rmtree(self.test_output_dir)
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_select_prompt_type_not_found_error(self, mock_requests, mock_validate):
         """指定されたタイプが見つからない場合のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -80,7 +80,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator._select_specific_prompt()
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_select_prompt_extracted_type_not_found(self, mock_requests, mock_validate):
         """抽出したタイプに対応するプロンプトが見つからない場合のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -100,7 +100,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                     generator.select_prompt()
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_generate_music_failure_handling(self, mock_requests, mock_validate):
         """音楽生成失敗時のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -117,7 +117,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator.generate_music()
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_combine_audio_tracks_failure_handling(self, mock_requests, mock_validate):
         """音声結合失敗時のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -134,7 +134,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator.combine_audio_tracks()
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_generate_thumbnail_failure_handling(self, mock_requests, mock_validate):
         """サムネイル生成失敗時のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -152,7 +152,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator.generate_thumbnail()
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_generate_metadata_skip_file_not_found(self, mock_requests, mock_validate):
         """メタデータ生成スキップ時にファイルが見つからない場合のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -166,7 +166,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator.generate_metadata("test_tracks.json")
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_generate_metadata_failure_handling(self, mock_requests, mock_validate):
         """メタデータ生成失敗時のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -183,7 +183,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator.generate_metadata("test_tracks.json")
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_generate_video_failure_handling(self, mock_requests, mock_validate):
         """動画生成失敗時のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -199,7 +199,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator.generate_video("test_image.jpg", "test_audio.mp3")
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_upload_to_youtube_failure_handling(self, mock_requests, mock_validate):
         """YouTubeアップロード失敗時のエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -217,7 +217,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 )
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_run_method_exception_handling(self, mock_requests, mock_validate):
         """runメソッドでの予期せぬエラーハンドリング"""
         mock_requests.return_value.status_code = 200
@@ -230,7 +230,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
                 generator.run()
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_thumbnail_title_list_handling(self, mock_requests, mock_validate):
         """thumbnail_titleがリストの場合の処理"""
         mock_requests.return_value.status_code = 200
@@ -258,7 +258,7 @@ class TestAutoLofiPostErrorCases(unittest.TestCase):
             )
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_image_prompts_fallback_to_image_prompt(self, mock_requests, mock_validate):
         """image_promptsが存在しない場合のimage_promptへのフォールバック"""
         mock_requests.return_value.status_code = 200
@@ -65,7 +65,7 @@ class TestLofiPostGeneratorExtended(unittest.TestCase):
         self.assertTrue(self.test_output_dir.exists())
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_send_slack_notification_success(self, mock_post, mock_validate_config):
         """Slack通知成功時のテスト"""
         generator = LofiPostGenerator(self.args)
@@ -81,7 +81,7 @@ class TestLofiPostGeneratorExtended(unittest.TestCase):
             mock_post.assert_called_once()
 
     @patch("auto_post.auto_lofi_post.Config.validate_config")
-    @patch("auto_post.auto_lofi_post.requests.post")
+    @patch("auto_post.auto_lofi_post.http_client.post")
     def test_send_slack_notification_error(self, mock_post, mock_validate_config):
         """Slack通知エラー時のテスト"""
         generator = LofiPostGenerator(self.args)
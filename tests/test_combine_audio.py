@@ -1,9 +1,20 @@
+import io
+import random
 import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import Mock, patch
 
-from auto_post.combine_audio import combine_audio, load_ambient
+from pydub.generators import Sine
+
+from auto_post.combine_audio import (
+    _open_pcm_encoder,
+    combine_audio,
+    combine_tracks,
+    get_audio_files,
+    load_ambient,
+    stream_combine_tracks,
+)
 
 
 class TestCombineAudio(unittest.TestCase):
@@ -74,7 +85,7 @@ class TestCombineAudio(unittest.TestCase):
         """基本的な音声結合テスト"""
         # テスト用の音声ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         # モックの設定
         mock_music = Mock()
@@ -97,7 +108,7 @@ class TestCombineAudio(unittest.TestCase):
         """環境音付きの音声結合テスト"""
         # テスト用の音声ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         # モックの設定
         mock_music = Mock()
@@ -132,12 +143,23 @@ class TestCombineAudio(unittest.TestCase):
         # アサーション
         self.assertIsNone(result)
 
+    def test_get_audio_files_skips_empty_files(self):
+        """ダウンロード途中で残った空のファイルを除くテスト"""
+        (self.input_dir / "b.mp3").write_bytes(b"mp3")
+        (self.input_dir / "a.mp3").write_bytes(b"mp3")
+        (self.input_dir / "empty.mp3").touch()
+        (self.input_dir / "combined_audio.mp3").write_bytes(b"mp3")
+
+        files = get_audio_files(self.input_dir)
+
+        self.assertEqual([file.name for file in files], ["a.mp3", "b.mp3"])
+
     @patch("auto_post.combine_audio.AudioSegment")
     def test_combine_audio_error_handling(self, mock_audio_segment):
         """エラーハンドリングのテスト"""
         # テスト用の音声ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         # モックでエラーを発生させる
         mock_audio_segment.from_mp3.side_effect = Exception("Test error")
@@ -152,6 +174,111 @@ class TestCombineAudio(unittest.TestCase):
         # アサーション
         self.assertIsNone(result)
 
+    def _fake_encoder(self):
+        """PCMを受け取るだけのエンコーダのモック"""
+        encoder = Mock()
+        encoder.stdin = io.BytesIO()
+        encoder.stdin.close = Mock()
+        encoder.stderr = io.BytesIO()
+        encoder.wait.return_value = 0
+        return encoder
+
+    def test_stream_combine_tracks_matches_combine_tracks(self):
+        """ストリーミング結合のトラック情報と音声が従来の結合と一致するテスト"""
+        durations = {"a": 7300, "b": 4100, "c": 9950, "d": 5000}
+        segments = {
+            name: Sine(220 * (i + 1)).to_audio_segment(duration=ms)
+            for i, (name, ms) in enumerate(durations.items())
+        }
+        tracks = [Path(f"{name}.mp3") for name in durations]
+
+        def from_mp3(path):
+            return segments[Path(path).stem]
+
+        encoder = self._fake_encoder()
+        with patch(
+            "auto_post.combine_audio.AudioSegment.from_mp3", side_effect=from_mp3
+        ), patch("auto_post.combine_audio._open_pcm_encoder", return_value=encoder):
+            random.seed(0)
+            combined, expected = combine_tracks(list(tracks), fade_ms=1000)
+            random.seed(0)
+            info = stream_combine_tracks(
+                list(tracks), self.output_dir / "combined_audio.mp3", fade_ms=1000
+            )
+
+        self.assertEqual(info, expected)
+        written = encoder.stdin.getvalue()
+        self.assertEqual(len(written), len(combined.raw_data))
+        # フェードアウト直前まではバイト単位で一致する
+        body = len(combined[:-1000].raw_data)
+        self.assertEqual(written[:body], combined.raw_data[:body])
+
+    def test_stream_combine_tracks_empty_list(self):
+        """空リストのストリーミング結合テスト"""
+        with self.assertRaises(ValueError):
+            stream_combine_tracks([], self.output_dir / "combined_audio.mp3")
+
+    @patch("auto_post.combine_audio.subprocess.Popen")
+    def test_open_pcm_encoder_m4a(self, mock_popen):
+        """m4a指定時はAACでエンコードするffmpegを起動するテスト"""
+        _open_pcm_encoder(self.output_dir / "combined_audio.m4a", 44100, 2, 2, "m4a")
+
+        command = mock_popen.call_args.args[0]
+        self.assertEqual(command[command.index("-c:a") + 1], "aac")
+        self.assertEqual(
+            command[command.index("-f", command.index("pipe:0")) + 1], "ipod"
+        )
+        self.assertEqual(command[-1], str(self.output_dir / "combined_audio.m4a"))
+
+    @patch("auto_post.combine_audio.AudioSegment")
+    def test_combine_audio_m4a(self, mock_audio_segment):
+        """audio_format="m4a" でAACのm4aとして書き出すテスト"""
+        (self.input_dir / "test.mp3").write_bytes(b"mp3")
+        mock_audio = Mock()
+        mock_audio.__len__ = Mock(return_value=1000)
+        mock_audio_segment.from_mp3.return_value = mock_audio
+
+        result = combine_audio(
+            input_dir=self.input_dir,
+            output_dir=self.output_dir,
+            ambient=None,
+            audio_format="m4a",
+        )
+
+        self.assertEqual(result[0], self.output_dir / "combined_audio.m4a")
+        args, kwargs = mock_audio.export.call_args
+        self.assertEqual(args[0], self.output_dir / "combined_audio.m4a")
+        self.assertEqual(kwargs["format"], "ipod")
+        self.assertIn("aac", kwargs["parameters"])
+
+    def test_combine_audio_streaming(self):
+        """streaming=True で stream_combine_tracks が使われるテスト"""
+        test_file = self.input_dir / "test.mp3"
+        test_file.write_bytes(b"mp3")
+        info = [dict(title="test", original_title="test", start_time=0.0, end_time=1.0)]
+
+        with patch(
+            "auto_post.combine_audio.stream_combine_tracks", return_value=info
+        ) as mock_stream, patch(
+            "auto_post.combine_audio.combine_tracks"
+        ) as mock_combine:
+            result = combine_audio(
+                input_dir=self.input_dir,
+                output_dir=self.output_dir,
+                ambient=None,
+                streaming=True,
+            )
+
+        self.assertEqual(
+            result,
+            (
+                self.output_dir / "combined_audio.mp3",
+                self.output_dir / "tracks_info.json",
+            ),
+        )
+        mock_stream.assert_called_once()
+        mock_combine.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -46,7 +46,7 @@ class TestCombineAudioExtended(unittest.TestCase):
         """単一ファイルの場合のテスト"""
         # テスト用のMP3ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         with patch("auto_post.combine_audio.AudioSegment") as mock_audio:
             mock_segment = Mock()
@@ -74,7 +74,7 @@ class TestCombineAudioExtended(unittest.TestCase):
             self.input_dir / "test3.mp3",
         ]
         for file in test_files:
-            file.touch()
+            file.write_bytes(b"mp3")
 
         with patch("auto_post.combine_audio.AudioSegment") as mock_audio:
             mock_segment = Mock()
@@ -97,7 +97,7 @@ class TestCombineAudioExtended(unittest.TestCase):
         """アンビエント音ありの場合のテスト"""
         # テスト用のMP3ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         # アンビエントファイルを作成
         ambient_file = self.temp_path / "ambient.mp3"
@@ -124,7 +124,7 @@ class TestCombineAudioExtended(unittest.TestCase):
         """アンビエントファイルが見つからない場合のテスト"""
         # テスト用のMP3ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         with patch("auto_post.combine_audio.AudioSegment") as mock_audio:
             mock_segment = Mock()
@@ -147,7 +147,7 @@ class TestCombineAudioExtended(unittest.TestCase):
         """フェード時間が0の場合のテスト"""
         # テスト用のMP3ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         with patch("auto_post.combine_audio.AudioSegment") as mock_audio:
             mock_segment = Mock()
@@ -170,7 +170,7 @@ class TestCombineAudioExtended(unittest.TestCase):
         """フェード時間が負の場合のテスト"""
         # テスト用のMP3ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         with patch("auto_post.combine_audio.AudioSegment") as mock_audio:
             mock_segment = Mock()
@@ -193,7 +193,7 @@ class TestCombineAudioExtended(unittest.TestCase):
         """非常に長いフェード時間の場合のテスト"""
         # テスト用のMP3ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         with patch("auto_post.combine_audio.AudioSegment") as mock_audio:
             mock_segment = Mock()
@@ -216,7 +216,7 @@ class TestCombineAudioExtended(unittest.TestCase):
         """出力ディレクトリが存在しない場合のテスト"""
         # テスト用のMP3ファイルを作成
         test_file = self.input_dir / "test.mp3"
-        test_file.touch()
+        test_file.write_bytes(b"mp3")
 
         # 出力ディレクトリを削除
         shutil.rmtree(self.output_dir)
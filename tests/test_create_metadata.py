@@ -69,7 +69,7 @@ class TestCreateMetadata(unittest.TestCase):
 
         self.assertEqual(result, expected)
 
-    @patch("auto_post.create_metadata.requests.post")
+    @patch("auto_post.create_metadata.http_client.post")
     def test_call_openai_success(self, mock_post):
         """OpenAI API呼び出し成功時のテスト"""
         # モックの設定
@@ -83,7 +83,7 @@ class TestCreateMetadata(unittest.TestCase):
         result = call_openai("Test prompt")
         self.assertEqual(result, "Generated title")
 
-    @patch("auto_post.create_metadata.requests.post")
+    @patch("auto_post.create_metadata.http_client.post")
     def test_call_openai_failure(self, mock_post):
         """OpenAI API呼び出し失敗時のテスト"""
         # モックの設定
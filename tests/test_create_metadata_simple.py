@@ -30,7 +30,7 @@ class TestCreateMetadataSimple(unittest.TestCase):
         """テスト後のクリーンアップ"""
         shutil.rmtree(self.temp_dir)
 
-    @patch("auto_post.create_metadata.requests.post")
+    @patch("auto_post.create_metadata.http_client.post")
     def test_create_metadata_success(self, mock_post):
         """メタデータ生成成功時のテスト"""
         # モックの設定
@@ -59,7 +59,7 @@ class TestCreateMetadataSimple(unittest.TestCase):
 
                 self.assertIsInstance(result, Path)
 
-    @patch("auto_post.create_metadata.requests.post")
+    @patch("auto_post.create_metadata.http_client.post")
     def test_create_metadata_api_error(self, mock_post):
         """APIエラー時のテスト"""
         # モックの設定
@@ -91,7 +91,7 @@ class TestCreateMetadataSimple(unittest.TestCase):
                     # 例外が発生する場合は正常
                     pass
 
-    @patch("auto_post.create_metadata.requests.post")
+    @patch("auto_post.create_metadata.http_client.post")
     def test_create_metadata_tracks_file_not_found(self, mock_post):
         """トラックファイルが見つからない場合のテスト"""
         # トラックファイルを削除
@@ -108,7 +108,7 @@ class TestCreateMetadataSimple(unittest.TestCase):
                     temperature=0.7,
                 )
 
-    @patch("auto_post.create_metadata.requests.post")
+    @patch("auto_post.create_metadata.http_client.post")
     def test_create_metadata_different_lofi_types(self, mock_post):
         """異なるLo-Fiタイプでのテスト"""
         # モックの設定
@@ -140,7 +140,7 @@ class TestCreateMetadataSimple(unittest.TestCase):
 
                     self.assertIsInstance(result, Path)
 
-    @patch("auto_post.create_metadata.requests.post")
+    @patch("auto_post.create_metadata.http_client.post")
     def test_create_metadata_network_error(self, mock_post):
         """ネットワークエラー時のテスト"""
         # ネットワークエラーのモック
@@ -1,14 +1,32 @@
+import os
 import tempfile
+import time
 import unittest
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 import numpy as np
+from moviepy.audio.AudioClip import AudioArrayClip
 
 from auto_post.create_video import (
+    FRAME_CACHE_SIZE,
+    VOLUME_LEVELS,
+    WaveformClip,
+    _reuse_unchanged_frames,
+    audio_codec_args,
+    build_concat_command,
+    build_ffmpeg_command,
+    build_main_segment_command,
+    build_mux_command,
+    build_preview_concat_command,
     build_video,
+    cached_opening,
     create_video,
     create_waveform_clip,
+    plan_preview_excerpts,
+    plan_segments,
+    render_segmented,
+    render_with_ffmpeg,
 )
 
 
@@ -21,6 +39,12 @@ class TestCreateVideo(unittest.TestCase):
         self.image_path = self.test_dir / "test_image.png"
         self.audio_path = self.test_dir / "test_audio.mp3"
         self.output_path = self.test_dir / "output.mp4"
+        # オープニングのキャッシュはテスト用の一時ディレクトリに作る
+        cache_patcher = patch(
+            "auto_post.config.Config.VIDEO_CACHE_DIR", self.test_dir / "cache"
+        )
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
 
     def tearDown(self):
         """テストのクリーンアップ"""
@@ -115,6 +139,432 @@ class TestCreateVideo(unittest.TestCase):
         self.assertIsNotNone(result)
         mock_clip.write_videofile.assert_called_once()
 
+    def test_build_ffmpeg_command(self):
+        """静止画・波形・オープニング・音声を1つのフィルタグラフで処理するテスト"""
+        command = build_ffmpeg_command(
+            self.image_path,
+            self.audio_path,
+            self.output_path,
+            120.0,
+            opening_path=self.test_dir / "missing.mov",
+        )
+
+        graph = command[command.index("-filter_complex") + 1]
+        self.assertIn("showwaves=s=960x80", graph)
+        self.assertIn("overlay=x=(W-w)/2:y=H-h-20", graph)
+        self.assertIn("[opening][main]concat=n=2:v=1:a=0[video]", graph)
+        # オープニングがなければ3秒の黒画面
+        self.assertIn("color=c=black:s=1920x1080:r=24:d=3", command)
+        self.assertEqual(command[command.index("-t") + 1], "120.000")
+        self.assertEqual(command[-1], str(self.output_path))
+        maps = [command[i + 1] for i, arg in enumerate(command) if arg == "-map"]
+        self.assertEqual(maps, ["[video]", "2:a"])
+
+    @patch("auto_post.config.Config.OPENING_CACHE", False)
+    @patch("auto_post.create_video.subprocess.run")
+    @patch("auto_post.create_video.AudioFileClip")
+    def test_create_video_ffmpeg_engine(self, mock_audio_clip, mock_run):
+        """ffmpegエンジンでもcreate_videoが同じ形で結果を返すテスト"""
+        mock_audio_clip.return_value.duration = 30.0
+        mock_run.return_value.returncode = 0
+
+        with patch.dict(os.environ, {"TESTING": "false"}):
+            result = create_video(
+                output_dir=self.test_dir,
+                still_path=self.image_path,
+                audio_path=self.audio_path,
+                engine="ffmpeg",
+            )
+
+        self.assertEqual(Path(result).parent, self.test_dir)
+        self.assertEqual(mock_run.call_args.args[0][-1], result)
+        command = mock_run.call_args.args[0]
+        self.assertIn(str(self.audio_path), command)
+
+    @patch("auto_post.config.Config.OPENING_CACHE", False)
+    @patch("auto_post.create_video.subprocess.run")
+    @patch("auto_post.create_video.AudioFileClip")
+    def test_create_video_ffmpeg_engine_failure(self, mock_audio_clip, mock_run):
+        """ffmpegが失敗した場合はNoneを返すテスト"""
+        mock_audio_clip.return_value.duration = 30.0
+        mock_run.return_value.returncode = 1
+        mock_run.return_value.stderr = b"error"
+
+        with patch.dict(os.environ, {"TESTING": "false"}):
+            result = create_video(
+                output_dir=self.test_dir,
+                still_path=self.image_path,
+                audio_path=self.audio_path,
+                engine="ffmpeg",
+            )
+
+        self.assertIsNone(result)
+
+    def test_aac_audio_is_copied(self):
+        """AACのm4aは再エンコードせずにコピーで多重化するテスト"""
+        m4a_path = self.test_dir / "combined_audio.m4a"
+        self.assertEqual(audio_codec_args(m4a_path), ["-c:a", "copy"])
+        self.assertEqual(audio_codec_args(self.audio_path)[:2], ["-c:a", "aac"])
+
+        command = build_ffmpeg_command(
+            self.image_path, m4a_path, self.output_path, 60.0
+        )
+        self.assertEqual(command[command.index("-c:a") + 1], "copy")
+        self.assertNotIn("-b:a", command)
+
+        video_only = self.test_dir / "video.mp4"
+        command = build_mux_command(video_only, m4a_path, self.output_path)
+        self.assertEqual(command[command.index("-c:v") + 1], "copy")
+        self.assertEqual(command[command.index("-c:a") + 1], "copy")
+
+    @patch("auto_post.create_video._encode_opening_segment")
+    def test_cached_opening(self, mock_encode):
+        """オープニングは一度だけ変換し、元ファイルが変われば作り直すテスト"""
+        mock_encode.side_effect = lambda source, out: out.write_bytes(b"mp4")
+        opening = self.test_dir / "opening.mov"
+        opening.write_bytes(b"v1")
+        cache_dir = self.test_dir / "cache"
+
+        first = cached_opening(opening, cache_dir)
+        second = cached_opening(opening, cache_dir)
+        opening.write_bytes(b"v2")
+        third = cached_opening(opening, cache_dir)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertEqual(mock_encode.call_count, 2)
+        # 使われたばかりの古いキャッシュは残す
+        self.assertEqual(
+            sorted(p.name for p in cache_dir.iterdir()),
+            sorted([first.name, third.name]),
+        )
+
+        # しばらく使われていない古いキャッシュは新しく作成したときに削除する
+        old = time.time() - 2 * 24 * 60 * 60
+        os.utime(first, (old, old))
+        os.utime(third, (old, old))
+        opening.write_bytes(b"v3")
+        fourth = cached_opening(opening, cache_dir)
+        self.assertEqual([p.name for p in cache_dir.iterdir()], [fourth.name])
+
+    @patch("auto_post.create_video._encode_opening_segment")
+    def test_cached_opening_depends_on_encoding(self, mock_encode):
+        """エンコード設定が変わればキャッシュも別になるテスト"""
+        mock_encode.side_effect = lambda source, out: out.write_bytes(b"mp4")
+        cache_dir = self.test_dir / "cache"
+
+        first = cached_opening(None, cache_dir)
+        with patch("auto_post.create_video.VIDEO_BITRATE", "3000k"):
+            second = cached_opening(None, cache_dir)
+
+        self.assertNotEqual(first, second)
+
+    @patch("auto_post.create_video.render_segmented")
+    @patch("auto_post.create_video.render_with_ffmpeg")
+    @patch("auto_post.create_video.cached_opening")
+    @patch("auto_post.create_video.AudioFileClip")
+    def test_build_video_uses_cached_opening(
+        self, mock_audio_clip, mock_cached, mock_render, mock_segmented
+    ):
+        """キャッシュしたオープニングを使っても1回で描画するエンジンのままにするテスト"""
+        mock_audio_clip.return_value.duration = 60.0
+        mock_cached.return_value = self.test_dir / "opening_cached.mp4"
+        mock_render.return_value = self.output_path
+
+        with patch.dict(os.environ, {"TESTING": "false"}), patch(
+            "auto_post.config.Config.OPENING_CACHE", True
+        ):
+            result = build_video(
+                self.image_path, self.audio_path, self.test_dir, engine="ffmpeg"
+            )
+
+        self.assertEqual(result, self.output_path)
+        kwargs = mock_render.call_args.kwargs
+        self.assertEqual(kwargs["opening_segment"], mock_cached.return_value)
+        mock_segmented.assert_not_called()
+
+    @patch("auto_post.create_video.subprocess.run")
+    def test_render_with_ffmpeg_concats_cached_opening(self, mock_run):
+        """変換済みのオープニングとメイン部を再エンコードせずに連結するテスト"""
+        opening = self.test_dir / "opening_cached.mp4"
+        lists = []
+
+        def run(command, **kwargs):
+            if "concat" in command:
+                lists.append(Path(command[command.index("-i") + 1]).read_text())
+            return Mock(returncode=0)
+
+        mock_run.side_effect = run
+
+        render_with_ffmpeg(
+            self.image_path,
+            self.audio_path,
+            self.output_path,
+            60.0,
+            opening_segment=opening,
+        )
+
+        main_command, concat_command = [c.args[0] for c in mock_run.call_args_list]
+        self.assertNotIn("concat=n=2", " ".join(main_command))
+        self.assertIn("-an", main_command)
+        self.assertEqual(concat_command[concat_command.index("-c:v") + 1], "copy")
+        self.assertEqual(concat_command[-1], str(self.output_path))
+        main_file = Path(main_command[-1])
+        self.assertEqual(
+            lists, [f"file '{opening.resolve()}'\nfile '{main_file.resolve()}'\n"]
+        )
+        self.assertFalse(main_file.exists())
+
+    def test_still_mode_segment_command(self):
+        """静止画モードでは低fps・tune=stillimage・重複フレーム除去で書き出すテスト"""
+        command = build_main_segment_command(
+            self.image_path, self.audio_path, self.output_path, 0.0, 60.0, fps=8
+        )
+
+        graph = command[command.index("-filter_complex") + 1]
+        self.assertIn("showwaves=s=960x80:mode=cline:rate=8", graph)
+        self.assertIn("mpdecimate=hi=0:lo=0:frac=0:max=8", graph)
+        self.assertEqual(command[command.index("-tune") + 1], "stillimage")
+        self.assertEqual(command[command.index("-fps_mode") + 1], "vfr")
+        self.assertEqual(command[command.index("-g") + 1], "240")
+        self.assertNotIn("-r", command)
+
+        # 通常のfpsでは従来どおり固定フレームレート
+        command = build_main_segment_command(
+            self.image_path, self.audio_path, self.output_path, 0.0, 60.0
+        )
+        self.assertNotIn("-tune", command)
+        self.assertEqual(command[command.index("-r") + 1], "24")
+
+    def test_plan_segments(self):
+        """区間の境界がGOPの倍数のフレームになり、最後の区間が尺で終わるテスト"""
+        segments = plan_segments(700.0, 300, fps=24, gop=240)
+
+        self.assertEqual(segments, [(0.0, 300.0), (300.0, 600.0), (600.0, 700.0)])
+        # 区間長はGOP（10秒）の倍数に丸められる
+        self.assertEqual(plan_segments(25.0, 14, fps=24, gop=240)[0], (0.0, 10.0))
+        self.assertEqual(plan_segments(5.0, 300, fps=24, gop=240), [(0.0, 5.0)])
+
+    def test_build_concat_command(self):
+        """区間の映像はコピーし、音声だけを多重化する連結コマンドのテスト"""
+        list_file = self.test_dir / "segments.txt"
+        command = build_concat_command(list_file, self.audio_path, self.output_path)
+
+        self.assertEqual(command[command.index("-f") + 1], "concat")
+        self.assertEqual(command[command.index("-c:v") + 1], "copy")
+        maps = [command[i + 1] for i, arg in enumerate(command) if arg == "-map"]
+        self.assertEqual(maps, ["0:v", "1:a"])
+        self.assertEqual(command[-1], str(self.output_path))
+
+    @patch("auto_post.config.Config.OPENING_CACHE", False)
+    @patch("auto_post.create_video.render_segmented")
+    @patch("auto_post.create_video.AudioFileClip")
+    def test_build_video_segmented(self, mock_audio_clip, mock_render):
+        """segment_workersが2以上なら区間ごとの並列エンコードに切り替わるテスト"""
+        mock_audio_clip.return_value.duration = 600.0
+        mock_render.return_value = self.output_path
+
+        with patch.dict(os.environ, {"TESTING": "false"}):
+            result = build_video(
+                self.image_path,
+                self.audio_path,
+                self.output_path,
+                engine="ffmpeg",
+                segment_workers=3,
+                segment_sec=120,
+            )
+
+        self.assertEqual(result, self.output_path)
+        kwargs = mock_render.call_args.kwargs
+        self.assertEqual(
+            (kwargs["engine"], kwargs["workers"], kwargs["segment_sec"]),
+            ("ffmpeg", 3, 120),
+        )
+        self.assertEqual(mock_render.call_args.args[3], 600.0)
+
+    def _render_segmented(self, fail_on=None):
+        """区間のエンコードをダミーに差し替えて render_segmented を実行する"""
+        encoded = []
+
+        def encode_main(engine, still, audio, output, start, end, fps):
+            encoded.append(output.name)
+            if output.name == fail_on:
+                raise RuntimeError("ffmpeg crashed")
+            output.write_bytes(b"segment")
+            return output
+
+        def encode_opening(opening, output):
+            encoded.append(output.name)
+            output.write_bytes(b"opening")
+            return output
+
+        with patch(
+            "auto_post.create_video._encode_main_segment", side_effect=encode_main
+        ), patch(
+            "auto_post.create_video._encode_opening_segment",
+            side_effect=encode_opening,
+        ), patch(
+            "auto_post.create_video._run_ffmpeg"
+        ) as mock_run:
+            render_segmented(
+                self.image_path,
+                self.audio_path,
+                self.output_path,
+                40.0,
+                engine="ffmpeg",
+                workers=1,
+                segment_sec=10,
+            )
+        return encoded, mock_run
+
+    def test_render_segmented_resumes(self):
+        """途中で失敗しても、再実行時は未完了の区間だけをエンコードするテスト"""
+        self.image_path.write_bytes(b"png")
+        self.audio_path.write_bytes(b"mp3")
+        work_dir = self.test_dir / "output_segments"
+
+        with self.assertRaises(RuntimeError):
+            self._render_segmented(fail_on="segment_0003.mp4")
+        self.assertTrue((work_dir / "manifest.json").exists())
+
+        encoded, mock_run = self._render_segmented()
+
+        self.assertEqual(encoded, ["segment_0003.mp4", "segment_0004.mp4"])
+        mock_run.assert_called_once()
+        self.assertFalse(work_dir.exists())
+
+    def test_render_segmented_discards_stale_segments(self):
+        """音源が変わった場合は書き出し済みの区間を使わないテスト"""
+        self.image_path.write_bytes(b"png")
+        self.audio_path.write_bytes(b"mp3")
+        with self.assertRaises(RuntimeError):
+            self._render_segmented(fail_on="segment_0003.mp4")
+
+        self.audio_path.write_bytes(b"another mix")
+        encoded, _ = self._render_segmented()
+
+        self.assertEqual(len(encoded), 5)
+
+    def test_plan_preview_excerpts(self):
+        """プレビューの区間が先頭から末尾まで等間隔に取られるテスト"""
+        self.assertEqual(
+            plan_preview_excerpts(600.0, 3, 5.0, fps=24),
+            [(0.0, 5.0), (297.5, 302.5), (595.0, 600.0)],
+        )
+        # 開始はフレーム境界に揃える
+        start, _ = plan_preview_excerpts(100.0, 2, 5.01, fps=24)[1]
+        self.assertEqual(start * 24, 2279.0)
+        # 短い音源は全体を 1 区間にする
+        self.assertEqual(plan_preview_excerpts(12.0, 3, 5.0), [(0.0, 12.0)])
+
+    def test_build_preview_concat_command(self):
+        """プレビューの音声がオープニングと各区間に合わせて切り出されるテスト"""
+        list_file = self.test_dir / "parts.txt"
+        command = build_preview_concat_command(
+            list_file,
+            self.audio_path,
+            self.output_path,
+            3.0,
+            [(0.0, 5.0), (60.0, 65.0)],
+        )
+
+        graph = command[command.index("-filter_complex") + 1]
+        self.assertIn("apad=whole_dur=68.000000,asplit=3", graph)
+        self.assertIn("atrim=start=0.000000:end=3.000000", graph)
+        self.assertIn("atrim=start=3.000000:end=8.000000", graph)
+        self.assertIn("atrim=start=63.000000:end=68.000000", graph)
+        self.assertIn("concat=n=3:v=0:a=1[audio]", graph)
+        self.assertEqual(command[command.index("-c:v") + 1], "copy")
+        maps = [command[i + 1] for i, arg in enumerate(command) if arg == "-map"]
+        self.assertEqual(maps, ["0:v", "[audio]"])
+
+    @patch("auto_post.config.Config.FINAL_VIDEO_FILENAME", "final_video.mp4")
+    @patch("auto_post.create_video._prepare_opening")
+    @patch("auto_post.create_video.render_preview")
+    @patch("auto_post.create_video.AudioFileClip")
+    def test_build_video_preview(self, mock_audio_clip, mock_preview, mock_prepare):
+        """previewでは本番の動画を作らず、別名のプレビューだけを書き出すテスト"""
+        mock_audio_clip.return_value.duration = 600.0
+        mock_preview.side_effect = lambda still, audio, output, *a, **kw: output
+
+        with patch.dict(os.environ, {"TESTING": "false"}):
+            result = build_video(
+                self.image_path,
+                self.audio_path,
+                self.output_path,
+                engine="ffmpeg",
+                preview=True,
+                preview_excerpts=4,
+            )
+
+        self.assertEqual(result.name, "final_video_preview.mp4")
+        kwargs = mock_preview.call_args.kwargs
+        self.assertEqual((kwargs["count"], kwargs["engine"]), (4, "ffmpeg"))
+        mock_prepare.assert_not_called()
+
+
+class TestWaveformClip(unittest.TestCase):
+    """WaveformClipの描画の単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.audio = AudioArrayClip(np.zeros((1000, 2)), fps=100)
+        rng = np.random.default_rng(0)
+        self.envelope = (0.05 + 0.25 * rng.random(240)).astype(np.float32)
+
+    def _reference_frame(self, clip, volume):
+        """バーを1本ずつ描く素朴な実装"""
+        img = np.zeros((clip.height, clip.width, 4), dtype=np.uint8)
+        scale = 1 + volume * 2
+        for i, base_h in enumerate(clip.bar_heights):
+            h = min(int(base_h * clip.height * scale), clip.height // 2 - 2)
+            x = i * (clip.bar_w + clip.spacing)
+            y_start = max(0, clip.center_y - h)
+            y_end = min(clip.height, clip.center_y + h)
+            if y_end > y_start and clip.bar_w > 0:
+                img[y_start:y_end, x : x + clip.bar_w, :3] = clip.main_color
+                img[y_start:y_end, x : x + clip.bar_w, 3] = 255
+        return img
+
+    def test_frames_match_reference(self):
+        """ベクトル化した描画が素朴な実装と一致するテスト"""
+        clip = WaveformClip(self.audio, 480, 80, fps=24, envelope=self.envelope)
+
+        for index in range(0, 240, 7):
+            level = round(float(self.envelope[index]) * (VOLUME_LEVELS - 1))
+            expected = self._reference_frame(clip, level / (VOLUME_LEVELS - 1))
+            np.testing.assert_array_equal(clip.make_frame(index / 24), expected)
+
+    def test_frames_are_cached(self):
+        """同じ状態のフレームは描画し直さず、キャッシュは上限を超えないテスト"""
+        clip = WaveformClip(self.audio, 480, 80, fps=24, envelope=self.envelope)
+
+        first = clip.make_frame(0.0)
+        with patch.object(clip, "_render", wraps=clip._render) as mock_render:
+            again = clip.make_frame(0.0)
+            for index in range(240):
+                clip.make_frame(index / 24)
+
+        self.assertIs(first, again)
+        self.assertFalse(first.flags.writeable)
+        self.assertLessEqual(mock_render.call_count, len(clip._state_heights))
+        self.assertLessEqual(len(clip._frames), FRAME_CACHE_SIZE)
+
+    def test_unchanged_frames_are_not_composited(self):
+        """波形の状態が直前と同じフレームは合成し直さないテスト"""
+        waveform = WaveformClip(self.audio, 480, 80, fps=24, envelope=self.envelope)
+        compose = Mock(side_effect=lambda t: np.full(1, t))
+        composite = Mock(frame_function=compose)
+        clip = _reuse_unchanged_frames(composite, waveform)
+
+        times = [index / 24 for index in range(240)]
+        frames = [clip.frame_function(t) for t in times]
+
+        states = [waveform.state_at(t) for t in times]
+        changes = 1 + sum(a != b for a, b in zip(states, states[1:]))
+        self.assertEqual(compose.call_count, changes)
+        self.assertIs(clip.frame_function(times[-1]), frames[-1])
+
 
 if __name__ == "__main__":
     unittest.main()
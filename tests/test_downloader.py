@@ -0,0 +1,143 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+from auto_post import http_client
+from auto_post.downloader import DownloadError, download_file
+from auto_post.http_client import HttpClient
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Range に対応し、指定回数だけ途中で接続を切るスタブサーバー"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        body = server.body
+        range_header = self.headers.get("Range")
+        server.ranges.append(range_header)
+
+        start, end = 0, len(body) - 1
+        if range_header and server.accept_ranges:
+            first, _, last = range_header[len("bytes=") :].partition("-")
+            start = int(first)
+            end = int(last) if last else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        else:
+            self.send_response(200)
+        if server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end + 1 - start))
+        self.end_headers()
+
+        payload = body[start : end + 1]
+        with server.lock:
+            drop = server.drops > 0
+            server.drops -= int(drop)
+        if drop:
+            # 半分だけ送って接続を切る
+            self.wfile.write(payload[: len(payload) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloadFile(unittest.TestCase):
+    """download_file関数の単体テスト（ローカルのスタブサーバーを使用）"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+        self.server.body = os.urandom(300_000)
+        self.server.ranges = []
+        self.server.accept_ranges = True
+        self.server.drops = 0
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/audio.mp3"
+        self.save_path = str(self.temp_dir / "audio.mp3")
+        http_client.set_client(HttpClient(host_overrides={}))
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        http_client.set_client(None)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def _assert_saved(self):
+        self.assertEqual(Path(self.save_path).read_bytes(), self.server.body)
+        self.assertFalse(os.path.exists(f"{self.save_path}.part"))
+
+    def test_download(self):
+        """ダウンロードしてサイズとハッシュを返すテスト"""
+        result = download_file(self.url, self.save_path)
+
+        self._assert_saved()
+        self.assertEqual(result.size, len(self.server.body))
+        self.assertEqual(result.sha256, hashlib.sha256(self.server.body).hexdigest())
+        self.assertEqual((result.ranges, result.resumes), (1, 0))
+        self.assertGreater(result.throughput, 0)
+
+    def test_resume_with_range(self):
+        """途中で切れた場合はRangeで続きから取得するテスト"""
+        self.server.drops = 1
+
+        result = download_file(self.url, self.save_path)
+
+        self._assert_saved()
+        self.assertEqual(result.resumes, 1)
+        # 受信済みの位置（チャンク境界）から再開している
+        self.assertEqual(self.server.ranges[0], None)
+        self.assertRegex(self.server.ranges[1], r"^bytes=[1-9]\d*-$")
+
+    def test_restart_without_range_support(self):
+        """Range非対応のサーバーでは最初から取得し直すテスト"""
+        self.server.accept_ranges = False
+        self.server.drops = 1
+
+        result = download_file(self.url, self.save_path)
+
+        self._assert_saved()
+        self.assertEqual(result.resumes, 1)
+        self.assertEqual(self.server.ranges, [None, None])
+
+    @patch("auto_post.downloader.PARALLEL_MIN_SIZE", 100_000)
+    def test_parallel_ranges(self):
+        """大きなファイルは範囲を分けて並列に取得するテスト"""
+        self.server.drops = 2
+
+        result = download_file(self.url, self.save_path, parallel=3)
+
+        self._assert_saved()
+        self.assertEqual(result.ranges, 3)
+        self.assertEqual(result.resumes, 1)
+        self.assertIn("bytes=0-99999", self.server.ranges)
+        self.assertIn("bytes=200000-299999", self.server.ranges)
+
+    def test_verification_failure_keeps_no_file(self):
+        """検証に失敗した場合は保存先にも一時ファイルにも何も残さないテスト"""
+        with self.assertRaises(DownloadError):
+            download_file(self.url, self.save_path, expected_sha256="0" * 64)
+        with self.assertRaises(DownloadError):
+            download_file(self.url, self.save_path, expected_size=1)
+
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
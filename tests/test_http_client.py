@@ -0,0 +1,142 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from auto_post import http_client
+from auto_post.http_client import HttpClient
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """ステータスを順番に返すスタブサーバー"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        server.calls.append((self.command, self.path))
+        server.ports.add(self.client_address[1])
+        status = server.statuses.pop(0) if server.statuses else 200
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    """http_clientモジュールの単体テスト（ローカルのスタブサーバーを使用）"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.calls = []
+        self.server.ports = set()
+        self.server.statuses = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.client = HttpClient(host_overrides={"api.example.com": base})
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_host_override_and_keep_alive(self):
+        """差し替えたホストに同じ接続で複数回リクエストできるテスト"""
+        for i in range(3):
+            resp = self.client.get(f"https://api.example.com/v1/task/{i}?q=1")
+            self.assertEqual(resp.json()["path"], f"/v1/task/{i}?q=1")
+
+        self.assertEqual(len(self.server.calls), 3)
+        self.assertEqual(len(self.server.ports), 1)
+
+    @patch("auto_post.http_client.RETRY_BACKOFF", 0)
+    def test_get_is_retried_on_server_error(self):
+        """GETは5xxで再試行されるテスト"""
+        client = HttpClient(host_overrides=self.client.host_overrides)
+        self.server.statuses = [503, 502]
+
+        resp = client.get("https://api.example.com/task")
+        client.close()
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(self.server.calls), 3)
+
+    def test_post_is_not_retried_on_server_error(self):
+        """POSTは二重送信を避けるため5xxで再試行しないテスト"""
+        self.server.statuses = [503]
+
+        resp = self.client.post("https://api.example.com/task", json={"a": 1})
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_metrics(self):
+        """ホストごとのリクエスト数とエラー数を記録するテスト"""
+        self.server.statuses = [200, 404]
+        self.client.get("https://api.example.com/a")
+        self.client.get("https://api.example.com/b")
+
+        metrics = self.client.metrics()
+        host = f"127.0.0.1:{self.server.server_address[1]}"
+
+        self.assertEqual(metrics[host]["requests"], 2)
+        self.assertEqual(metrics[host]["errors"], 1)
+        self.assertGreater(metrics[host]["total_sec"], 0)
+
+    def test_default_timeout(self):
+        """timeout未指定時は既定のタイムアウトが使われるテスト"""
+        with patch.object(self.client.session, "request") as mock_request:
+            mock_request.return_value.status_code = 200
+            self.client.get("https://other.example.com/")
+            self.client.get("https://other.example.com/", timeout=5)
+
+        self.assertEqual(
+            mock_request.call_args_list[0].kwargs["timeout"],
+            http_client.DEFAULT_TIMEOUT,
+        )
+        self.assertEqual(mock_request.call_args_list[1].kwargs["timeout"], 5)
+
+    def test_overrides_from_environment(self):
+        """環境変数HTTP_HOST_OVERRIDESから差し替え先を読むテスト"""
+        with patch.dict(
+            "os.environ",
+            {"HTTP_HOST_OVERRIDES": "api.piapi.ai=http://127.0.0.1:9/, bad"},
+        ):
+            client = HttpClient()
+
+        self.assertEqual(client.host_overrides, {"api.piapi.ai": "http://127.0.0.1:9"})
+        self.assertEqual(
+            client._resolve("https://api.piapi.ai/api/v1/task"),
+            "http://127.0.0.1:9/api/v1/task",
+        )
+        client.close()
+
+    def test_shared_client(self):
+        """モジュール関数が共有クライアントを使うテスト"""
+        http_client.set_client(self.client)
+        try:
+            resp = http_client.post("https://api.example.com/shared")
+            self.assertIs(http_client.get_client(), self.client)
+        finally:
+            http_client._client = None
+
+        self.assertEqual(resp.json()["path"], "/shared")
+
+
+if __name__ == "__main__":
+    unittest.main()
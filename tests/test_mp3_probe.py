@@ -0,0 +1,103 @@
+import shutil
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from auto_post.mp3_probe import Mp3ProbeError, get_mp3_duration, get_mp3_duration_ms
+
+# MPEG1 Layer III / 128kbps / 44100Hz / ステレオ / パディングなし
+HEADER = b"\xff\xfb\x90\x00"
+FRAME_LENGTH = 417
+SAMPLES_PER_FRAME = 1152
+
+
+def make_frame(payload: bytes = b"") -> bytes:
+    """ヘッダ＋ペイロード（ゼロ埋め）で1フレームを作る"""
+    body = payload.ljust(FRAME_LENGTH - 4, b"\x00")
+    return HEADER + body
+
+
+def make_id3v2(size: int = 100) -> bytes:
+    """指定サイズのID3v2タグを作る"""
+    syncsafe = bytes(
+        [(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F]
+    )
+    return b"ID3\x04\x00\x00" + syncsafe + b"\x00" * size
+
+
+class TestMp3Probe(unittest.TestCase):
+    """mp3_probeモジュールの単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name: str, data: bytes) -> Path:
+        path = self.temp_dir / name
+        path.write_bytes(data)
+        return path
+
+    def test_cbr_frame_scan(self):
+        """タグのないCBRファイルはフレームを数えて長さを求める"""
+        path = self._write("cbr.mp3", make_frame() * 100)
+
+        self.assertAlmostEqual(
+            get_mp3_duration(path), 100 * SAMPLES_PER_FRAME / 44100, places=6
+        )
+
+    def test_id3v2_and_id3v1_are_skipped(self):
+        """ID3v2/ID3v1タグを読み飛ばすテスト"""
+        data = make_id3v2() + make_frame() * 50 + b"TAG" + b"\x00" * 125
+        path = self._write("tagged.mp3", data)
+
+        self.assertEqual(
+            get_mp3_duration_ms(path), round(50 * SAMPLES_PER_FRAME / 44.1)
+        )
+
+    def test_xing_tag_with_gapless_info(self):
+        """Xing/Infoタグのフレーム数とLAMEタグの遅延/パディングを使うテスト"""
+        frames = 2000
+        delay, padding = 576, 1200
+        tag = b"\x00" * 32 + b"Info" + struct.pack(">II", 0x01, frames)
+        lame = b"LAME3.100" + b"\x00" * 12
+        lame += bytes([delay >> 4, ((delay & 0x0F) << 4) | (padding >> 8)])
+        lame += bytes([padding & 0xFF])
+        path = self._write("xing.mp3", make_frame(tag + lame) + make_frame() * 10)
+
+        expected = (frames * SAMPLES_PER_FRAME - delay - padding) / 44100
+        self.assertAlmostEqual(get_mp3_duration(path), expected, places=6)
+
+    def test_vbri_tag(self):
+        """VBRIタグのフレーム数を使うテスト"""
+        frames = 1234
+        tag = b"\x00" * 32 + b"VBRI" + b"\x00" * 10 + struct.pack(">I", frames)
+        path = self._write("vbri.mp3", make_frame(tag) + make_frame() * 10)
+
+        self.assertAlmostEqual(
+            get_mp3_duration(path), frames * SAMPLES_PER_FRAME / 44100, places=6
+        )
+
+    def test_garbage_before_first_frame(self):
+        """先頭のゴミデータを飛ばして同期を取るテスト"""
+        data = b"\x00\xff\x12" * 10 + make_frame() * 20
+        path = self._write("garbage.mp3", data)
+
+        self.assertAlmostEqual(
+            get_mp3_duration(path), 20 * SAMPLES_PER_FRAME / 44100, places=6
+        )
+
+    def test_not_mp3(self):
+        """MP3でないファイルはMp3ProbeErrorになるテスト"""
+        path = self._write("empty.mp3", b"not an mp3 file at all")
+
+        with self.assertRaises(Mp3ProbeError):
+            get_mp3_duration(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
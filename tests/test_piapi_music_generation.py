@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+import threading
 import unittest
 from pathlib import Path
 from unittest.mock import Mock, patch
@@ -7,11 +8,17 @@ from unittest.mock import Mock, patch
 from auto_post.piapi_music_generation import (
     create_music_task,
     download_audio,
+    extract_audio_variants,
+    generate_track,
     generate_unique_filename,
     get_existing_filenames,
+    get_saved_duration,
     piapi_music_generation,
+    plan_task_count,
+    reserve_unique_filename,
     wait_for_task,
 )
+from auto_post.run_journal import TASK_DONE, RunJournal
 
 
 class TestPiapiMusicGeneration(unittest.TestCase):
@@ -69,6 +76,41 @@ class TestPiapiMusicGeneration(unittest.TestCase):
         # 重複を避けるため、異なるファイル名が生成される
         self.assertEqual(result, "New_Track.mp3")
 
+    def test_reserve_unique_filename_retitles_outside_lock(self):
+        """曲名の再生成はロックの外で行い、予約する直前に確認し直すテスト"""
+        (self.test_music_dir / "Test_Track.mp3").touch()
+        lock = threading.Lock()
+        reserved = {"Busy"}
+        titles = iter(["New Track", "Busy", "Other Track"])
+
+        def fetch(prompt, directory):
+            self.assertFalse(lock.locked())
+            title = next(titles)
+            # 再生成している間に他のタスクが同じ名前を予約する
+            if title == "New Track":
+                reserved.add("New_Track")
+            return title
+
+        with patch(
+            "auto_post.piapi_music_generation.fetch_track_title", side_effect=fetch
+        ):
+            result = reserve_unique_filename(
+                "Test Track", str(self.test_music_dir), "piano", lock, reserved
+            )
+
+        self.assertEqual(result, "Other_Track.mp3")
+        self.assertIn("Other_Track", reserved)
+
+        # 再生成しても重複する場合は番号を付ける
+        with patch(
+            "auto_post.piapi_music_generation.fetch_track_title",
+            return_value="Test Track",
+        ):
+            result = reserve_unique_filename(
+                "Test Track", str(self.test_music_dir), "piano", lock, reserved
+            )
+        self.assertEqual(result, "Test_Track_1.mp3")
+
     def test_generate_unique_filename_special_characters(self):
         """特殊文字を含むタイトルのファイル名生成テスト"""
         title = "Test Track (Remix) [2024]"
@@ -89,7 +131,7 @@ class TestPiapiMusicGeneration(unittest.TestCase):
 
         self.assertEqual(result, expected)
 
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_create_music_task_success(self, mock_post):
         """音楽生成タスク作成成功時のテスト"""
         # モックの設定
@@ -106,7 +148,7 @@ class TestPiapiMusicGeneration(unittest.TestCase):
         self.assertEqual(task_id, "test_task_123")
         mock_post.assert_called_once()
 
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_create_music_task_failure(self, mock_post):
         """音楽生成タスク作成失敗時のテスト"""
         # モックの設定
@@ -119,7 +161,7 @@ class TestPiapiMusicGeneration(unittest.TestCase):
         with self.assertRaises(Exception):
             create_music_task("melancholic piano")
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     def test_wait_for_task_completed(self, mock_get):
         """タスク完了待機テスト"""
         # モックの設定
@@ -138,7 +180,7 @@ class TestPiapiMusicGeneration(unittest.TestCase):
         self.assertEqual(result["status"], "Completed")
         self.assertIn("songs", result["output"])
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     def test_wait_for_task_failed(self, mock_get):
         """タスク失敗待機テスト"""
         # モックの設定
@@ -153,7 +195,7 @@ class TestPiapiMusicGeneration(unittest.TestCase):
         with self.assertRaises(Exception):
             wait_for_task("test_task_123")
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     def test_download_audio_success(self, mock_get):
         """音声ファイルダウンロード成功時のテスト"""
         # モックの設定
@@ -168,7 +210,7 @@ class TestPiapiMusicGeneration(unittest.TestCase):
 
         self.assertTrue(output_path.exists())
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     def test_download_audio_failure(self, mock_get):
         """音声ファイルダウンロード失敗時のテスト"""
         # モックの設定
@@ -220,6 +262,319 @@ class TestPiapiMusicGeneration(unittest.TestCase):
         mock_wait.assert_called()
         mock_download.assert_called()
 
+    @patch("auto_post.piapi_music_generation.get_mp3_duration")
+    def test_get_saved_duration_uses_header_probe(self, mock_probe):
+        """保存したファイルの長さをヘッダから取得するテスト"""
+        mock_probe.return_value = 118.5
+
+        result = get_saved_duration(str(self.test_music_dir / "a.mp3"), 120)
+
+        self.assertEqual(result, 118.5)
+
+    def test_get_saved_duration_fallback(self):
+        """ファイルが読めない場合はAPIの長さを使うテスト"""
+        result = get_saved_duration(str(self.test_music_dir / "missing.mp3"), 120)
+
+        self.assertEqual(result, 120.0)
+
+    def test_plan_task_count(self):
+        """残り時間と実行中タスク数から投入数を決めるテスト"""
+        # 残り600秒・1曲120秒見込み → 5タスク必要だが上限3
+        self.assertEqual(plan_task_count(600, 0, 120, 3), 3)
+        # 2タスク実行中なら残り1タスクだけ追加
+        self.assertEqual(plan_task_count(300, 2, 120, 3), 1)
+        # 実行中のタスクで足りる見込みなら追加しない
+        self.assertEqual(plan_task_count(200, 2, 120, 5), 0)
+        self.assertEqual(plan_task_count(0, 0, 120, 3), 0)
+
+    @patch("auto_post.piapi_music_generation.generate_track")
+    def test_piapi_music_generation_concurrent(self, mock_generate):
+        """同時実行モードで目標時間に達するまで生成するテスト"""
+        mock_generate.return_value = 120.0
+
+        piapi_music_generation(
+            today_folder=str(self.test_music_dir),
+            prompt="melancholic piano",
+            target_duration_sec=600,
+            concurrency=3,
+        )
+
+        # 120秒×5曲で600秒。見込みどおりなら余分なタスクは投入しない
+        self.assertEqual(mock_generate.call_count, 5)
+
+    @patch("auto_post.piapi_music_generation.get_saved_duration")
+    @patch("auto_post.piapi_music_generation.download_audio")
+    @patch("auto_post.piapi_music_generation.fetch_track_title")
+    @patch("auto_post.piapi_music_generation.wait_for_task")
+    @patch("auto_post.piapi_music_generation.create_music_task")
+    def test_piapi_music_generation_concurrent_unique_filenames(
+        self, mock_create, mock_wait, mock_title, mock_download, mock_duration
+    ):
+        """同時実行でも同じタイトルの曲が別名で保存されるテスト"""
+        mock_create.side_effect = lambda prompt: "task"
+        mock_wait.return_value = {
+            "output": {
+                "songs": [{"duration": 100, "song_path": "https://example.com/a.mp3"}]
+            }
+        }
+        mock_title.return_value = "Same Title"
+        mock_duration.return_value = 100.0
+        placeholders = []
+
+        def download(url, save_path):
+            # ダウンロードが終わるまで保存先の名前のファイルを作らない
+            placeholders.append(Path(save_path).exists())
+            Path(save_path).write_bytes(b"mp3")
+
+        mock_download.side_effect = download
+
+        piapi_music_generation(
+            today_folder=str(self.test_music_dir),
+            prompt="melancholic piano",
+            target_duration_sec=400,
+            concurrency=4,
+        )
+
+        saved = [call.args[1] for call in mock_download.call_args_list]
+        self.assertEqual(len(saved), 4)
+        self.assertEqual(len(set(saved)), 4)
+        self.assertEqual(placeholders, [False] * 4)
+
+    @patch("auto_post.piapi_music_generation.RETRY_WAIT", 0)
+    @patch("auto_post.piapi_music_generation.generate_track")
+    def test_piapi_music_generation_concurrent_gives_up(self, mock_generate):
+        """同時実行モードで失敗が続いた場合は例外を送出するテスト"""
+        mock_generate.side_effect = RuntimeError("API down")
+
+        with self.assertRaises(RuntimeError):
+            piapi_music_generation(
+                today_folder=str(self.test_music_dir),
+                prompt="melancholic piano",
+                target_duration_sec=600,
+                concurrency=2,
+            )
+
+    def test_extract_audio_variants(self):
+        """songs/audio_urls/filesの全ての曲を重複なく取り出すテスト"""
+        task_data = {
+            "output": {
+                "songs": [
+                    {"song_path": "https://example.com/a.mp3", "duration": 120},
+                    {"song_path": "https://example.com/b.mp3", "duration": 150},
+                ],
+                "audio_urls": [
+                    "https://example.com/a.mp3",
+                    "https://example.com/c.mp3",
+                ],
+                "files": [{"url": "https://example.com/d.mp3"}, "not-a-url"],
+            }
+        }
+
+        variants = extract_audio_variants(task_data)
+
+        self.assertEqual(
+            variants,
+            [
+                ("https://example.com/a.mp3", 120.0),
+                ("https://example.com/b.mp3", 150.0),
+                ("https://example.com/c.mp3", 0.0),
+                ("https://example.com/d.mp3", 0.0),
+            ],
+        )
+        self.assertEqual(extract_audio_variants({"output": None}), [])
+
+    @patch("auto_post.piapi_music_generation.get_saved_duration")
+    @patch("auto_post.piapi_music_generation.download_audio")
+    @patch("auto_post.piapi_music_generation.fetch_track_title")
+    @patch("auto_post.piapi_music_generation.wait_for_task")
+    @patch("auto_post.piapi_music_generation.create_music_task")
+    def test_generate_track_all_variants(
+        self, mock_create, mock_wait, mock_title, mock_download, mock_duration
+    ):
+        """全バリエーションをそれぞれ別名で保存し、長さを合算するテスト"""
+        mock_create.return_value = "task"
+        mock_wait.return_value = {
+            "output": {
+                "songs": [
+                    {"song_path": "https://example.com/a.mp3", "duration": 120},
+                    {"song_path": "https://example.com/b.mp3", "duration": 150},
+                ]
+            }
+        }
+        mock_title.return_value = "Rainy Window"
+        mock_download.side_effect = lambda url, path: Path(path).write_bytes(b"")
+        mock_duration.side_effect = lambda path, reported: float(reported)
+
+        total = generate_track("rain", str(self.test_music_dir), all_variants=True)
+
+        self.assertEqual(total, 270.0)
+        saved = sorted(p.name for p in self.test_music_dir.glob("*.mp3"))
+        self.assertEqual(saved, ["Rainy_Window.mp3", "Rainy_Window_1.mp3"])
+
+    @patch("auto_post.piapi_music_generation.get_saved_duration")
+    @patch("auto_post.piapi_music_generation.download_audio")
+    @patch("auto_post.piapi_music_generation.fetch_track_title")
+    @patch("auto_post.piapi_music_generation.wait_for_task")
+    @patch("auto_post.piapi_music_generation.create_music_task")
+    def test_generate_track_all_variants_partial_failure(
+        self, mock_create, mock_wait, mock_title, mock_download, mock_duration
+    ):
+        """一部のバリエーションの保存に失敗しても保存できた分を数えるテスト"""
+        mock_create.return_value = "task"
+        mock_wait.return_value = {
+            "output": {
+                "songs": [
+                    {"song_path": "https://example.com/a.mp3", "duration": 120},
+                    {"song_path": "https://example.com/b.mp3", "duration": 150},
+                ]
+            }
+        }
+        mock_title.side_effect = ["First", "Second"]
+        mock_download.side_effect = [None, RuntimeError("network")]
+        mock_duration.return_value = 120.0
+
+        total = generate_track("rain", str(self.test_music_dir), all_variants=True)
+
+        self.assertEqual(total, 120.0)
+
+    @patch("auto_post.piapi_music_generation.get_saved_duration")
+    @patch("auto_post.piapi_music_generation.download_audio")
+    @patch("auto_post.piapi_music_generation.fetch_track_title")
+    @patch("auto_post.piapi_music_generation.wait_for_task")
+    @patch("auto_post.piapi_music_generation.create_music_task")
+    def test_piapi_music_generation_pipelined(
+        self, mock_create, mock_wait, mock_title, mock_download, mock_duration
+    ):
+        """ダウンロード中に次のタスクを投入するパイプラインのテスト"""
+        second_task_created = threading.Event()
+        task_ids = iter(range(100))
+
+        def create(prompt):
+            task_id = next(task_ids)
+            if task_id == 1:
+                second_task_created.set()
+            return f"task-{task_id}"
+
+        def download(url, path):
+            # 最初の曲のダウンロードは次のタスクが投入されるまで終わらない
+            if not second_task_created.is_set():
+                self.assertTrue(second_task_created.wait(5))
+            Path(path).write_bytes(b"")
+
+        mock_create.side_effect = create
+        mock_wait.return_value = {
+            "output": {
+                "songs": [{"duration": 100, "song_path": "https://example.com/a.mp3"}]
+            }
+        }
+        mock_title.return_value = "Night Drive"
+        mock_download.side_effect = download
+        mock_duration.return_value = 100.0
+
+        piapi_music_generation(
+            today_folder=str(self.test_music_dir),
+            prompt="melancholic piano",
+            target_duration_sec=300,
+            pipelined=True,
+        )
+
+        self.assertEqual(mock_create.call_count, 3)
+        self.assertEqual(len(list(self.test_music_dir.glob("*.mp3"))), 3)
+
+    @patch("auto_post.piapi_music_generation.get_saved_duration")
+    @patch("auto_post.piapi_music_generation.download_audio")
+    @patch("auto_post.piapi_music_generation.fetch_track_title")
+    @patch("auto_post.piapi_music_generation.wait_for_task")
+    @patch("auto_post.piapi_music_generation.create_music_task")
+    def test_piapi_music_generation_pipelined_replaces_failed_download(
+        self, mock_create, mock_wait, mock_title, mock_download, mock_duration
+    ):
+        """パイプラインで保存に失敗した分は追加で生成するテスト"""
+        mock_create.return_value = "task"
+        mock_wait.return_value = {
+            "output": {
+                "songs": [{"duration": 100, "song_path": "https://example.com/a.mp3"}]
+            }
+        }
+        mock_title.return_value = "Night Drive"
+        mock_download.side_effect = [RuntimeError("network"), None, None]
+        mock_duration.return_value = 100.0
+
+        piapi_music_generation(
+            today_folder=str(self.test_music_dir),
+            prompt="melancholic piano",
+            target_duration_sec=200,
+            pipelined=True,
+        )
+
+        self.assertEqual(mock_create.call_count, 3)
+        self.assertEqual(mock_download.call_count, 3)
+
+    @patch("auto_post.piapi_music_generation.get_saved_duration")
+    @patch("auto_post.piapi_music_generation.download_audio")
+    @patch("auto_post.piapi_music_generation.fetch_track_title")
+    @patch("auto_post.piapi_music_generation.wait_for_task")
+    @patch("auto_post.piapi_music_generation.create_music_task")
+    def test_piapi_music_generation_resumes_journaled_tasks(
+        self, mock_create, mock_wait, mock_title, mock_download, mock_duration
+    ):
+        """前回の実行で投入したタスクを再投入せずに回収し、残りだけ生成するテスト"""
+        journal = RunJournal(self.test_music_dir / "run_journal.json")
+        journal.start({})
+        saved = self.test_music_dir / "Earlier.mp3"
+        saved.write_bytes(b"")
+        journal.task_submitted("old", "melancholic piano", 0.0)
+        journal.task_completed("old", ["https://example.com/old.mp3"])
+        journal.variant_saved("old", "https://example.com/old.mp3", saved, 100.0)
+        # 中断時にまだ生成中だったタスク
+        journal.task_submitted("in-flight", "melancholic piano", 0.0)
+
+        mock_create.return_value = "new"
+        mock_wait.side_effect = lambda task_id, **kwargs: {
+            "output": {
+                "songs": [
+                    {"duration": 100, "song_path": f"https://example.com/{task_id}.mp3"}
+                ]
+            }
+        }
+        mock_title.side_effect = lambda prompt, folder: f"Track {mock_title.call_count}"
+        mock_download.side_effect = lambda url, path: Path(path).write_bytes(b"")
+        mock_duration.return_value = 100.0
+
+        piapi_music_generation(
+            today_folder=str(self.test_music_dir),
+            prompt="melancholic piano",
+            target_duration_sec=300,
+            journal=journal,
+        )
+
+        # 保存済み 100 秒 + 回収 100 秒で、新規に投入するのは 1 タスクだけ
+        self.assertEqual(mock_create.call_count, 1)
+        self.assertEqual(mock_wait.call_args_list[0].args[0], "in-flight")
+        downloaded = [call.args[0] for call in mock_download.call_args_list]
+        self.assertEqual(
+            downloaded,
+            ["https://example.com/in-flight.mp3", "https://example.com/new.mp3"],
+        )
+        self.assertEqual(journal.unfinished_tasks(), [])
+        self.assertEqual(
+            {task["status"] for task in journal.data["tasks"].values()}, {TASK_DONE}
+        )
+
+    @patch("auto_post.piapi_music_generation.RETRY_WAIT", 0)
+    @patch("auto_post.piapi_music_generation.create_music_task")
+    def test_piapi_music_generation_pipelined_gives_up(self, mock_create):
+        """パイプラインでも失敗が続いた場合は例外を送出するテスト"""
+        mock_create.side_effect = RuntimeError("API down")
+
+        with self.assertRaises(RuntimeError):
+            piapi_music_generation(
+                today_folder=str(self.test_music_dir),
+                prompt="melancholic piano",
+                target_duration_sec=600,
+                pipelined=True,
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,6 +2,7 @@ import unittest
 from pathlib import Path
 from unittest.mock import MagicMock, mock_open, patch
 
+from auto_post.downloader import WRITE_BUFFER_SIZE
 from auto_post.piapi_music_generation import (
     download_audio,
     extract_audio_url,
@@ -92,7 +93,7 @@ class TestPiapiMusicGenerationAdditional(unittest.TestCase):
         result = extract_audio_url(task_data)
         self.assertIsNone(result)
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     def test_download_audio_success(self, mock_get):
         """download_audio - 成功時のテスト"""
         # モックの設定
@@ -104,13 +105,21 @@ class TestPiapiMusicGenerationAdditional(unittest.TestCase):
         ]
         mock_get.return_value.__enter__.return_value = mock_response
 
-        with patch("builtins.open", mock_open()) as mock_file:
+        with patch("builtins.open", mock_open()) as mock_file, patch(
+            "auto_post.downloader.os.replace"
+        ) as mock_replace:
             download_audio(self.test_audio_url, self.test_save_path)
 
         mock_get.assert_called_once_with(self.test_audio_url, stream=True, timeout=120)
-        mock_file.assert_called_once_with(self.test_save_path, "wb")
-
-    @patch("auto_post.piapi_music_generation.requests.get")
+        # 一時ファイルに書き込んでから保存先に置き換える
+        mock_file.assert_called_once_with(
+            f"{self.test_save_path}.part", "wb", buffering=WRITE_BUFFER_SIZE
+        )
+        mock_replace.assert_called_once_with(
+            f"{self.test_save_path}.part", self.test_save_path
+        )
+
+    @patch("auto_post.piapi_music_generation.http_client.get")
     def test_download_audio_failure(self, mock_get):
         """download_audio - 失敗時のテスト"""
         # モックの設定
@@ -214,7 +223,7 @@ class TestPiapiMusicGenerationAdditional(unittest.TestCase):
         with self.assertRaises(SystemExit):
             piapi_music_generation(self.test_folder, "test prompt", 120)
 
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_fetch_track_title_success(self, mock_post):
         """fetch_track_title - 成功時のテスト"""
         # モックの設定
@@ -230,7 +239,7 @@ class TestPiapiMusicGenerationAdditional(unittest.TestCase):
         self.assertEqual(result, "Generated Track Title")
         mock_post.assert_called_once()
 
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_fetch_track_title_failure(self, mock_post):
         """fetch_track_title - 失敗時のテスト"""
         # モックの設定
@@ -243,7 +252,7 @@ class TestPiapiMusicGenerationAdditional(unittest.TestCase):
         self.assertEqual(result, "Untitled")
         mock_post.assert_called_once()
 
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_fetch_track_title_no_api_key(self, mock_post):
         """fetch_track_title - APIキーがない場合のテスト"""
         # モックの設定
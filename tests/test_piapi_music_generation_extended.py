@@ -130,7 +130,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
             self.assertIn("music_prompt", result)
 
     @patch("auto_post.piapi_music_generation.OPENAI_API_KEY", "test_key")
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_fetch_track_title_success(self, mock_post):
         """タイトル取得成功時のテスト"""
         mock_response = Mock()
@@ -153,7 +153,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
         self.assertEqual(result, "Untitled")
 
     @patch("auto_post.piapi_music_generation.OPENAI_API_KEY", "test_key")
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_fetch_track_title_api_error(self, mock_post):
         """APIエラー時のタイトル取得テスト"""
         mock_post.side_effect = requests.RequestException("API Error")
@@ -162,7 +162,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
 
         self.assertEqual(result, "Untitled")
 
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_create_music_task_success(self, mock_post):
         """音楽タスク作成成功時のテスト"""
         mock_response = Mock()
@@ -175,7 +175,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
         self.assertEqual(result, "test_task_id")
         mock_post.assert_called_once()
 
-    @patch("auto_post.piapi_music_generation.requests.post")
+    @patch("auto_post.piapi_music_generation.http_client.post")
     def test_create_music_task_no_task_id(self, mock_post):
         """タスクIDなしでの音楽タスク作成テスト"""
         mock_response = Mock()
@@ -187,7 +187,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             create_music_task("test prompt")
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     @patch("auto_post.piapi_music_generation.time.sleep")
     def test_wait_for_task_success(self, mock_sleep, mock_get):
         """タスク待機成功時のテスト"""
@@ -203,7 +203,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
         self.assertEqual(result["status"], "completed")
         mock_get.assert_called_once()
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     @patch("auto_post.piapi_music_generation.time.sleep")
     def test_wait_for_task_failed(self, mock_sleep, mock_get):
         """タスク失敗時のテスト"""
@@ -217,7 +217,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             wait_for_task("test_task_id")
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     @patch("auto_post.piapi_music_generation.time.sleep")
     def test_wait_for_task_timeout(self, mock_sleep, mock_get):
         """タスクタイムアウト時のテスト"""
@@ -263,7 +263,7 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
 
         self.assertIsNone(result)
 
-    @patch("auto_post.piapi_music_generation.requests.get")
+    @patch("auto_post.piapi_music_generation.http_client.get")
     def test_download_audio_success(self, mock_get):
         """音声ダウンロード成功時のテスト"""
         mock_response = Mock()
@@ -273,7 +273,9 @@ class TestPiapiMusicGenerationExtended(unittest.TestCase):
 
         test_file = self.temp_path / "test_audio.mp3"
 
-        with patch("builtins.open", mock_open()) as mock_file:
+        with patch("builtins.open", mock_open()) as mock_file, patch(
+            "auto_post.downloader.os.replace"
+        ):
             download_audio("http://example.com/audio.mp3", str(test_file))
 
             mock_get.assert_called_once()
@@ -0,0 +1,246 @@
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from auto_post.pipeline import (
+    ResourceBudget,
+    Stage,
+    StageManifest,
+    StageTiming,
+    critical_path,
+    run_stages,
+    validate_stages,
+)
+
+
+class TestPipeline(unittest.TestCase):
+    """pipelineモジュールの単体テスト"""
+
+    def test_independent_stages_run_concurrently(self):
+        """依存し合わないステージが同時に実行され、結果が後続に渡されるテスト"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def side(name):
+            def func(results):
+                barrier.wait()  # 2つが同時に実行されていなければタイムアウトする
+                return f"{results['prompt']}-{name}"
+
+            return func
+
+        stages = [
+            Stage("prompt", lambda r: "sad"),
+            Stage("music", side("music"), ("prompt",)),
+            Stage("thumbnail", side("thumb"), ("prompt",)),
+            Stage(
+                "video", lambda r: (r["music"], r["thumbnail"]), ("music", "thumbnail")
+            ),
+        ]
+
+        result = run_stages(stages, max_workers=2)
+
+        self.assertEqual(result.results["video"], ("sad-music", "sad-thumb"))
+        self.assertEqual(result.critical_path[0], "prompt")
+        self.assertEqual(result.critical_path[-1], "video")
+
+    def test_single_worker_keeps_declaration_order(self):
+        """max_workers=1なら宣言順に1つずつ実行するテスト"""
+        order = []
+        stages = [
+            Stage(name, lambda r, name=name: order.append(name), deps)
+            for name, deps in [
+                ("setup", ()),
+                ("music", ("setup",)),
+                ("combine", ("music",)),
+                ("thumbnail", ("setup",)),
+            ]
+        ]
+
+        run_stages(stages)
+
+        self.assertEqual(order, ["setup", "music", "combine", "thumbnail"])
+
+    def test_failure_stops_scheduling(self):
+        """失敗したら実行中のステージを待ち、以降のステージを開始せずに例外を送出するテスト"""
+        finished = []
+
+        def slow(results):
+            time.sleep(0.2)
+            finished.append("music")
+
+        stages = [
+            Stage("music", slow),
+            Stage("thumbnail", lambda r: sys.exit(1)),
+            Stage("video", lambda r: finished.append("video"), ("music", "thumbnail")),
+            Stage("notify", lambda r: finished.append("notify"), ("music",)),
+        ]
+
+        with self.assertRaises(SystemExit):
+            run_stages(stages, max_workers=2)
+
+        self.assertEqual(finished, ["music"])
+
+    def test_resource_budget_is_shared_between_pipelines(self):
+        """資源の枠を複数のパイプラインで共有し、枠のない資源は重ねて実行するテスト"""
+        budget = ResourceBudget({"cpu": 1, "gpu": 1})
+        lock = threading.Lock()
+        active = []
+        peak = []
+        overlap = threading.Barrier(2, timeout=5)
+
+        def encode(results):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+        def pipeline(stages):
+            run_stages(stages, max_workers=2, budget=budget)
+
+        threads = [
+            threading.Thread(
+                target=pipeline,
+                args=([Stage(f"encode{i}", encode, resource="cpu")],),
+            )
+            for i in range(3)
+        ]
+        # エンコード中でも別の資源（gpu）を使うステージは同時に実行できる
+        threads += [
+            threading.Thread(
+                target=pipeline,
+                args=([Stage(name, lambda r: overlap.wait(), resource=resource)],),
+            )
+            for name, resource in [("video", "cpu"), ("thumbnail", "gpu")]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(max(peak), 1)
+        self.assertEqual(len(peak), 3)
+        self.assertFalse(overlap.broken)
+
+    def test_validate_stages(self):
+        """存在しない依存先や循環を検出するテスト"""
+        with self.assertRaisesRegex(ValueError, "存在しません"):
+            validate_stages([Stage("a", None, ("missing",))])
+        with self.assertRaisesRegex(ValueError, "循環"):
+            validate_stages([Stage("a", None, ("b",)), Stage("b", None, ("a",))])
+
+    def test_critical_path(self):
+        """最後に終わった依存先をたどってクリティカルパスを求めるテスト"""
+        stages = [
+            Stage("setup", None),
+            Stage("music", None, ("setup",)),
+            Stage("thumbnail", None, ("setup",)),
+            Stage("video", None, ("music", "thumbnail")),
+        ]
+        timings = {
+            "setup": StageTiming(0, 1),
+            "music": StageTiming(1, 50),
+            "thumbnail": StageTiming(1, 30),
+            "video": StageTiming(50, 60),
+        }
+
+        self.assertEqual(critical_path(stages, timings), ["setup", "music", "video"])
+
+
+class TestStageMemoization(unittest.TestCase):
+    """マニフェストによるステージのメモ化の単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.manifest_path = self.temp_dir / "pipeline_manifest.json"
+        self.params = {"prompt": "sad", "temperature": 0.7}
+        self.calls = []
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name, text):
+        def func(results):
+            self.calls.append(name)
+            path = self.temp_dir / f"{name}.txt"
+            path.write_text(text(results))
+            return str(path)
+
+        return func
+
+    def _run(self, force=()):
+        """music → metadata / video（video の内容は music の出力で決まる）を実行する"""
+        self.calls = []
+        stages = [
+            Stage(
+                "music",
+                self._write("music", lambda r: self.params["prompt"]),
+                inputs=lambda r: {"prompt": self.params["prompt"]},
+                outputs=lambda result: [result],
+            ),
+            Stage(
+                "metadata",
+                self._write("metadata", lambda r: str(self.params["temperature"])),
+                ("music",),
+                inputs=lambda r: {"temperature": self.params["temperature"]},
+                outputs=lambda result: [result],
+            ),
+            Stage(
+                "video",
+                self._write("video", lambda r: Path(r["music"]).read_text()),
+                ("music",),
+                inputs=lambda r: {},
+                outputs=lambda result: [result],
+            ),
+        ]
+        manifest = StageManifest(self.manifest_path)
+        return run_stages(stages, manifest=manifest, force=force)
+
+    def test_unchanged_stages_are_skipped(self):
+        """入力が変わっていなければ記録した結果を使い、変わったステージだけ再実行するテスト"""
+        self._run()
+        self.assertEqual(self.calls, ["music", "metadata", "video"])
+
+        result = self._run()
+        self.assertEqual(self.calls, [])
+        self.assertEqual(result.results["video"], str(self.temp_dir / "video.txt"))
+
+        # metadata の入力だけが変わった場合、音楽にしか依存しない動画は再実行しない
+        self.params["temperature"] = 0.9
+        self._run()
+        self.assertEqual(self.calls, ["metadata"])
+
+        # 上流の出力が変わると後続も再実行される
+        self.params["prompt"] = "happy"
+        self._run()
+        self.assertEqual(self.calls, ["music", "metadata", "video"])
+
+    def test_modified_output_is_rebuilt(self):
+        """出力ファイルが消えたり書き換えられたりしたステージは再実行するテスト"""
+        self._run()
+        (self.temp_dir / "video.txt").write_text("edited by hand")
+
+        self._run()
+
+        self.assertEqual(self.calls, ["video"])
+        self.assertEqual((self.temp_dir / "video.txt").read_text(), "sad")
+
+    def test_force(self):
+        """forceで指定したステージは入力が同じでも再実行し、出力が同じなら後続は再利用するテスト"""
+        self._run()
+
+        self._run(force=["music"])
+        self.assertEqual(self.calls, ["music"])
+
+        with self.assertRaisesRegex(ValueError, "存在しないステージ"):
+            self._run(force=["unknown"])
+
+
+if __name__ == "__main__":
+    unittest.main()
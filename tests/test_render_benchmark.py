@@ -0,0 +1,129 @@
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from auto_post.render_benchmark import (
+    REPORT_FIELDS,
+    expand_matrix,
+    format_table,
+    run_case,
+    run_matrix,
+    write_report,
+)
+
+
+class TestRenderBenchmark(unittest.TestCase):
+    """render_benchmarkモジュールの単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_expand_matrix(self):
+        """設定の組み合わせを列挙し、1回で書き出す場合の重複をまとめるテスト"""
+        cases = expand_matrix(
+            durations=[60],
+            modes=["single", "segmented", "main"],
+            engines=["ffmpeg"],
+            fps_values=[24, 8],
+            workers=[1, 4],
+        )
+
+        single = [c for c in cases if c["mode"] == "single"]
+        self.assertEqual(len(single), 1)
+        self.assertEqual((single[0]["fps"], single[0]["workers"]), (24, 1))
+        main = [c for c in cases if c["mode"] == "main"]
+        self.assertEqual([(c["fps"], c["workers"]) for c in main], [(24, 1), (8, 1)])
+        self.assertEqual(len(cases), 7)
+        self.assertEqual(cases[0]["preset"], "medium")
+
+    @patch("auto_post.render_benchmark._tree_rss", return_value=3 * 1024**3)
+    @patch("auto_post.render_benchmark._render")
+    def test_run_case(self, mock_render, mock_rss):
+        """実行時間・フレーム数・ピークメモリ・サイズを記録するテスト"""
+        output = self.temp_dir / "final_video.mp4"
+        output.write_bytes(b"x" * 1250)
+        mock_render.return_value = output
+        case = expand_matrix(durations=[10], engines=["ffmpeg"], fps_values=[8])[0]
+
+        result = run_case(case, Path("still.png"), Path("mix.m4a"), self.temp_dir)
+
+        self.assertEqual((result["frames"], result["size"]), (80, 1250))
+        self.assertEqual((result["kbps"], result["output"]), (1.0, str(output)))
+        self.assertGreater(result["frames_per_sec"], 0)
+        # 並列のワーカーを含むプロセスツリー全体の合計
+        self.assertEqual(result["peak_rss_mb"], 3072.0)
+        self.assertIsNone(result["error"])
+
+        # 失敗しても例外にせずエラーとして記録する
+        mock_render.return_value = None
+        result = run_case(case, Path("still.png"), Path("mix.m4a"), self.temp_dir)
+        self.assertIsNone(result["seconds"])
+        self.assertTrue(result["error"])
+
+    @patch("auto_post.render_benchmark.measure_ssim", return_value=0.99)
+    @patch("auto_post.render_benchmark._run_case_in_subprocess")
+    @patch("auto_post.render_benchmark.excerpt_audio")
+    def test_run_matrix_ssim(self, mock_excerpt, mock_run, mock_ssim):
+        """基準のfpsを先に実行し、指定した音源を切り出してSSIMを測るテスト"""
+        mock_excerpt.side_effect = lambda source, path, duration: path
+
+        def run(case, still, audio, case_dir):
+            case_dir.mkdir(parents=True)
+            output = case_dir / "main.mp4"
+            output.write_bytes(b"x")
+            return dict(case, output=str(output), ssim=None)
+
+        mock_run.side_effect = run
+        cases = expand_matrix(
+            durations=[10], modes=["main"], engines=["ffmpeg"], fps_values=[12, 8]
+        )
+
+        results = run_matrix(
+            cases,
+            self.temp_dir,
+            still_path=Path("still.png"),
+            audio_path=Path("mix.mp3"),
+            ssim=True,
+        )
+
+        # 指定がなくても基準の24fpsを最初に実行し、結果には含めない
+        self.assertEqual(
+            [c.args[0]["fps"] for c in mock_run.call_args_list], [24, 12, 8]
+        )
+        self.assertEqual(
+            [(r["fps"], r["ssim"]) for r in results], [(12, 0.99), (8, 0.99)]
+        )
+        self.assertNotIn("output", results[0])
+        self.assertEqual(mock_ssim.call_args.args[1].parent.name, "case_001")
+        mock_excerpt.assert_called_once()
+        self.assertEqual(mock_excerpt.call_args.args[0], Path("mix.mp3"))
+        self.assertEqual(sorted(p.name for p in self.temp_dir.iterdir()), [])
+        self.assertIn("SSIM", format_table(results))
+
+    def test_write_report(self):
+        """拡張子に応じてJSONとCSVのレポートを書き出すテスト"""
+        results = [
+            dict(expand_matrix(durations=[10])[0], seconds=1.5, size=100, error=None)
+        ]
+
+        json_path = write_report(results, self.temp_dir / "report.json")
+        csv_path = write_report(results, self.temp_dir / "out" / "report.csv")
+
+        self.assertEqual(json.loads(json_path.read_text())[0]["seconds"], 1.5)
+        with open(csv_path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(list(rows[0]), REPORT_FIELDS)
+        self.assertEqual((rows[0]["seconds"], rows[0]["frames"]), ("1.5", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
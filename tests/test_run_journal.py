@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from auto_post.run_journal import (
+    COMPLETED,
+    FAILED,
+    JOURNAL_FILENAME,
+    OWNER_WORKER,
+    TASK_COMPLETED,
+    TASK_DONE,
+    RunJournal,
+    find_unfinished_runs,
+)
+
+
+class TestRunJournal(unittest.TestCase):
+    """run_journalモジュールの単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_state_survives_reload(self):
+        """記録した状態がファイルから読み直せるテスト"""
+        journal = RunJournal(self.temp_dir / "run" / JOURNAL_FILENAME)
+        journal.start({"target_duration_sec": 600})
+        journal.stage_started("music")
+        journal.task_submitted("t1", "piano", 1.0)
+        journal.task_completed("t1", ["a.mp3", "b.mp3"])
+        track = self.temp_dir / "run" / "a.mp3"
+        track.write_bytes(b"")
+        journal.variant_saved("t1", "a.mp3", track, 120.0)
+        journal.stage_finished("music")
+        journal.fail(SystemExit(1))
+
+        reloaded = RunJournal(journal.path)
+        self.assertEqual(reloaded.status, FAILED)
+        self.assertEqual(reloaded.attempts, 1)
+        self.assertEqual(reloaded.args, {"target_duration_sec": 600})
+        self.assertEqual(reloaded.last_stage(), "music")
+        # b.mp3 がまだ保存されていないので未完了のまま
+        [(task_id, task)] = reloaded.unfinished_tasks()
+        self.assertEqual((task_id, task["status"]), ("t1", TASK_COMPLETED))
+        self.assertEqual(reloaded.saved_tracks(), [(track, 120.0)])
+
+        reloaded.variant_saved("t1", "b.mp3", self.temp_dir / "run" / "b.mp3", 90.0)
+        self.assertEqual(reloaded.data["tasks"]["t1"]["status"], TASK_DONE)
+        self.assertEqual(reloaded.unfinished_tasks(), [])
+
+    def test_nothing_is_written_after_output_dir_removed(self):
+        """store_assets が出力ディレクトリを削除した後は書き込まないテスト"""
+        run_dir = self.temp_dir / "run"
+        journal = RunJournal(run_dir / JOURNAL_FILENAME)
+        journal.start({})
+        shutil.rmtree(run_dir)
+
+        journal.stage_finished("store_assets")
+        journal.finish()
+
+        self.assertFalse(run_dir.exists())
+        self.assertEqual(journal.status, COMPLETED)
+
+    def test_find_unfinished_runs(self):
+        """失敗した実行と、プロセスが残っていない実行中の実行だけを見つけるテスト（ワーカーのジョブを除く）"""
+        for name in ["failed", "completed", "crashed", "alive", "today"]:
+            RunJournal(self.temp_dir / name / JOURNAL_FILENAME).start({})
+        # ワーカーのジョブはジョブキューが再試行する
+        job = RunJournal(self.temp_dir / "20240101_job1" / JOURNAL_FILENAME)
+        job.start({}, owner=OWNER_WORKER)
+        job.fail(RuntimeError())
+        RunJournal(self.temp_dir / "failed" / JOURNAL_FILENAME).fail(RuntimeError())
+        RunJournal(self.temp_dir / "today" / JOURNAL_FILENAME).fail(RuntimeError())
+        RunJournal(self.temp_dir / "completed" / JOURNAL_FILENAME).finish()
+        crashed = RunJournal(self.temp_dir / "crashed" / JOURNAL_FILENAME)
+        crashed.note(pid=crashed.data["pid"] + 1)
+
+        with patch("auto_post.run_journal.pid_alive", side_effect=lambda pid: pid == 1):
+            alive = RunJournal(self.temp_dir / "alive" / JOURNAL_FILENAME)
+            alive.note(pid=1)
+            found = find_unfinished_runs(
+                self.temp_dir, exclude=[self.temp_dir / "today"]
+            )
+
+        self.assertEqual([j.path.parent.name for j in found], ["crashed", "failed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from auto_post.stock_catalog import StockCatalog
+
+# MPEG1 Layer III / 128kbps / 44100Hz のフレーム（1152サンプル）
+FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+FRAME_SEC = 1152 / 44100
+
+
+class TestStockCatalog(unittest.TestCase):
+    """stock_catalogモジュールの単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.base_dir = self.temp_dir / "lofi"
+        self.sad_dir = self.base_dir / "sad"
+        self.sad_dir.mkdir(parents=True)
+        self.db_path = self.base_dir / "stock_catalog.sqlite3"
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def _write_track(self, name: str, frames: int, lofi_dir: Path = None) -> Path:
+        path = (lofi_dir or self.sad_dir) / name
+        path.write_bytes(FRAME * frames)
+        return path
+
+    def _catalog(self) -> StockCatalog:
+        return StockCatalog(db_path=self.db_path, base_dir=self.base_dir)
+
+    def test_refresh_adds_tracks(self):
+        """初回refreshで全曲が登録されるテスト"""
+        self._write_track("a.mp3", 100)
+        self._write_track("b.mp3", 200)
+
+        with self._catalog() as catalog:
+            stats = catalog.refresh()
+            tracks = catalog.tracks("sad")
+
+        self.assertEqual(stats["added"], 2)
+        self.assertEqual([t.path.name for t in tracks], ["a.mp3", "b.mp3"])
+        self.assertAlmostEqual(tracks[0].duration, 100 * FRAME_SEC, places=6)
+        self.assertEqual(tracks[0].sample_rate, 44100)
+        self.assertEqual(tracks[0].lofi_type, "sad")
+        self.assertEqual(tracks[0].times_used, 0)
+
+    @patch("auto_post.stock_catalog.probe_mp3")
+    def test_refresh_is_incremental(self, mock_probe):
+        """変更のないファイルは再解析しないテスト"""
+        from auto_post.mp3_probe import probe_mp3
+
+        mock_probe.side_effect = probe_mp3
+        a = self._write_track("a.mp3", 100)
+        self._write_track("b.mp3", 200)
+
+        with self._catalog() as catalog:
+            catalog.refresh()
+            self.assertEqual(mock_probe.call_count, 2)
+
+            a.write_bytes(FRAME * 150)
+            os.utime(a, (1, 1))
+            stats = catalog.refresh()
+            tracks = {t.path.name: t for t in catalog.tracks("sad")}
+
+        self.assertEqual(mock_probe.call_count, 3)
+        self.assertEqual(stats["updated"], 1)
+        self.assertEqual(stats["unchanged"], 1)
+        self.assertAlmostEqual(tracks["a.mp3"].duration, 150 * FRAME_SEC, places=6)
+
+    def test_refresh_removes_deleted_files(self):
+        """削除されたファイルがカタログから消えるテスト"""
+        a = self._write_track("a.mp3", 100)
+        self._write_track("b.mp3", 100)
+
+        with self._catalog() as catalog:
+            catalog.refresh()
+            a.unlink()
+            stats = catalog.refresh()
+            tracks = catalog.tracks("sad")
+
+        self.assertEqual(stats["removed"], 1)
+        self.assertEqual([t.path.name for t in tracks], ["b.mp3"])
+
+    @patch("auto_post.stock_catalog.AudioSegment")
+    def test_refresh_removes_unreadable_files(self, mock_audio):
+        """解析できなくなったファイルの古い行をカタログから削除するテスト"""
+        mock_audio.from_mp3.side_effect = Exception("broken")
+        a = self._write_track("a.mp3", 100)
+        self._write_track("b.mp3", 100)
+
+        with self._catalog() as catalog:
+            catalog.refresh()
+            a.write_bytes(b"broken")
+            stats = catalog.refresh()
+            tracks = catalog.tracks("sad")
+
+        self.assertEqual((stats["removed"], stats["unchanged"]), (1, 1))
+        self.assertEqual([t.path.name for t in tracks], ["b.mp3"])
+
+    def test_refresh_single_type(self):
+        """タイプ指定時は他のタイプを走査しないテスト"""
+        happy_dir = self.base_dir / "happy"
+        happy_dir.mkdir()
+        self._write_track("a.mp3", 100)
+        self._write_track("h.mp3", 100, happy_dir)
+
+        with self._catalog() as catalog:
+            stats = catalog.refresh(lofi_type="sad")
+            self.assertEqual(catalog.tracks("happy"), [])
+
+        self.assertEqual(stats["added"], 1)
+
+    def test_mark_used(self):
+        """使用回数が加算されるテスト"""
+        a = self._write_track("a.mp3", 100)
+
+        with self._catalog() as catalog:
+            catalog.refresh()
+            catalog.mark_used([a])
+            catalog.mark_used([a])
+            track = catalog.tracks("sad")[0]
+
+        self.assertEqual(track.times_used, 2)
+
+    def test_catalog_persists(self):
+        """カタログがファイルに保存され、再オープンしても残るテスト"""
+        self._write_track("a.mp3", 100)
+
+        with self._catalog() as catalog:
+            catalog.refresh()
+        with self._catalog() as catalog:
+            tracks = catalog.tracks("sad")
+
+        self.assertEqual(len(tracks), 1)
+        self.assertTrue(self.db_path.exists())
+
+    def test_verify(self):
+        """verifyでカタログとストックの差異を検出するテスト"""
+        a = self._write_track("a.mp3", 100)
+        b = self._write_track("b.mp3", 100)
+
+        with self._catalog() as catalog:
+            catalog.refresh()
+            self.assertEqual(catalog.verify(), [])
+
+            a.unlink()
+            b.write_bytes(b"\x00" * len(FRAME) * 100)
+            self._write_track("c.mp3", 100)
+            problems = catalog.verify()
+
+        self.assertIn("missing: sad/a.mp3", problems)
+        self.assertIn("hash mismatch: sad/b.mp3", problems)
+        self.assertIn("not cataloged: sad/c.mp3", problems)
+
+    def test_rebuild(self):
+        """rebuildでカタログが作り直されるテスト"""
+        a = self._write_track("a.mp3", 100)
+
+        with self._catalog() as catalog:
+            catalog.refresh()
+            catalog.mark_used([a])
+            stats = catalog.rebuild()
+            track = catalog.tracks("sad")[0]
+
+        self.assertEqual(stats["added"], 1)
+        self.assertEqual(track.times_used, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from auto_post.task_poller import PollStats, TaskPoller
+
+
+class TestPollStats(unittest.TestCase):
+    """PollStatsクラスの単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_initial_delay_from_median(self):
+        """生成時間の中央値から初回待ち時間を決めるテスト"""
+        stats = PollStats()
+        self.assertEqual(stats.initial_delay(), 0.0)
+
+        for sec in (100, 120, 200):
+            stats.record(sec, 3)
+
+        self.assertEqual(stats.median(), 120)
+        self.assertAlmostEqual(stats.initial_delay(), 96.0)
+        self.assertEqual(stats.histogram, {"90-120s": 1, "120-150s": 1, "180-210s": 1})
+        self.assertEqual(stats.polls, {"3": 3})
+
+    def test_save_and_load(self):
+        """記録がファイルに保存され、次回読み込まれるテスト"""
+        path = self.temp_dir / "stats.json"
+        stats = PollStats(path)
+        stats.record(150, 2)
+        stats.save()
+
+        loaded = PollStats(path)
+
+        self.assertEqual(list(loaded.samples), [150.0])
+        self.assertEqual(loaded.polls, {"2": 1})
+        # 一時ファイルに書いてから置き換える
+        self.assertEqual([p.name for p in self.temp_dir.iterdir()], ["stats.json"])
+
+    def test_broken_file_is_ignored(self):
+        """壊れた記録ファイルは無視するテスト"""
+        path = self.temp_dir / "stats.json"
+        path.write_text("{broken")
+
+        self.assertIsNone(PollStats(path).median())
+
+
+@patch("auto_post.task_poller.MIN_POLL_INTERVAL", 0.01)
+@patch("auto_post.task_poller.MAX_POLL_INTERVAL", 0.02)
+class TestTaskPoller(unittest.TestCase):
+    """TaskPollerクラスの単体テスト"""
+
+    def test_polls_many_tasks_in_one_thread(self):
+        """複数タスクを1本のスレッドでポーリングするテスト"""
+        remaining = {"a": 2, "b": 4, "c": 0}
+        threads = set()
+
+        def fetch(task_id):
+            threads.add(threading.current_thread().name)
+            if remaining[task_id]:
+                remaining[task_id] -= 1
+                return None
+            return {"task_id": task_id}
+
+        poller = TaskPoller(fetch)
+        futures = {task_id: poller.submit(task_id, 5) for task_id in remaining}
+
+        results = {k: f.result(timeout=5)["task_id"] for k, f in futures.items()}
+
+        self.assertEqual(results, {"a": "a", "b": "b", "c": "c"})
+        self.assertEqual(threads, {"task-poller"})
+
+    def test_duplicate_submit_shares_future(self):
+        """ポーリング中のタスクを再度submitすると同じFutureを返すテスト"""
+        release = threading.Event()
+
+        def fetch(task_id):
+            return {"task_id": task_id} if release.is_set() else None
+
+        poller = TaskPoller(fetch)
+        first = poller.submit("a", 5)
+        second = poller.submit("a", 5)
+        release.set()
+
+        self.assertIs(first, second)
+        self.assertEqual(first.result(timeout=5), {"task_id": "a"})
+
+    def test_initial_delay_and_latency_recording(self):
+        """過去の生成時間に応じて初回の問い合わせを遅らせ、生成時間を記録するテスト"""
+        stats = PollStats()
+        stats.record(0.5, 1)
+        polled_at = []
+
+        def fetch(task_id):
+            polled_at.append(time.time())
+            return {"status": "completed"}
+
+        submitted_at = time.time()
+        TaskPoller(fetch, stats).wait("a", 5, submitted_at=submitted_at)
+
+        # 0.5秒 × 0.8 × ジッター(0.8〜1.2) 以上待ってから問い合わせる
+        self.assertGreaterEqual(polled_at[0] - submitted_at, 0.3)
+        self.assertEqual(len(stats.samples), 2)
+
+    def test_unknown_submit_time_is_not_recorded(self):
+        """作成時刻が不明なタスクはすぐに問い合わせ、生成時間を記録しないテスト"""
+        stats = PollStats()
+        stats.record(60, 1)
+
+        start = time.time()
+        TaskPoller(lambda task_id: {}, stats).wait("a", 5)
+
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(list(stats.samples), [60.0])
+
+    def test_timeout(self):
+        """締め切りまでに完了しない場合はTimeoutErrorになるテスト"""
+        poller = TaskPoller(lambda task_id: None)
+
+        with self.assertRaises(TimeoutError):
+            poller.wait("a", 0.2)
+
+    def test_failure_is_propagated(self):
+        """fetchの例外がそのまま送出されるテスト"""
+
+        def fetch(task_id):
+            raise RuntimeError("Task failed")
+
+        with self.assertRaises(RuntimeError):
+            TaskPoller(fetch).wait("a", 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
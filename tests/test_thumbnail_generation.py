@@ -96,7 +96,7 @@ class TestThumbnailGeneration(unittest.TestCase):
         with self.assertRaises(IndexError):
             load_random_prompt(empty_file)
 
-    @patch("auto_post.thumbnail_generation.requests.get")
+    @patch("auto_post.thumbnail_generation.http_client.get")
     @patch("builtins.open", new_callable=Mock)
     def test_ensure_font_download(self, mock_file, mock_get):
         """フォントダウンロードのテスト"""
@@ -235,6 +235,30 @@ class TestThumbnailGeneration(unittest.TestCase):
         mock_ensure_font.assert_called_once()
         mock_create_thumb.assert_called_once()
 
+    @patch.dict("auto_post.thumbnail_generation._pipelines", clear=True)
+    @patch("auto_post.thumbnail_generation.DiffusionPipeline")
+    @patch("auto_post.thumbnail_generation.ensure_font")
+    @patch("auto_post.thumbnail_generation.create_thumbnail")
+    def test_thumbnail_generation_keep_model(
+        self, mock_create_thumb, mock_ensure_font, mock_pipeline
+    ):
+        """keep_model=True なら読み込んだモデルを次の生成でも使うテスト"""
+        mock_pipe = Mock()
+        mock_pipe.return_value.images = [Mock()]
+        mock_pipeline.from_pretrained.return_value.to.return_value = mock_pipe
+
+        for title in ["Sad Lo-Fi", "Rainy Lo-Fi"]:
+            thumbnail_generation(
+                output_dir=str(self.temp_path),
+                lofi_type="sad",
+                prompt="melancholic scene",
+                thumb_title=title,
+                keep_model=True,
+            )
+
+        mock_pipeline.from_pretrained.assert_called_once()
+        self.assertEqual(mock_pipe.call_count, 2)
+
     @patch("auto_post.thumbnail_generation.DiffusionPipeline")
     def test_thumbnail_generation_pipeline_error(self, mock_pipeline):
         """パイプラインエラー時のテスト"""
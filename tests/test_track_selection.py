@@ -0,0 +1,85 @@
+import random
+import time
+import unittest
+
+from auto_post.track_selection import mixed_duration, select_tracks
+
+
+class TestTrackSelection(unittest.TestCase):
+    """track_selectionモジュールの単体テスト"""
+
+    def test_exact_combination_with_crossfade(self):
+        """クロスフェード後の合計がちょうど目標になる組み合わせを選ぶテスト"""
+        durations = [100.0, 200.0, 303.0, 400.0, 51.0]
+        # 200 + 303 + 51 - 3 * 2 = 548
+        selected = select_tracks(durations, 548, tolerance_sec=0)
+
+        self.assertEqual(sorted(selected), [1, 2, 4])
+        self.assertAlmostEqual(mixed_duration([durations[i] for i in selected]), 548.0)
+
+    def test_joined_counts_every_crossfade(self):
+        """既存の曲に繋ぐ場合は全曲分のクロスフェードを差し引くテスト"""
+        durations = [103.0, 203.0, 300.0]
+        selected = select_tracks(durations, 300, tolerance_sec=0, joined=True)
+
+        self.assertEqual(sorted(selected), [0, 1])
+        self.assertAlmostEqual(
+            mixed_duration([durations[i] for i in selected], joined=True), 300.0
+        )
+
+    def test_seed_is_reproducible(self):
+        """同じシードなら同じ曲、違うシードなら違う組み合わせになるテスト"""
+        durations = [180.0] * 50
+        first = select_tracks(durations, 1800, seed=1)
+        second = select_tracks(durations, 1800, seed=1)
+        others = {
+            tuple(sorted(select_tracks(durations, 1800, seed=s))) for s in range(5)
+        }
+
+        self.assertEqual(first, second)
+        self.assertGreater(len(others), 1)
+
+    def test_priorities_prefer_less_used(self):
+        """同じ長さを作れるなら優先度（使用回数）の小さい曲を選ぶテスト"""
+        durations = [180.0] * 10
+        priorities = [3, 0, 2, 0, 5, 1, 0, 4, 2, 3]
+
+        for seed in range(5):
+            selected = select_tracks(durations, 534, seed=seed, priorities=priorities)
+            self.assertEqual(sorted(selected), [1, 3, 6])
+
+    def test_overshoots_when_target_unreachable(self):
+        """許容誤差内に収まらない場合は目標を超える最短の組み合わせを選ぶテスト"""
+        durations = [200.0, 300.0, 500.0]
+        # 200 + 300 - 3 = 497 の方が 500 より目標に近い
+        selected = select_tracks(durations, 450, tolerance_sec=1)
+
+        self.assertEqual(sorted(selected), [0, 1])
+
+    def test_stock_shorter_than_target(self):
+        """ストックが足りない場合は全曲を返すテスト"""
+        selected = select_tracks([60.0, 90.0], 3600)
+
+        self.assertEqual(sorted(selected), [0, 1])
+
+    def test_empty_stock(self):
+        """ストックが空なら何も選ばないテスト"""
+        self.assertEqual(select_tracks([], 600), [])
+
+    def test_large_stock_is_fast(self):
+        """1万曲のストックでも1秒以内に目標時間に収まるテスト"""
+        rng = random.Random(0)
+        durations = [rng.uniform(90, 240) for _ in range(10_000)]
+
+        start = time.perf_counter()
+        selected = select_tracks(durations, 3 * 60 * 60, seed=0)
+        elapsed = time.perf_counter() - start
+
+        total = mixed_duration([durations[i] for i in selected])
+        self.assertLess(elapsed, 1.0)
+        self.assertAlmostEqual(total, 3 * 60 * 60, delta=5.0)
+        self.assertEqual(len(set(selected)), len(selected))
+
+
+if __name__ == "__main__":
+    unittest.main()
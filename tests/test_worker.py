@@ -0,0 +1,128 @@
+import shutil
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from auto_post.worker import (
+    CANCELLED,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    JobQueue,
+    Worker,
+)
+
+
+class TestWorker(unittest.TestCase):
+    """workerモジュールの単体テスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.queue = JobQueue(self.temp_dir / "jobs.sqlite3")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.queue.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_queue_lifecycle(self):
+        """登録・取り出し・取り消し・再試行のテスト"""
+        ids = [self.queue.enqueue(["--lofi_type", t]) for t in ["sad", "jazz", "rain"]]
+
+        self.assertTrue(self.queue.cancel(ids[1]))
+        self.assertFalse(self.queue.cancel(ids[1]))  # 取り消し済み
+
+        first = self.queue.claim("host:1")
+        self.assertEqual((first.id, first.status, first.attempts), (ids[0], RUNNING, 1))
+        self.assertEqual(first.argv, ["--lofi_type", "sad"])
+        self.assertEqual(self.queue.claim("host:1").id, ids[2])
+        self.assertIsNone(self.queue.claim("host:1"))
+        self.assertFalse(self.queue.cancel(ids[0]))  # 実行中は取り消せない
+
+        self.queue.finish(ids[0], FAILED, "boom")
+        self.assertTrue(self.queue.retry(ids[0]))
+        self.assertEqual(self.queue.get(ids[0]).attempts, 0)
+        self.assertFalse(self.queue.retry(ids[2]))  # 実行中は再試行できない
+        self.assertTrue(self.queue.retry(ids[1]))  # 取り消したジョブも戻せる
+
+        self.assertEqual([job.id for job in self.queue.jobs(QUEUED)], [ids[0], ids[1]])
+        retried = self.queue.claim("host:1")
+        self.assertEqual((retried.id, retried.attempts), (ids[0], 1))
+
+    def test_requeue_stale(self):
+        """強制終了したワーカーが残した実行中のジョブをキューに戻すテスト"""
+        host = socket.gethostname()
+        stale = self.queue.enqueue([])
+        alive = self.queue.enqueue([])
+        other_host = self.queue.enqueue([])
+        self.queue.claim(f"{host}:100")
+        self.queue.claim(f"{host}:200")
+        self.queue.claim("elsewhere:100")
+
+        with patch("auto_post.worker.pid_alive", side_effect=lambda pid: pid == 200):
+            self.assertEqual(self.queue.requeue_stale(), [stale])
+
+        self.assertEqual(self.queue.get(stale).status, QUEUED)
+        self.assertEqual(self.queue.get(alive).status, RUNNING)
+        self.assertEqual(self.queue.get(other_host).status, RUNNING)
+
+    def test_requeue_stale_gives_up(self):
+        """何度も中断したジョブはキューに戻さずに失敗にするテスト"""
+        host = socket.gethostname()
+        job_id = self.queue.enqueue([])
+
+        with patch("auto_post.worker.pid_alive", return_value=False):
+            for _ in range(2):
+                self.queue.claim(f"{host}:100")
+                self.assertEqual(self.queue.requeue_stale(max_attempts=3), [job_id])
+            self.queue.claim(f"{host}:100")
+            self.assertEqual(self.queue.requeue_stale(max_attempts=3), [])
+
+        job = self.queue.get(job_id)
+        self.assertEqual((job.status, job.attempts), (FAILED, 3))
+        self.assertIsNone(self.queue.claim(f"{host}:100"))
+
+    def test_serve_runs_jobs_until_drained(self):
+        """キューのジョブを同時に実行し、結果と出力ディレクトリを記録するテスト"""
+        sad = self.queue.enqueue(["--lofi_type", "sad"])
+        jazz = self.queue.enqueue(["--lofi_type", "jazz"])
+        fixed = self.queue.enqueue(["--output_dir", "fixed", "--lofi_type", "rain"])
+        self.queue.cancel(self.queue.enqueue([]))
+
+        created = []
+
+        def generator(args, budget):
+            instance = Mock()
+            if args.lofi_type == "jazz":
+                instance.run.side_effect = SystemExit(1)
+            created.append((args, budget))
+            return instance
+
+        with patch("auto_post.worker.LofiPostGenerator", side_effect=generator):
+            Worker(self.queue, concurrency=2, poll_sec=0.01).serve(drain=True)
+
+        self.assertEqual(self.queue.get(sad).status, SUCCEEDED)
+        self.assertEqual(self.queue.get(jazz).status, FAILED)
+        self.assertEqual(self.queue.get(fixed).status, SUCCEEDED)
+        self.assertEqual(len(self.queue.jobs(CANCELLED)), 1)
+
+        self.assertTrue(self.queue.get(sad).output_dir.endswith(f"_job{sad}"))
+        self.assertEqual(self.queue.get(fixed).output_dir, "fixed")
+        self.assertTrue(all(args.keep_warm for args, _ in created))
+        self.assertTrue(all(args.run_owner == "worker" for args, _ in created))
+        self.assertEqual(len({id(budget) for _, budget in created}), 1)
+
+        # 再試行では最初に決めた出力ディレクトリを使い続ける
+        output_dir = self.queue.get(jazz).output_dir
+        self.queue.retry(jazz)
+        with patch("auto_post.worker.LofiPostGenerator", side_effect=generator):
+            Worker(self.queue, concurrency=1, poll_sec=0.01).serve(drain=True)
+        self.assertEqual(created[-1][0].output_dir, output_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()